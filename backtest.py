@@ -1,137 +1,65 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 
-# Load your data - fix CSV parsing
-price_df = pd.read_csv('sp500_30min_14d.csv', header=0, skiprows=[1, 2])  # Skip ticker and empty rows
-bounds_df = pd.read_csv('daily_noise_bounds.csv')
+from bar_keys import day_dates, join_bounds
+from market_data import load_bars
+from profiling import Profiler
+from report import downsample, finish, pyplot, report_mode
+from session_calendar import SessionCalendar
+from simulation import make_params, print_trade_events, simulate
+from trade_log import TradeBuffer, save_trade_log
 
-# The 'Price' column contains the datetime, rename it
-price_df = price_df.rename(columns={'Price': 'Datetime'})
-price_df['Datetime'] = pd.to_datetime(price_df['Datetime'])
+REPORT = report_mode()  # --report show|file|none (see report.py)
 
-# Convert price columns to numeric (they might be strings)
-price_df['Close'] = pd.to_numeric(price_df['Close'], errors='coerce')
-price_df['Open'] = pd.to_numeric(price_df['Open'], errors='coerce')
-price_df['High'] = pd.to_numeric(price_df['High'], errors='coerce')
-price_df['Low'] = pd.to_numeric(price_df['Low'], errors='coerce')
+# Stage timings are recorded when STRATEGY_PROFILE is set (see profiling.py)
+profiler = Profiler('backtest')
 
-# Remove any rows with NaN values
-price_df = price_df.dropna()
+# Load your data: memory-mapped from bar_store/ when `python bar_store.py import
+# sp500_30min_14d.csv ^GSPC 30m` has been run, otherwise parsed from the CSV
+profiler.begin('load')
+price_df = load_bars('^GSPC', '30m', 'sp500_30min_14d.csv').reset_index()
+profiler.end(bars=len(price_df))
 
-# Add Date and Time columns for merging
-price_df['Date'] = price_df['Datetime'].dt.date
-price_df['Time'] = price_df['Datetime'].dt.strftime('%H:%M')
+# 'intraday_noise_bounds.csv' (from Intraday_bounds.py) gives time-of-day bounds instead of one per day
+BOUNDS_FILE = 'daily_noise_bounds.csv'
+profiler.begin('read_bounds')
+bounds_df = pd.read_csv(BOUNDS_FILE)
 
-bounds_df['Date'] = pd.to_datetime(bounds_df['Date']).dt.date
+# Join the bounds onto the bars by int32 day ordinals (and int16 time-of-day
+# minutes for intraday bounds) through direct array indexing (bar_keys.py);
+# float32=True halves the memory of the price and bounds columns on long histories
+profiler.begin('merge', bars=len(price_df))
+merged = join_bounds(price_df, bounds_df)
+calendar = SessionCalendar.from_frame(merged)  # session open/close bars, DST and holidays included
 
-merged = pd.merge(price_df, bounds_df, on='Date', how='inner')
-merged = merged.sort_values('Datetime')
-
-print(f"Loaded {len(merged)} data points from {merged['Date'].nunique()} trading days")
-print(f"Date range: {merged['Date'].min()} to {merged['Date'].max()}")
+print(f"Loaded {len(merged)} data points from {len(np.unique(merged['Day']))} trading days")
+print(f"Date range: {day_dates(merged['Day'].min())} to {day_dates(merged['Day'].max())}")
 
 INITIAL_AUM = 100_000
 COMMISSION_PER_SHARE = 0.0035
 SLIPPAGE_PER_SHARE = 0.001
 
-aum = INITIAL_AUM
-position = 0  # 0 = flat, 1 = long, -1 = short
-entry_price = None
-entry_time = None
-shares = 0
-trade_log = []
-equity_curve = []
-equity_times = []
-
-for idx, row in merged.iterrows():
-    t = row['Time']
-    dt = row['Datetime']
-    price = row['Close']
-    open_price = row['Open']
-    upper = row['UpperBound']
-    lower = row['LowerBound']
-
-    # Position sizing at market open
-    if t == '13:30' and position == 0:  # Market opens at 13:30 UTC
-        shares = int(aum / open_price)
-
-    # Entry logic: buy (call) when above upper bound, short when below lower bound
-    if position == 0:
-        if price > upper:
-            # Go long (call)
-            position = 1
-            entry_price = float(price + SLIPPAGE_PER_SHARE)
-            entry_time = dt
-            entry_shares = shares
-            print(f"LONG entry at {dt}: Price={price:.2f}, Upper={upper:.2f}, Entry={entry_price:.2f}")
-        elif price < lower:
-            # Go short
-            position = -1
-            entry_price = float(price - SLIPPAGE_PER_SHARE)
-            entry_time = dt
-            entry_shares = shares
-            print(f"SHORT entry at {dt}: Price={price:.2f}, Lower={lower:.2f}, Entry={entry_price:.2f}")
-
-    # Exit at market close or if position reverses
-    should_exit = False
-    exit_reason = ""
-    
-    if position != 0 and t == '19:30':  # Market closes at 19:30 UTC
-        should_exit = True
-        exit_reason = "Market Close"
-    elif position == 1 and price < lower:  # Long position hits lower bound
-        should_exit = True
-        exit_reason = "Long -> Short Signal"
-    elif position == -1 and price > upper:  # Short position hits upper bound
-        should_exit = True
-        exit_reason = "Short -> Long Signal"
-    
-    if should_exit and entry_price is not None:
-        exit_price = float(price - SLIPPAGE_PER_SHARE * position)
-        exit_time = dt
-        if position == 1:
-            pnl = (exit_price - entry_price) * entry_shares - COMMISSION_PER_SHARE * entry_shares * 2
-        else:
-            pnl = (entry_price - exit_price) * entry_shares - COMMISSION_PER_SHARE * entry_shares * 2
-        aum += pnl
-        trade_log.append({
-            'Entry Time': entry_time, 'Entry Price': entry_price,
-            'Exit Time': exit_time, 'Exit Price': exit_price,
-            'PnL': pnl, 'Position': 'Long' if position == 1 else 'Short', 
-            'Shares': entry_shares, 'Exit Reason': exit_reason
-        })
-        print(f"EXIT {exit_reason}: PnL=${pnl:.2f}, New AUM=${aum:.2f}")
-        
-        # Check for immediate re-entry on signal reversal
-        if exit_reason in ["Long -> Short Signal", "Short -> Long Signal"]:
-            if exit_reason == "Long -> Short Signal":
-                position = -1
-                entry_price = float(price - SLIPPAGE_PER_SHARE)
-                entry_time = dt
-                entry_shares = int(aum / open_price)
-                print(f"IMMEDIATE SHORT entry at {dt}: Price={price:.2f}")
-            else:  # "Short -> Long Signal"
-                position = 1
-                entry_price = float(price + SLIPPAGE_PER_SHARE)
-                entry_time = dt
-                entry_shares = int(aum / open_price)
-                print(f"IMMEDIATE LONG entry at {dt}: Price={price:.2f}")
-        else:
-            position = 0
-            entry_price = None
-            entry_time = None
-            shares = int(aum / open_price) if open_price > 0 else 0
-            
-    equity_curve.append(aum)
-    equity_times.append(dt)
-
-trades_df = pd.DataFrame(trade_log)
-
-# Calculate performance metrics
-total_return = (aum - INITIAL_AUM) / INITIAL_AUM * 100
-num_trades = len(trades_df)
-win_rate = len(trades_df[trades_df['PnL'] > 0]) / num_trades * 100 if num_trades > 0 else 0
+# Original strategy: unbuffered bounds, no stop loss, all-in sizing from the session open
+params = make_params(commission=COMMISSION_PER_SHARE, slippage=SLIPPAGE_PER_SHARE)
+session_open = calendar.open_flags()    # First bar of the regular session (9:30 New York)
+session_close = calendar.close_flags()  # Last bar before the close (16:00, or 13:00 on early closes)
+
+profiler.begin('simulate', bars=len(merged))
+result = simulate(merged, params, session_open, session_close, initial_aum=INITIAL_AUM)
+aum = result.aum
+equity_curve = result.equity
+equity_times = merged['Datetime']
+trade_buffer = TradeBuffer.from_trades(result.trades, equity_times, symbol='^GSPC')
+trades_df = trade_buffer.to_frame()
+
+print_trade_events(result, merged, equity_times, INITIAL_AUM)
+
+# Performance metrics, accumulated during the simulation pass (metrics.py)
+profiler.begin('metrics')
+metrics = result.summary(INITIAL_AUM)
+total_return = metrics['TotalReturn']
+num_trades = metrics['NumTrades']
+win_rate = metrics['WinRate']
 
 print(f"\n=== BACKTEST RESULTS ===")
 print(f"Initial AUM: ${INITIAL_AUM:,.2f}")
@@ -139,51 +67,58 @@ print(f"Final AUM: ${aum:,.2f}")
 print(f"Total Return: {total_return:.2f}%")
 print(f"Number of Trades: {num_trades}")
 print(f"Win Rate: {win_rate:.1f}%")
+print(f"Maximum Drawdown: {metrics['MaxDrawdown']:.2f}%")
+print(f"Exposure: {metrics['Exposure']:.1f}% of bars")
+print(f"Sharpe Ratio: {metrics['SharpeRatio']:.2f}")
+print(f"Sortino Ratio: {metrics['SortinoRatio']:.2f}")
 
 if num_trades > 0:
     print(f"Average PnL per Trade: ${trades_df['PnL'].mean():.2f}")
-    print(f"Best Trade: ${trades_df['PnL'].max():.2f}")
-    print(f"Worst Trade: ${trades_df['PnL'].min():.2f}")
+    print(f"Best Trade: ${metrics['BestTrade']:.2f}")
+    print(f"Worst Trade: ${metrics['WorstTrade']:.2f}")
 
 # Plot equity curve
-plt.figure(figsize=(15, 8))
-plt.subplot(2, 1, 1)
-plt.plot(equity_times, equity_curve)
-plt.title('Equity Curve - Bounds Trading Strategy')
-plt.xlabel('Time')
-plt.ylabel('AUM ($)')
-plt.grid(True)
-
-# Plot price with bounds
-plt.subplot(2, 1, 2)
-plt.plot(merged['Datetime'], merged['Close'], label='S&P 500 Price', alpha=0.7)
-plt.plot(merged['Datetime'], merged['UpperBound'], label='Upper Bound', color='red', linestyle='--')
-plt.plot(merged['Datetime'], merged['LowerBound'], label='Lower Bound', color='green', linestyle='--')
-
-# Mark trade entries
-if num_trades > 0:
-    long_entries = trades_df[trades_df['Position'] == 'Long']
-    short_entries = trades_df[trades_df['Position'] == 'Short']
+profiler.begin('plot')
+if REPORT != 'none':
+    plt = pyplot(REPORT)
+    plt.figure(figsize=(15, 8))
+    plt.subplot(2, 1, 1)
+    plt.plot(*downsample(equity_times, equity_curve))
+    plt.title('Equity Curve - Bounds Trading Strategy')
+    plt.xlabel('Time')
+    plt.ylabel('AUM ($)')
+    plt.grid(True)
+
+    # Plot price with bounds
+    plt.subplot(2, 1, 2)
+    plt.plot(*downsample(merged['Datetime'], merged['Close']), label='S&P 500 Price', alpha=0.7)
+    plt.plot(*downsample(merged['Datetime'], merged['UpperBound']), label='Upper Bound', color='red', linestyle='--')
+    plt.plot(*downsample(merged['Datetime'], merged['LowerBound']), label='Lower Bound', color='green', linestyle='--')
+
+    # Mark trade entries
+    if num_trades > 0:
+        long_entries = trades_df[trades_df['Position'] == 'Long']
+        short_entries = trades_df[trades_df['Position'] == 'Short']
     
-    if len(long_entries) > 0:
-        plt.scatter(long_entries['Entry Time'], long_entries['Entry Price'], 
-                   color='green', marker='^', s=100, label='Long Entry', zorder=5)
-    if len(short_entries) > 0:
-        plt.scatter(short_entries['Entry Time'], short_entries['Entry Price'], 
-                   color='red', marker='v', s=100, label='Short Entry', zorder=5)
-
-plt.title('Price Action with Trading Signals')
-plt.xlabel('Time')
-plt.ylabel('Price')
-plt.legend()
-plt.grid(True)
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('backtest_results.png', dpi=150, bbox_inches='tight')
-plt.show()
+        if len(long_entries) > 0:
+            plt.scatter(long_entries['Entry Time'], long_entries['Entry Price'], 
+                       color='green', marker='^', s=100, label='Long Entry', zorder=5)
+        if len(short_entries) > 0:
+            plt.scatter(short_entries['Entry Time'], short_entries['Entry Price'], 
+                       color='red', marker='v', s=100, label='Short Entry', zorder=5)
+
+    plt.title('Price Action with Trading Signals')
+    plt.xlabel('Time')
+    plt.ylabel('Price')
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig('backtest_results.png', dpi=150, bbox_inches='tight')
+profiler.write()
+if REPORT != 'none':
+    finish(plt, REPORT)
 
 print(f"\n=== TRADE LOG ===")
-if num_trades > 0:
-    print(trades_df.to_string(index=False))
-else:
-    print("No trades executed")
+# Saved to trade_logs/symbol=^GSPC/run=backtest/trades.parquet, or printed when pyarrow is not installed
+save_trade_log(trade_buffer, 'trade_logs', run='backtest')
@@ -0,0 +1,125 @@
+"""Compact integer keys for bars, and the bounds join built on them.
+
+Instead of a Python date object and an 'HH:MM' string per bar, bars are
+keyed by
+
+    day     int32  day ordinal (days since 1970-01-01) of the New York date,
+                   i.e. the session date of session_calendar.SessionCalendar
+    minute  int16  minutes after midnight UTC
+
+and bounds tables get the same keys from their Date / Time columns.
+Keying by the session date keeps an evening bar after 20:00 New York
+time (past midnight UTC) on its own session's bounds instead of the
+next session's.
+join_bounds() attaches bounds to bars by direct array indexing: the
+bounds rows are scattered into a dense table over their day span (times
+their distinct time-of-day slots for intraday bounds), and every bar
+finds its row with one gather, with no hash merge and no per-row objects.
+Prices and bounds can be narrowed to float32 (opt-in) to halve their
+memory; the simulation still computes in float64.
+"""
+import datetime
+
+import numpy as np
+
+from session_calendar import NS_PER_DAY, NS_PER_MINUTE, local_days
+
+MINUTES_PER_DAY = 24 * 60
+FLOAT32_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume', 'Sigma', 'UpperBound', 'LowerBound')
+
+
+def bar_keys(timestamps):
+    """(session day, UTC minute) keys of int64 UTC-nanosecond timestamps."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    minute = (timestamps % NS_PER_DAY) // NS_PER_MINUTE
+    return local_days(timestamps).astype(np.int32), minute.astype(np.int16)
+
+
+def date_keys(dates):
+    """int32 day ordinals of a Date column (date objects or 'YYYY-MM-DD' strings)."""
+    import pandas as pd
+
+    return pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]').astype(np.int32)
+
+
+def time_keys(times):
+    """int16 minutes after midnight of a Time column (time objects or 'HH:MM[:SS]' strings)."""
+    import pandas as pd
+
+    # Only the distinct times are parsed; a table has at most one per slot
+    codes, uniques = pd.factorize(pd.Series(times).astype(str))
+    parts = pd.Series(uniques).str.split(':', expand=True)
+    minutes = (parts[0].astype(np.int16) * 60 + parts[1].astype(np.int16)).values
+    return minutes[codes]
+
+
+def day_dates(days):
+    """datetime64[D] dates of day ordinals."""
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]')
+
+
+def minute_times(minutes):
+    """datetime.time objects of minute-of-day keys (for the few distinct slots of a table)."""
+    return np.array([datetime.time(m // 60, m % 60) for m in np.asarray(minutes, dtype=np.int64)], dtype=object)
+
+
+def bounds_rows(bar_day, bar_minute, bounds_day, bounds_minute=None):
+    """Row of the bounds table for every bar, -1 where there is none.
+
+    Daily bounds are keyed by day only; pass `bounds_minute` for
+    time-of-day bounds.  Bounds keys are expected to be unique.
+    """
+    bar_day = np.asarray(bar_day, dtype=np.int64)
+    bounds_day = np.asarray(bounds_day, dtype=np.int64)
+    rows = np.full(len(bar_day), -1, dtype=np.int64)
+    if len(bounds_day) == 0:
+        return rows
+
+    first_day = bounds_day.min()
+    span = int(bounds_day.max() - first_day) + 1
+    offset = bar_day - first_day
+    hit = (offset >= 0) & (offset < span)
+    if bounds_minute is None:
+        table = np.full(span, -1, dtype=np.int32)
+        table[bounds_day - first_day] = np.arange(len(bounds_day))
+        rows[hit] = table[offset[hit]]
+        return rows
+
+    # int16 slot numbers of the bounds' distinct times of day
+    minutes = np.unique(bounds_minute)
+    slot_of_minute = np.full(MINUTES_PER_DAY, -1, dtype=np.int16)
+    slot_of_minute[minutes] = np.arange(len(minutes))
+    table = np.full((span, len(minutes)), -1, dtype=np.int32)
+    table[bounds_day - first_day, slot_of_minute[bounds_minute]] = np.arange(len(bounds_day))
+    bar_slot = slot_of_minute[np.asarray(bar_minute, dtype=np.int64)]
+    hit &= bar_slot >= 0
+    rows[hit] = table[offset[hit], bar_slot[hit]]
+    return rows
+
+
+def join_bounds(bars, bounds, float32=False):
+    """The bars (a frame with a sorted 'Datetime' column) that have bounds, with the bounds columns added.
+
+    `bounds` has a Date column and, for time-of-day bounds, a Time column.
+    Bars without bounds are dropped, as in an inner merge, and the bars'
+    order is kept.  The result has int32 Day and int16 Minute key columns
+    in place of Date/Time objects; float32=True narrows the price and
+    bounds columns.
+    """
+    import pandas as pd
+
+    day, minute = bar_keys(pd.DatetimeIndex(bars['Datetime']).as_unit('ns').asi8)
+    bounds_minute = time_keys(bounds['Time']) if 'Time' in bounds.columns else None
+    rows = bounds_rows(day, minute, date_keys(bounds['Date']), bounds_minute)
+
+    keep = np.flatnonzero(rows >= 0)
+    rows = rows[keep]
+    joined = bars.take(keep).reset_index(drop=True)
+    joined['Day'] = day[keep]
+    joined['Minute'] = minute[keep]
+    for column in bounds.columns.drop(['Date', 'Time'], errors='ignore'):
+        joined[column] = bounds[column].values[rows]
+    if float32:
+        narrowed = [column for column in FLOAT32_COLUMNS if column in joined.columns]
+        joined[narrowed] = joined[narrowed].astype(np.float32)
+    return joined
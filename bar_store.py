@@ -0,0 +1,216 @@
+"""Columnar bar store with memory-mapped reads.
+
+Each (symbol, interval) dataset is a directory of raw NumPy column files
+sorted by time, so a date range is a contiguous row range:
+
+    <root>/<symbol>/<interval>/CURRENT         name of the live version
+                               <version>/timestamp.npy   int64 UTC nanoseconds
+                                         open.npy ... volume.npy   float64
+                                         sessions.npy   one row per session date:
+                                                        date, start, end (row offsets)
+
+A write builds a new version directory and then switches CURRENT with a
+single os.replace, so readers always see either the old or the new
+dataset in full.  The version it replaced is kept until the next write,
+for readers that looked up CURRENT just before the switch.
+
+Session dates are New York dates (session_calendar.local_days), the
+sessions of SessionCalendar, so an evening bar after 20:00 New York time
+stays in its session although it falls on the next UTC date.
+
+The session index is the partitioning: opening a date range or a single
+session is two binary searches and slices of memory-mapped columns, with
+no parsing and no copies.
+
+    python bar_store.py import sp500_30min_14d.csv ^GSPC 30m
+"""
+import argparse
+import datetime
+import os
+import shutil
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+from session_calendar import local_days
+
+DEFAULT_STORE_DIR = 'bar_store'
+COLUMN_FILES = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+CURRENT = 'CURRENT'
+SESSION_DTYPE = np.dtype([('date', 'M8[D]'), ('start', 'i8'), ('end', 'i8')])
+
+
+class BarSlice:
+    """A contiguous range of bars: zero-copy column views plus its session index."""
+
+    def __init__(self, timestamp, columns, sessions):
+        self.timestamp = timestamp
+        self.columns = columns
+        self.sessions = sessions
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    @property
+    def dates(self):
+        return self.sessions['date']
+
+    def session(self, date):
+        """The bars of one session date, or None when the slice has no such session."""
+        day = _day(date)
+        k = np.searchsorted(self.sessions['date'], day)
+        if k == len(self.sessions) or self.sessions['date'][k] != day:
+            return None
+        return self.session_at(k)
+
+    def session_at(self, k):
+        lo, hi = self.sessions['start'][k], self.sessions['end'][k]
+        sessions = self.sessions[k:k + 1].copy()
+        sessions['start'] -= lo
+        sessions['end'] -= lo
+        return BarSlice(self.timestamp[lo:hi], {c: a[lo:hi] for c, a in self.columns.items()}, sessions)
+
+    def iter_sessions(self):
+        """One BarSlice per session, in order; memory-mapped columns are only read as each is used."""
+        for k in range(len(self.sessions)):
+            yield self.session_at(k)
+
+    def times(self):
+        import pandas as pd
+
+        return pd.DatetimeIndex(pd.to_datetime(np.asarray(self.timestamp), utc=True), name='Datetime')
+
+    def to_frame(self):
+        """Bars as a DataFrame in the market_data layout (copies the columns)."""
+        import pandas as pd
+
+        return pd.DataFrame({c: np.asarray(a) for c, a in self.columns.items()}, index=self.times())
+
+
+class BarStore:
+    """Columnar datasets under `root`, one per (symbol, interval)."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root, quote(symbol, safe=''), interval)
+
+    def current(self, symbol, interval):
+        """Directory of the live version of the dataset, or None when there is none."""
+        path = self.path(symbol, interval)
+        try:
+            with open(os.path.join(path, CURRENT)) as f:
+                return os.path.join(path, f.read().strip())
+        except FileNotFoundError:
+            # Stores written before versioning keep the columns in `path` itself
+            return path if os.path.exists(os.path.join(path, 'sessions.npy')) else None
+
+    def exists(self, symbol, interval):
+        return self.current(symbol, interval) is not None
+
+    def write(self, symbol, interval, bars, replace=False):
+        """Add bars to the dataset, replacing overlapping timestamps.
+
+        `bars` is indexed by UTC timestamps with Open/High/Low/Close(/Volume)
+        columns.  The dataset is rewritten into a fresh version directory and
+        switched in atomically, so readers holding memory maps of the old
+        files are unaffected.  Writes to one dataset must not run
+        concurrently; BarCache serializes them per dataset.
+        """
+        import pandas as pd
+
+        if not replace and self.exists(symbol, interval):
+            bars = pd.concat([self.open(symbol, interval).to_frame(), bars])
+        bars = bars[~bars.index.duplicated(keep='last')].sort_index()
+
+        path = self.path(symbol, interval)
+        previous = self.current(symbol, interval)
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        target = os.path.join(path, version)
+        os.makedirs(target)
+
+        timestamp = bars.index.as_unit('ns').asi8
+        np.save(os.path.join(target, 'timestamp.npy'), timestamp)
+        for column, name in COLUMN_FILES.items():
+            values = bars[column].values if column in bars.columns else np.full(len(bars), np.nan)
+            np.save(os.path.join(target, f'{name}.npy'), np.ascontiguousarray(values, dtype=np.float64))
+
+        days, starts = np.unique(local_days(timestamp), return_index=True)
+        sessions = np.empty(len(days), dtype=SESSION_DTYPE)
+        sessions['date'] = days.astype('M8[D]')
+        sessions['start'] = starts
+        sessions['end'] = np.append(starts[1:], len(timestamp))
+        np.save(os.path.join(target, 'sessions.npy'), sessions)
+
+        pointer = os.path.join(path, f"{CURRENT}.{version}")
+        with open(pointer, 'w') as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(path, CURRENT))
+        _prune(path, keep={version, os.path.basename(previous or '')})
+
+    def open(self, symbol, interval, start=None, end=None):
+        """Memory-map the sessions with start <= date <= end (all when None)."""
+        path = self.current(symbol, interval)
+        if path is None:
+            raise FileNotFoundError(f"no {symbol} {interval} dataset in {self.root}")
+        sessions = np.load(os.path.join(path, 'sessions.npy'))
+        total = int(sessions['end'][-1]) if len(sessions) else 0
+
+        first = 0 if start is None else np.searchsorted(sessions['date'], _day(start), 'left')
+        last = len(sessions) if end is None else np.searchsorted(sessions['date'], _day(end), 'right')
+        sessions = sessions[first:max(first, last)].copy()
+        lo = int(sessions['start'][0]) if len(sessions) else 0
+        hi = int(sessions['end'][-1]) if len(sessions) else 0
+        sessions['start'] -= lo
+        sessions['end'] -= lo
+
+        def column(name):
+            data = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') if total else np.empty(0)
+            return data[lo:hi]
+
+        return BarSlice(column('timestamp'), {c: column(name) for c, name in COLUMN_FILES.items()}, sessions)
+
+
+def _prune(path, keep):
+    """Remove the versions of a dataset other than `keep`, stray pointers and pre-versioning column files."""
+    for entry in os.scandir(path):
+        if entry.name == CURRENT or entry.name in keep:
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.endswith('.npy') or entry.name.startswith(f'{CURRENT}.'):
+            os.remove(entry.path)
+
+
+def _day(date):
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return np.datetime64(date, 'D')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    imp = commands.add_parser('import', help='import a Yahoo-format CSV into the store')
+    imp.add_argument('csv')
+    imp.add_argument('symbol')
+    imp.add_argument('interval')
+    imp.add_argument('--root', default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+
+    from market_data import read_yahoo_csv
+
+    store = BarStore(args.root)
+    store.write(args.symbol, args.interval, read_yahoo_csv(args.csv))
+    data = store.open(args.symbol, args.interval)
+    print(f"{args.symbol} {args.interval}: {len(data)} bars in {len(data.sessions)} sessions "
+          f"({data.dates[0]} to {data.dates[-1]})")
+
+
+if __name__ == '__main__':
+    main()
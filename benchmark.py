@@ -0,0 +1,182 @@
+"""Benchmark the bounds and backtest hot paths on synthetic data.
+
+Each scale generates deterministic bars with synthetic_data and times the
+stages the scripts run: daily bounds (2_week_bounds.py), intraday per-slot
+sigma (Intraday_bounds.py), the CSV load and merge of prices with bounds,
+and the backtest.py / enhanced_backtest.py simulations.  Results go to a
+JSON file; --compare flags stages slower than a previous results file.
+
+    python benchmark.py                          # small and medium scales
+    python benchmark.py --scales large --repeats 1
+    python benchmark.py --compare baseline.json
+    python benchmark.py --scales small --startup   # plus the momentum CLI cold start
+
+--startup also times `python -m momentum bounds|backtest` in fresh
+interpreters on a bar store dataset and fails when the median exceeds
+momentum.cli.COLD_START_BUDGET.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bar_keys import join_bounds
+from bar_store import BarStore
+from market_data import read_yahoo_csv
+from momentum.cli import COLD_START_BUDGET
+from noise_bounds import daily_noise_bounds, intraday_noise_bounds
+from session_calendar import SessionCalendar
+from simulation import make_params, njit, simulate
+from synthetic_data import synthetic_bars, write_yahoo_csv
+from universe_runner import ENHANCED_PARAMS
+
+SCALES = {
+    'small': dict(years=1, interval='30m'),
+    'medium': dict(years=5, interval='5m'),
+    'large': dict(years=10, interval='1m'),
+}
+STAGES = ('daily_bounds', 'intraday_sigma', 'load_merge', 'backtest', 'enhanced_backtest')
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+
+def load_merge(csv_path, bounds_df):
+    """The price loading and bounds join of backtest.py."""
+    return join_bounds(read_yahoo_csv(csv_path).reset_index(), bounds_df)
+
+
+def run_backtest(merged, params):
+    calendar = SessionCalendar.from_frame(merged)
+    return simulate(merged, params, calendar.open_flags(), calendar.close_flags())
+
+
+def time_call(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def bench_scale(name, config, repeats, stages, seed, workdir):
+    bars = synthetic_bars(seed=seed, gap_rate=0.001, half_day_rate=0.01, **config)['SYN000']
+    data = bars.reset_index()
+    csv_path = os.path.join(workdir, f'{name}.csv')
+    write_yahoo_csv(bars, csv_path, 'SYN000')
+    sessions = len(SessionCalendar.from_frame(data))
+    bounds_df = daily_noise_bounds(data, calendar=SessionCalendar.from_frame(data))
+    merged = load_merge(csv_path, bounds_df)
+
+    calls = {
+        'daily_bounds': lambda: daily_noise_bounds(data, calendar=SessionCalendar.from_frame(data)),
+        'intraday_sigma': lambda: intraday_noise_bounds(data, calendar=SessionCalendar.from_frame(data)),
+        'load_merge': lambda: load_merge(csv_path, bounds_df),
+        'backtest': lambda: run_backtest(merged, make_params()),
+        'enhanced_backtest': lambda: run_backtest(merged, make_params(**ENHANCED_PARAMS)),
+    }
+    results = []
+    for stage in stages:
+        times = time_call(calls[stage], repeats)
+        best = min(times)
+        results.append(dict(scale=name, stage=stage, bars=len(bars), sessions=sessions,
+                            repeats=repeats, best_s=best, median_s=float(np.median(times)),
+                            bars_per_s=len(bars) / best if best > 0 else float('inf'), **config))
+        print(f"{name:>7} {stage:<18} {len(bars):>9,} bars  best {best * 1e3:10.2f} ms  "
+              f"{results[-1]['bars_per_s']:>14,.0f} bars/s")
+    return results
+
+
+def bench_startup(repeats, seed, workdir):
+    """Cold-start wall time of each momentum CLI command on the small scale, read from a bar store."""
+    config = SCALES['small']
+    bars = synthetic_bars(seed=seed, **config)['SYN000']
+    store = os.path.join(workdir, 'startup_store')
+    BarStore(store).write('SYN000', config['interval'], bars)
+    results = []
+    for command, budget in COLD_START_BUDGET.items():
+        argv = [sys.executable, '-m', 'momentum', command, 'SYN000', '--interval', config['interval'], '--store', store]
+        times = time_call(lambda: subprocess.run(argv, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                                 stdout=subprocess.DEVNULL, check=True), max(repeats, 5))
+        median = float(np.median(times))
+        results.append(dict(scale='startup', stage=command, bars=len(bars), repeats=len(times), best_s=min(times),
+                            median_s=median, budget_s=budget))
+        flag = 'OVER BUDGET' if median > budget else ''
+        print(f"startup {command:<18} {len(bars):>9,} bars  median {median * 1e3:8.1f} ms  "
+              f"budget {budget * 1e3:6.0f} ms {flag}")
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': pd.Timestamp.now(tz='UTC').isoformat(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'numba': njit is not None,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print stage timings against a baseline file; returns the regressed (scale, stage) pairs."""
+    with open(baseline_path) as f:
+        baseline = {(r['scale'], r['stage']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\nCompared with {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in results:
+        base = baseline.get((r['scale'], r['stage']))
+        if base is None or base['bars'] != r['bars']:
+            continue
+        ratio = r['best_s'] / base['best_s'] if base['best_s'] > 0 else float('inf')
+        flag = 'REGRESSION' if ratio > 1 + tolerance else ''
+        print(f"{r['scale']:>7} {r['stage']:<18} {ratio:6.2f}x {flag}")
+        if flag:
+            regressions.append((r['scale'], r['stage']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bounds and backtest stages on synthetic bars')
+    parser.add_argument('--scales', default='small,medium', help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='previous results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before flagging')
+    parser.add_argument('--startup', action='store_true', help='also time the momentum CLI cold start')
+    args = parser.parse_args()
+
+    stages = args.stages.split(',')
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.scales.split(','):
+            results += bench_scale(name, SCALES[name], args.repeats, stages, args.seed, workdir)
+        if args.startup:
+            results += bench_startup(args.repeats, args.seed, workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    over_budget = [r for r in results if r['median_s'] > r.get('budget_s', float('inf'))]
+    if over_budget or (args.compare and compare(results, args.compare, args.tolerance)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+"""Local bounds query service.
+
+Loads precomputed bounds tables (the CSVs written by 2_week_bounds.py and
+Intraday_bounds.py) for many symbols into memory and answers point, range
+and batch queries over HTTP on localhost or a Unix socket, so consumers
+do not parse the CSVs themselves.
+
+Every table is indexed by one sorted int64 key per row,
+day * 1440 + minute (bar_keys.py day ordinals and UTC minutes after
+midnight), so a lookup is a binary search.  Tables may have a Date column
+(daily bounds), a Time column (a time-of-day profile such as
+noise_bounds_sample.csv) or both (per-slot bounds); a point query returns
+the row in force at the given date and time: the day's row, or the last
+slot starting at or before the time.
+
+Source files are polled for changes and reloaded in the background; a
+table that fails to parse (e.g. while it is being written) keeps its
+previous contents until the next poll.
+
+    python bounds_service.py --dir bounds/ --table ^GSPC=daily_noise_bounds.csv --port 8765
+    curl 'localhost:8765/bounds?symbol=^GSPC&date=2025-06-17&time=14:05'
+    curl 'localhost:8765/range?symbol=^GSPC&start=2025-06-16&end=2025-06-20'
+    curl -d '{"queries": [{"symbol": "^GSPC", "date": "2025-06-17"}]}' localhost:8765/batch
+"""
+import argparse
+import bisect
+import datetime
+import glob
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from bar_keys import MINUTES_PER_DAY, date_keys, day_dates, time_keys
+
+BOUNDS_COLUMNS = ('Sigma', 'UpperBound', 'LowerBound')
+DEFAULT_PORT = 8765
+RELOAD_INTERVAL = 1.0
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def parse_day(date):
+    """Day ordinal of 'YYYY-MM-DD' (or a date)."""
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def parse_minute(time):
+    """UTC minute of day of 'HH:MM[:SS]'."""
+    hours, minutes = str(time).split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class BoundsTable:
+    """One symbol's bounds rows sorted by their (day, minute) key."""
+
+    def __init__(self, days, minutes, values, has_date, has_time):
+        keys = np.asarray(days, dtype=np.int64) * MINUTES_PER_DAY + np.asarray(minutes, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        self.has_date = has_date
+        self.has_time = has_time
+        # Python copies for point lookups: bisect on a list beats a NumPy call per query
+        self._key_list = self.keys.tolist()
+        self._rows = [dict(zip(BOUNDS_COLUMNS, (None if v != v else v for v in row))) for row in self.values.tolist()]
+        days, minutes = np.divmod(self.keys, MINUTES_PER_DAY)
+        if has_date:
+            for row, date in zip(self._rows, day_dates(days).astype(str).tolist()):
+                row['Date'] = date
+        if has_time:
+            for row, minute in zip(self._rows, minutes.tolist()):
+                row['Time'] = f'{minute // 60:02d}:{minute % 60:02d}'
+
+    @classmethod
+    def read_csv(cls, path):
+        table = pd.read_csv(path)
+        has_date, has_time = 'Date' in table.columns, 'Time' in table.columns
+        days = date_keys(table['Date']) if has_date else np.zeros(len(table), dtype=np.int32)
+        minutes = time_keys(table['Time']) if has_time else np.zeros(len(table), dtype=np.int16)
+        return cls(days, minutes, table[list(BOUNDS_COLUMNS)].values, has_date, has_time)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _query_key(self, day, minute):
+        return (day if self.has_date else 0) * MINUTES_PER_DAY + (minute if self.has_time else 0)
+
+    def lookup(self, day, minute=0):
+        """Row in force at (day, minute), or None."""
+        key = self._query_key(day, minute)
+        k = bisect.bisect_right(self._key_list, key) - 1
+        if k < 0 or self._key_list[k] // MINUTES_PER_DAY != key // MINUTES_PER_DAY:
+            return None
+        return self._rows[k]
+
+    def lookup_many(self, days, minutes):
+        """Row index in force at every (day, minute), -1 where there is none."""
+        days = np.asarray(days, dtype=np.int64)
+        keys = np.broadcast_to(self._query_key(days, np.asarray(minutes, dtype=np.int64)), days.shape)
+        rows = np.searchsorted(self.keys, keys, 'right') - 1
+        found = (rows >= 0) & (self.keys[np.maximum(rows, 0)] // MINUTES_PER_DAY == keys // MINUTES_PER_DAY)
+        return np.where(found, rows, -1)
+
+    def row_range(self, first_day=None, last_day=None):
+        """Rows with first_day <= Date <= last_day (all rows of a table without dates)."""
+        lo = 0 if first_day is None or not self.has_date else bisect.bisect_left(self._key_list, first_day * MINUTES_PER_DAY)
+        hi = len(self) if last_day is None or not self.has_date else bisect.bisect_left(
+            self._key_list, (last_day + 1) * MINUTES_PER_DAY)
+        return self._rows[lo:hi]
+
+    def row(self, k):
+        return self._rows[k]
+
+
+class BoundsIndex:
+    """Bounds tables of all symbols, reloaded when their source files change.
+
+    Tables come from `tables` ({symbol: csv path}) and from every
+    `<symbol>.csv` in `directory` (symbols URL-quoted, as in bar_store.py).
+    The {symbol: table} mapping is replaced as a whole on reload, so a
+    query always sees one consistent snapshot.
+    """
+
+    def __init__(self, tables=None, directory=None):
+        self.sources = dict(tables or {})
+        self.directory = directory
+        self.tables = {}
+        self._stamps = {}
+        self._stop = threading.Event()
+        self.reload()
+
+    def _sources(self):
+        sources = {}
+        if self.directory is not None:
+            for path in sorted(glob.glob(os.path.join(self.directory, '*.csv'))):
+                sources[unquote(os.path.basename(path)[:-4])] = path
+        sources.update(self.sources)
+        return sources
+
+    def reload(self):
+        """Re-read new and changed source files; returns the symbols that were (re)loaded."""
+        tables, stamps, loaded = {}, {}, []
+        for symbol, path in self._sources().items():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._stamps.get(symbol) == stamp and symbol in self.tables:
+                tables[symbol], stamps[symbol] = self.tables[symbol], stamp
+                continue
+            try:
+                tables[symbol] = BoundsTable.read_csv(path)
+            except (OSError, ValueError, KeyError, IndexError):
+                # Half-written or malformed: keep serving the previous table
+                if symbol in self.tables:
+                    tables[symbol], stamps[symbol] = self.tables[symbol], self._stamps[symbol]
+                continue
+            stamps[symbol] = stamp
+            loaded.append(symbol)
+        self.tables, self._stamps = tables, stamps
+        return loaded
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Poll the source files every `interval` seconds on a daemon thread."""
+        def run():
+            while not self._stop.wait(interval):
+                self.reload()
+        thread = threading.Thread(target=run, name='bounds-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self._stop.set()
+
+    def lookup(self, symbol, date, time=None):
+        table = self.tables[symbol]
+        return table.lookup(parse_day(date) if date is not None else 0, parse_minute(time) if time is not None else 0)
+
+    def range(self, symbol, start=None, end=None):
+        return self.tables[symbol].row_range(None if start is None else parse_day(start),
+                                             None if end is None else parse_day(end))
+
+    def batch(self, queries):
+        """Results of [{'symbol', 'date', 'time'}, ...] in order; None where there is no row or symbol."""
+        results = [None] * len(queries)
+        by_symbol = {}
+        for k, query in enumerate(queries):
+            by_symbol.setdefault(query['symbol'], []).append(k)
+        tables = self.tables
+        for symbol, positions in by_symbol.items():
+            table = tables.get(symbol)
+            if table is None:
+                continue
+            days = [parse_day(queries[k]['date']) if queries[k].get('date') is not None else 0 for k in positions]
+            minutes = [parse_minute(queries[k]['time']) if queries[k].get('time') is not None else 0
+                       for k in positions]
+            for k, row in zip(positions, table.lookup_many(days, minutes).tolist()):
+                if row >= 0:
+                    results[k] = table.row(row)
+        return results
+
+
+class BoundsHandler(BaseHTTPRequestHandler):
+    """GET /bounds, GET /range, POST /batch and GET /symbols against server.index."""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, so clients can reuse one connection
+    wbufsize = -1  # buffered: headers and body leave in one write, not held back by Nagle's algorithm
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        args = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        index = self.server.index
+        if url.path == '/symbols':
+            return self._send(200, {symbol: len(table) for symbol, table in index.tables.items()})
+        if url.path not in ('/bounds', '/range'):
+            return self._send(404, {'error': f'no route {url.path}'})
+        symbol = args.get('symbol')
+        if symbol is None:
+            return self._send(400, {'error': 'symbol is required'})
+        if symbol not in index.tables:
+            return self._send(404, {'error': f'unknown symbol {symbol}'})
+        try:
+            if url.path == '/range':
+                return self._send(200, {'rows': index.range(symbol, args.get('start'), args.get('end'))})
+            row = index.lookup(symbol, args.get('date'), args.get('time'))
+        except ValueError as exc:
+            return self._send(400, {'error': str(exc)})
+        if row is None:
+            return self._send(404, {'error': 'no bounds at that date/time'})
+        self._send(200, row)
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/batch':
+            return self._send(404, {'error': f'no route {self.path}'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            return self._send(200, {'results': self.server.index.batch(body['queries'])})
+        except (KeyError, TypeError, ValueError) as exc:
+            return self._send(400, {'error': str(exc)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixBoundsServer(socketserver.ThreadingUnixStreamServer):
+    """The HTTP service on a Unix domain socket."""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+
+def make_server(index, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+    """An HTTP server answering from `index`, on host:port or on the Unix socket `unix_path`."""
+    if unix_path is not None:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        server = UnixBoundsServer(unix_path, BoundsHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), BoundsHandler)
+    server.index = index
+    return server
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class BoundsClient:
+    """Keep-alive client of the service (host:port or a Unix socket path); not thread-safe."""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, timeout=5.0):
+        if unix_path is not None:
+            self.connection = _UnixConnection(unix_path, timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        payload = json.loads(response.read())
+        if response.status == 404 and path.startswith('/bounds'):
+            return None
+        if response.status != 200:
+            raise LookupError(payload.get('error'))
+        return payload
+
+    def bounds(self, symbol, date=None, time=None):
+        """Sigma/UpperBound/LowerBound in force at date and time, or None."""
+        query = f'symbol={quote(symbol)}'
+        if date is not None:
+            query += f'&date={date}'
+        if time is not None:
+            query += f'&time={time}'
+        return self._request('GET', f'/bounds?{query}')
+
+    def range(self, symbol, start=None, end=None):
+        query = f'symbol={quote(symbol)}'
+        if start is not None:
+            query += f'&start={start}'
+        if end is not None:
+            query += f'&end={end}'
+        return self._request('GET', f'/range?{query}')['rows']
+
+    def batch(self, queries):
+        return self._request('POST', '/batch', json.dumps({'queries': queries}))['results']
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=None, help='directory of <symbol>.csv bounds tables')
+    parser.add_argument('--table', action='append', default=[], metavar='SYMBOL=CSV',
+                        help='one bounds table (repeatable)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None, help='serve on this Unix socket instead of TCP')
+    parser.add_argument('--reload', type=float, default=RELOAD_INTERVAL, help='seconds between change checks')
+    args = parser.parse_args()
+
+    tables = dict(spec.split('=', 1) for spec in args.table)
+    if not tables and args.dir is None:
+        tables = {'^GSPC': 'daily_noise_bounds.csv'}
+    index = BoundsIndex(tables, args.dir)
+    index.watch(args.reload)
+    server = make_server(index, args.host, args.port, args.unix)
+    where = args.unix or f'http://{args.host}:{args.port}'
+    print(f"Serving bounds for {len(index.tables)} symbols on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
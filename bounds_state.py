@@ -0,0 +1,197 @@
+"""Online noise bounds for live trading.
+
+BoundsState keeps ring buffers of the last `lookback` session returns and
+of the last `lookback` sessions' per-slot moves, with running sums and
+counts, so closing a session or recording a bar costs O(1) per slot
+instead of recomputing sigma over the window.  It reproduces the batch
+output of noise_bounds.daily_noise_bounds() and intraday_noise_bounds()
+and can be saved and restored, so a restart resumes without downloading
+and recomputing history.
+
+Live loop:
+
+    state.open_session(open_price)     # today's bounds are now available
+    state.on_bar(slot, close)          # for every bar of the session
+    state.close_session(close_price)   # after the last bar
+"""
+import io
+
+import numpy as np
+
+from bar_keys import bar_keys
+from noise_bounds import LOOKBACK, MIN_SLOT_SESSIONS
+from session_calendar import SessionCalendar
+
+
+class BoundsState:
+    """Ring-buffered sigma windows for the daily and time-of-day bounds.
+
+    Slots are int16 minute-of-day keys of the bars (UTC minutes after
+    midnight, as bar_keys.bar_keys() gives them).  Running sums are
+    rebuilt from the ring each time it wraps, so float drift from adding
+    and subtracting never outlives one window.
+    """
+
+    def __init__(self, lookback=LOOKBACK, min_periods=MIN_SLOT_SESSIONS):
+        self.lookback = lookback
+        self.min_periods = min_periods
+        self.sessions_closed = 0
+        self.head = 0
+        self.open_price = np.nan
+        self.prev_close = np.nan
+
+        # Daily session returns |close / open - 1|
+        self.returns = np.zeros(lookback)
+        self.returns_sum = 0.0
+
+        # Per-slot moves |close_slot / open - 1| of the last sessions (NaN = no bar)
+        self.slots = []
+        self.slot_index = {}
+        self.moves = np.full((lookback, 0), np.nan)
+        self.moves_sum = np.zeros(0)
+        self.moves_count = np.zeros(0, dtype=np.int64)
+        self.current_moves = np.full(0, np.nan)
+
+    # -- updates --------------------------------------------------------
+
+    def _slot(self, slot):
+        k = self.slot_index.get(slot)
+        if k is None:
+            k = len(self.slots)
+            self.slots.append(slot)
+            self.slot_index[slot] = k
+            self.moves = np.concatenate([self.moves, np.full((self.lookback, 1), np.nan)], axis=1)
+            self.moves_sum = np.append(self.moves_sum, 0.0)
+            self.moves_count = np.append(self.moves_count, 0)
+            self.current_moves = np.append(self.current_moves, np.nan)
+        return k
+
+    def open_session(self, open_price):
+        """Start a session; bounds for it are available from here on."""
+        self.open_price = float(open_price)
+        self.current_moves[:] = np.nan
+
+    def on_bar(self, slot, close):
+        """Record the close of the bar in time slot `slot` of the current session (first bar per slot wins)."""
+        k = self._slot(slot)
+        if np.isnan(self.current_moves[k]):
+            self.current_moves[k] = abs(close / self.open_price - 1)
+
+    def close_session(self, close):
+        """Push the finished session into the windows."""
+        evicted = self.head
+        full = self.sessions_closed >= self.lookback
+
+        ret = abs(close / self.open_price - 1)
+        if full:
+            self.returns_sum -= self.returns[evicted]
+            old = self.moves[evicted]
+            seen = ~np.isnan(old)
+            self.moves_sum[seen] -= old[seen]
+            self.moves_count -= seen
+        self.returns[evicted] = ret
+        self.returns_sum += ret
+        self.moves[evicted] = self.current_moves
+        seen = ~np.isnan(self.current_moves)
+        self.moves_sum[seen] += self.current_moves[seen]
+        self.moves_count += seen
+
+        self.head = (self.head + 1) % self.lookback
+        self.sessions_closed += 1
+        if self.head == 0:
+            self.returns_sum = self.returns.sum()
+            self.moves_sum = np.nansum(self.moves, axis=0)
+
+        self.prev_close = float(close)
+        self.open_price = np.nan
+        self.current_moves[:] = np.nan
+
+    # -- queries --------------------------------------------------------
+
+    def _widen(self, sigma):
+        upper = max(self.open_price, self.prev_close) * (1 + sigma)
+        lower = min(self.open_price, self.prev_close) * (1 - sigma)
+        return sigma, upper, lower
+
+    def daily_bounds(self):
+        """(sigma, upper, lower) for the current session; NaN before any history."""
+        count = min(self.sessions_closed, self.lookback)
+        sigma = self.returns_sum / count if count else np.nan
+        return self._widen(sigma)
+
+    def slot_bounds(self, slot):
+        """(sigma, upper, lower) for a time slot of the current session; NaN with too little history."""
+        k = self.slot_index.get(slot)
+        if k is None or self.moves_count[k] < max(self.min_periods, 1):
+            return self._widen(np.nan)
+        return self._widen(self.moves_sum[k] / self.moves_count[k])
+
+    def slot_table(self):
+        """{slot: (sigma, upper, lower)} for every slot with enough history."""
+        table = {}
+        for slot in sorted(self.slots):
+            bounds = self.slot_bounds(slot)
+            if not np.isnan(bounds[0]):
+                table[slot] = bounds
+        return table
+
+    # -- history and persistence ----------------------------------------
+
+    def replay(self, timestamps, opens, closes, calendar=None):
+        """Feed whole sessions of sorted bars (int64 UTC-nanosecond timestamps, Open and Close arrays).
+
+        Sessions and their open/close bars come from `calendar`, a
+        SessionCalendar of the same timestamps (built when None), as in the
+        batch bounds; bars off the calendar are skipped.  Returns self,
+        left after the last session's close.
+        """
+        calendar = SessionCalendar(timestamps) if calendar is None else calendar
+        session_opens = calendar.session_opens(opens)
+        session_closes = calendar.session_closes(closes)
+        minutes = bar_keys(timestamps)[1].tolist()
+        closes = np.asarray(closes, dtype=float).tolist()
+        rows = np.flatnonzero(calendar.session >= 0)
+        bounds = np.searchsorted(calendar.session[rows], np.arange(len(calendar) + 1))
+        for k in range(len(calendar)):
+            self.open_session(session_opens[k])
+            for i in rows[bounds[k]:bounds[k + 1]].tolist():
+                self.on_bar(minutes[i], closes[i])
+            self.close_session(session_closes[k])
+        return self
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez(buffer,
+                 scalars=np.array([self.lookback, self.min_periods, self.sessions_closed, self.head]),
+                 prices=np.array([self.open_price, self.prev_close, self.returns_sum]),
+                 returns=self.returns,
+                 slots=np.array(self.slots, dtype=np.int16),
+                 moves=self.moves, moves_sum=self.moves_sum, moves_count=self.moves_count,
+                 current_moves=self.current_moves)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        saved = np.load(io.BytesIO(data), allow_pickle=False)
+        lookback, min_periods, sessions_closed, head = saved['scalars'].tolist()
+        state = cls(lookback, min_periods)
+        state.sessions_closed = sessions_closed
+        state.head = head
+        state.open_price, state.prev_close, state.returns_sum = saved['prices'].tolist()
+        state.returns = saved['returns']
+        state.slots = saved['slots'].tolist()
+        state.slot_index = {slot: k for k, slot in enumerate(state.slots)}
+        state.moves = saved['moves']
+        state.moves_sum = saved['moves_sum']
+        state.moves_count = saved['moves_count']
+        state.current_moves = saved['current_moves']
+        return state
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
@@ -0,0 +1,246 @@
+"""Checkpoint and resume for long backtests.
+
+A backtest over years of minute bars, or over a history that grows by a
+session a day, should not start again from the first bar.  run() keeps
+everything the simulation carries from one session to the next in a
+Checkpoint: the simulator state and metrics accumulators, the per-session
+PnL, every session's open and close (what the daily bounds of later
+sessions are computed from) and the trades so far.  A checkpoint is
+taken at a session boundary, where the strategy is always flat, and
+saved as one .npz file.
+
+    python checkpoint.py ^GSPC --interval 1m --checkpoint gspc_1m.npz
+
+Resuming from a checkpoint only reads and simulates the bars after it and
+gives the same trades, metrics and session PnL as a full rerun.  The last
+session in the data may still be growing, so it is simulated but not
+checkpointed: the next run starts again from its first bar.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from bar_store import DEFAULT_STORE_DIR, BarStore
+from metrics import M_SESSION, finish_session, initial_metrics
+from noise_bounds import LOOKBACK, daily_bounds_arrays
+from session_calendar import SessionCalendar
+from simulation import (ENHANCED_PARAMS, ENTRY_INDEX, T_ENTRY_INDEX, T_EXIT_INDEX, TRADE_FIELDS, SimulationResult,
+                        initial_state, make_params, simulate)
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_FIELDS = ('params', 'lookback', 'initial_aum', 'state', 'metrics', 'session_pnl', 'dates', 'opens',
+                     'closes', 'trades', 'trade_times', 'n_rows', 'last_timestamp')
+
+
+class Checkpoint:
+    """Simulation state as of the end of a session.
+
+    `dates`, `opens` and `closes` have one entry per session so far,
+    `session_pnl` one per simulated session.  `trades` index simulated bars
+    counted from the start of the history (`n_rows` so far) and
+    `trade_times` holds their entry and exit times (int64 UTC ns).
+    `last_timestamp` is the last bar covered; a resumed run starts after it.
+    """
+
+    def __init__(self, params, lookback, initial_aum, state, metrics, session_pnl, dates, opens, closes, trades,
+                 trade_times, n_rows, last_timestamp):
+        self.params = params
+        self.lookback = lookback
+        self.initial_aum = initial_aum
+        self.state = state
+        self.metrics = metrics
+        self.session_pnl = session_pnl
+        self.dates = dates
+        self.opens = opens
+        self.closes = closes
+        self.trades = trades
+        self.trade_times = trade_times
+        self.n_rows = n_rows
+        self.last_timestamp = last_timestamp
+
+    @classmethod
+    def start(cls, params, lookback=LOOKBACK, initial_aum=100_000):
+        """The checkpoint before the first bar."""
+        return cls(np.asarray(params, dtype=np.float64), int(lookback), float(initial_aum),
+                   initial_state(initial_aum), initial_metrics(initial_aum), np.zeros(0),
+                   np.empty(0, dtype='datetime64[D]'), np.empty(0), np.empty(0), np.empty((0, TRADE_FIELDS)),
+                   np.empty((0, 2), dtype=np.int64), 0, np.iinfo(np.int64).min)
+
+    @property
+    def next_date(self):
+        """First session date a resumed run needs bars from (None before the first session)."""
+        return self.dates[-1] + 1 if len(self.dates) else None
+
+    def save(self, path):
+        """Write the checkpoint to `path` (.npz), replacing any previous file atomically."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, version=CHECKPOINT_VERSION, **{name: getattr(self, name) for name in CHECKPOINT_FIELDS})
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != CHECKPOINT_VERSION:
+                raise ValueError(f"{path} is a version {int(data['version'])} checkpoint; "
+                                 f"expected version {CHECKPOINT_VERSION}")
+            fields = {name: data[name] for name in CHECKPOINT_FIELDS}
+        for name in ('lookback', 'n_rows', 'last_timestamp'):
+            fields[name] = int(fields[name])
+        fields['initial_aum'] = float(fields['initial_aum'])
+        return cls(**fields)
+
+
+def _session_starts(sessions, every):
+    """Positions in `sessions` (non-decreasing ids) where a chunk starts: every `every` sessions and the last one."""
+    starts = np.flatnonzero(np.diff(sessions, prepend=sessions[0] - 1) != 0) if len(sessions) else np.empty(0, int)
+    splits = set(starts[::every].tolist()) if every else {0}
+    splits.add(int(starts[-1]) if len(starts) else 0)
+    return sorted(splits | {0})
+
+
+def run(bars, params=None, lookback=None, initial_aum=None, checkpoint=None, path=None, every=None):
+    """Backtest `bars` from `checkpoint` (from the first bar when None) with daily bounds, as run_symbol does.
+
+    `bars` holds sorted 'timestamp' (int64 UTC ns) and Open/High/Low/Close
+    arrays; bars up to the checkpoint are skipped, so either the whole
+    history or only the new bars may be passed.  `params`, `lookback` and
+    `initial_aum` are taken from the checkpoint when resuming and must
+    match it if given.  With `path`, the checkpoint is saved there after
+    every `every` sessions and at the end.
+
+    Returns (result, times, checkpoint).  `result` is a SimulationResult
+    whose trades, metrics, state and session PnL cover the whole history
+    and whose equity and drawdown cover this run's simulated bars, at
+    `times`; the new checkpoint stops before the last session in `bars`.
+    """
+    if checkpoint is None:
+        checkpoint = Checkpoint.start(make_params(**ENHANCED_PARAMS) if params is None else params,
+                                      LOOKBACK if lookback is None else lookback,
+                                      100_000 if initial_aum is None else initial_aum)
+    elif ((params is not None and not np.array_equal(params, checkpoint.params))
+          or (lookback is not None and lookback != checkpoint.lookback)
+          or (initial_aum is not None and initial_aum != checkpoint.initial_aum)):
+        raise ValueError("The checkpoint was taken with other parameters; start a new run without it")
+    params, lookback, initial_aum = checkpoint.params, checkpoint.lookback, checkpoint.initial_aum
+
+    timestamps = np.asarray(bars['timestamp'], dtype=np.int64)
+    first = int(np.searchsorted(timestamps, checkpoint.last_timestamp, 'right'))
+    timestamps = timestamps[first:]
+    prices = {column: np.asarray(bars[column][first:], dtype=np.float64) for column in ('Open', 'High', 'Low', 'Close')}
+
+    calendar = SessionCalendar(timestamps)
+    known = len(checkpoint.dates)
+    if len(calendar) and known and calendar.days[0] <= checkpoint.dates[-1]:
+        raise ValueError(f"Bars from {calendar.days[0]} overlap the checkpoint, which ends with {checkpoint.dates[-1]}")
+    dates = np.concatenate([checkpoint.dates, calendar.days])
+    opens = np.concatenate([checkpoint.opens, calendar.session_opens(prices['Open'])])
+    closes = np.concatenate([checkpoint.closes, calendar.session_closes(prices['Close'])])
+    _, upper, lower = daily_bounds_arrays(opens, closes, lookback)
+
+    # Sessions are numbered from the start of the history; the first one has no bounds
+    session = np.where(calendar.session >= 0, calendar.session + known, -1)
+    rows = np.flatnonzero(session >= 1)
+    simulated = {column: values[rows] for column, values in prices.items()}
+    simulated['UpperBound'] = upper[session[rows]]
+    simulated['LowerBound'] = lower[session[rows]]
+    session_open = calendar.open_flags()[rows]
+    session_close = calendar.close_flags()[rows]
+    sessions = session[rows] - 1
+    times = timestamps[rows]
+
+    base = checkpoint.n_rows
+    state, metrics = checkpoint.state.copy(), checkpoint.metrics.copy()
+    session_pnl = np.zeros(int(sessions[-1]) + 1 if len(rows) else len(checkpoint.session_pnl))
+    session_pnl[:len(checkpoint.session_pnl)] = checkpoint.session_pnl
+    equity = np.empty(len(rows))
+    drawdown = np.empty(len(rows))
+    trades, trade_times = [checkpoint.trades], [checkpoint.trade_times]
+    starts = _session_starts(sessions, every)
+    for lo, hi in zip(starts, starts[1:] + [len(rows)]):
+        if lo == hi:
+            continue
+        offset = base + lo
+        if state[ENTRY_INDEX] >= 0:
+            state[ENTRY_INDEX] -= offset
+        carried = int(metrics[M_SESSION]) if metrics[M_SESSION] >= 0 else int(sessions[lo])
+        chunk = {column: values[lo:hi] for column, values in simulated.items()}
+        result = simulate(chunk, params, session_open[lo:hi], session_close[lo:hi], initial_aum=initial_aum,
+                          state=state, sessions=sessions[lo:hi], metrics=metrics)
+        state, metrics = result.state, result.metrics
+        if state[ENTRY_INDEX] >= 0:
+            state[ENTRY_INDEX] += offset
+        equity[lo:hi] = result.equity
+        drawdown[lo:hi] = result.drawdown
+        session_pnl[carried:len(result.session_pnl)] = result.session_pnl[carried:]
+        chunk_trades = result.trades.copy()
+        chunk_trades[:, [T_ENTRY_INDEX, T_EXIT_INDEX]] += offset
+        trades.append(chunk_trades)
+        trade_times.append(times[chunk_trades[:, [T_ENTRY_INDEX, T_EXIT_INDEX]].astype(np.int64) - base])
+
+        if hi == len(rows) or (hi != starts[-1] and path is None):
+            continue
+        # Snapshot at the start of the session of row hi, a history session number
+        done = int(sessions[hi]) + 1
+        checkpoint = Checkpoint(params, lookback, initial_aum, state.copy(), metrics.copy(),
+                                session_pnl[:done - 1].copy(), dates[:done], opens[:done], closes[:done],
+                                np.concatenate(trades), np.concatenate(trade_times), base + hi,
+                                int(timestamps[rows[hi] - 1]))
+        trades, trade_times = [checkpoint.trades], [checkpoint.trade_times]
+        if path is not None:
+            checkpoint.save(path)
+
+    finish_session(metrics, session_pnl)
+    result = SimulationResult(equity, np.concatenate(trades), state, metrics, drawdown, session_pnl)
+    return result, times, checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest a symbol, resuming from its last checkpoint')
+    parser.add_argument('symbol')
+    parser.add_argument('--interval', default='30m')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='bar store root, used when it has the dataset')
+    parser.add_argument('--csv', default=None, help='Yahoo-format CSV when the store has no dataset')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file (default: <symbol>_<interval>.npz)')
+    parser.add_argument('--every', type=int, default=None, help='also checkpoint every N sessions')
+    parser.add_argument('--original', action='store_true', help='original rules, without risk settings')
+    parser.add_argument('--fresh', action='store_true', help='ignore an existing checkpoint')
+    args = parser.parse_args()
+
+    path = args.checkpoint or f"{args.symbol.strip('^')}_{args.interval}.npz"
+    checkpoint = Checkpoint.load(path) if os.path.exists(path) and not args.fresh else None
+    params = make_params() if args.original else make_params(**ENHANCED_PARAMS)
+    if checkpoint is not None and not np.array_equal(params, checkpoint.params):
+        parser.error(f"{path} was taken with other strategy parameters; pass --fresh to start over")
+
+    store = BarStore(args.store)
+    if store.exists(args.symbol, args.interval):
+        # Only the sessions after the checkpoint are read from the store
+        start = checkpoint.next_date if checkpoint is not None else None
+        stored = store.open(args.symbol, args.interval, start=start)
+        bars = {column: stored[column] for column in ('Open', 'High', 'Low', 'Close')}
+        bars['timestamp'] = stored.timestamp
+    elif args.csv is None:
+        parser.error(f"{args.store} has no {args.symbol} {args.interval} dataset; pass --csv or import one")
+    else:
+        from market_data import load_bars
+
+        frame = load_bars(args.symbol, args.interval, args.csv, args.store)
+        bars = {column: frame[column].values for column in ('Open', 'High', 'Low', 'Close')}
+        bars['timestamp'] = frame.index.as_unit('ns').asi8
+
+    resumed_from = len(checkpoint.dates) if checkpoint is not None else 0
+    result, times, checkpoint = run(bars, params, checkpoint=checkpoint, path=path, every=args.every)
+    metrics = result.summary(checkpoint.initial_aum)
+    print(f"{args.symbol}: resumed after {resumed_from} sessions, simulated {len(times)} bars; "
+          f"checkpoint at {len(checkpoint.dates)} sessions -> {path}")
+    print(f"Total Return: {metrics['TotalReturn']:.2f}%")
+    print(f"Number of Trades: {metrics['NumTrades']}")
+    print(f"Win Rate: {metrics['WinRate']:.1f}%")
+    print(f"Maximum Drawdown: {metrics['MaxDrawdown']:.2f}%")
+    print(f"Sharpe Ratio: {metrics['SharpeRatio']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Intrabar fills: strategy bars resolved against finer sub-bars.
+
+The strategy keeps its decisions on the strategy interval: bounds, the
+session open sizing and the market-close exit come from the 30-minute
+bars.  Within each bar, though, its 1-minute sub-bars are run through
+simulation.step() in order, so a stop is hit by the first sub-bar that
+reaches it, a breakout fills at the close of the first sub-bar beyond the
+bound, and an entry and a stop inside the same bar happen in the order
+they actually did.  Bars without sub-bars fall back to the bar itself.
+
+Sub-bars are streamed one session at a time (e.g. from a BarStore, whose
+columns are memory-mapped), so years of minute data never have to be
+loaded at once:
+
+    store = BarStore()
+    sub_bars = store.open('^GSPC', '1m', start, end).iter_sessions()
+    result = simulate_intrabar(merged, params, session_open, session_close, sub_bars, interval='30m')
+
+Trade records keep strategy-bar indices; result.fill_times holds the
+sub-bar time of every entry and exit fill.
+"""
+import numpy as np
+import pandas as pd
+
+from bar_store import BarSlice
+from metrics import finish_session, initial_metrics, record_bar, record_trade
+from simulation import (AUM, NO_EXIT, POSITION, STOP_LOSS, T_PNL, TRADE_FIELDS, SimulationResult, bar_arrays,
+                        initial_state, njit, session_ids, step)
+from session_calendar import local_days
+
+
+def _fill(state, params, p, open_price, high, low, price, upper, lower, session_open, session_close,
+          time, trades, fill_times, n_trades, closed, entry_time, metrics):
+    position = state[POSITION]
+    reason = step(state, params, p, open_price, high, low, price, upper, lower, session_open, session_close, closed)
+    if reason != NO_EXIT:
+        trades[n_trades, :] = closed
+        fill_times[n_trades, 0] = entry_time[0]
+        fill_times[n_trades, 1] = time
+        n_trades += 1
+        record_trade(metrics, closed[T_PNL], reason == STOP_LOSS)
+    if state[POSITION] != 0 and state[POSITION] != position:
+        entry_time[0] = time
+    return n_trades
+
+
+def run_intrabar(state, params, open_, high, low, close, upper, lower, session_open, session_close, times,
+                 start, end, sub_parent, sub_time, sub_high, sub_low, sub_close,
+                 equity, trades, fill_times, n_trades, closed, entry_time, session, metrics, drawdown, session_pnl):
+    """Run strategy bars [start, end), stepping through the sub-bars of each.
+
+    `sub_parent` gives the strategy bar of every sub-bar (sorted).  The
+    session-open flag goes with a bar's first sub-bar and the session-close
+    flag with its last.  Returns the new number of trades.
+    """
+    j = 0
+    n_sub = len(sub_parent)
+    for p in range(start, end):
+        while j < n_sub and sub_parent[j] < p:
+            j += 1
+        first = j
+        while j < n_sub and sub_parent[j] == p:
+            j += 1
+        if first == j:
+            n_trades = _fill(state, params, p, open_[p], high[p], low[p], close[p], upper[p], lower[p],
+                             session_open[p], session_close[p], times[p],
+                             trades, fill_times, n_trades, closed, entry_time, metrics)
+        else:
+            for k in range(first, j):
+                n_trades = _fill(state, params, p, open_[p], sub_high[k], sub_low[k], sub_close[k], upper[p], lower[p],
+                                 session_open[p] and k == first, session_close[p] and k == j - 1, sub_time[k],
+                                 trades, fill_times, n_trades, closed, entry_time, metrics)
+        equity[p] = state[AUM]
+        record_bar(metrics, drawdown, session_pnl, p, session[p], state[AUM], state[POSITION])
+    return n_trades
+
+
+if njit is not None:
+    _fill = njit(cache=True)(_fill)
+    run_intrabar = njit(cache=True)(run_intrabar)
+
+
+class IntrabarResult(SimulationResult):
+    """SimulationResult plus `fill_times`: (n_trades, 2) int64 UTC ns of each trade's entry and exit fill."""
+
+    def __init__(self, equity, trades, state, metrics, drawdown, session_pnl, fill_times):
+        super().__init__(equity, trades, state, metrics, drawdown, session_pnl)
+        self.fill_times = fill_times
+
+
+def _bar_times(bars):
+    times = bars['Datetime'] if 'Datetime' in getattr(bars, 'columns', ()) else bars.index
+    return pd.DatetimeIndex(times).as_unit('ns').asi8
+
+
+def frame_sessions(bars):
+    """In-memory sub-bars (a frame with a UTC DatetimeIndex) as one BarSlice per session date, as in BarStore."""
+    timestamp = bars.index.as_unit('ns').asi8
+    columns = {c: bars[c].values for c in ('High', 'Low', 'Close')}
+    days = local_days(timestamp)
+    bounds = np.flatnonzero(np.diff(days)) + 1
+    for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(timestamp)]):
+        yield BarSlice(timestamp[lo:hi], {c: a[lo:hi] for c, a in columns.items()}, None)
+
+
+def simulate_intrabar(bars, params, session_open, session_close, sub_sessions, interval='30m',
+                      initial_aum=100_000, times=None, sessions=None):
+    """simulate() with every strategy bar resolved against its sub-bars.
+
+    `bars` are the strategy-interval bars (PRICE_COLUMNS, plus a 'Datetime'
+    column or index unless `times` gives their int64 UTC-ns start times)
+    and `interval` their length.  `sub_sessions` yields the finer bars in
+    time order, in chunks such as one BarSlice per session (anything with
+    `.timestamp` and ['High'], ['Low'], ['Close']); only one chunk is
+    held at a time.  Sub-bars outside every strategy bar are ignored.
+    """
+    times = _bar_times(bars) if times is None else np.asarray(times, dtype=np.int64)
+    interval_ns = pd.Timedelta(interval).value
+    arrays = bar_arrays(bars)
+    n = len(arrays[0])
+    session_open = np.ascontiguousarray(session_open, dtype=np.bool_)
+    session_close = np.ascontiguousarray(session_close, dtype=np.bool_)
+    sessions = session_ids(session_open) if sessions is None else np.ascontiguousarray(sessions, dtype=np.int64)
+    state = initial_state(initial_aum)
+    metrics = initial_metrics(initial_aum)
+    params = np.asarray(params, dtype=np.float64)
+
+    equity = np.empty(n)
+    drawdown = np.empty(n)
+    session_pnl = np.zeros(int(sessions.max()) + 1 if n else 0)
+    entry_time = np.full(1, -1, dtype=np.int64)
+    closed = np.empty(TRADE_FIELDS)
+    if njit is None:
+        # Plain Python loop: lists index much faster than arrays element by element
+        state, metrics, closed, entry_time = state.tolist(), metrics.tolist(), closed.tolist(), entry_time.tolist()
+        arrays = [a.tolist() for a in arrays]
+        session_open, session_close = session_open.tolist(), session_close.tolist()
+        parent_times, bar_sessions, py_params = times.tolist(), sessions.tolist(), params.tolist()
+    else:
+        parent_times, bar_sessions, py_params = times, sessions, params
+
+    trade_chunks, fill_chunks = [], []
+
+    def run(start, end, sub_parent, sub_time, sub_high, sub_low, sub_close):
+        # A step closes at most one trade: one row per strategy bar and sub-bar suffices
+        capacity = end - start + len(sub_parent)
+        trades = np.empty((capacity, TRADE_FIELDS))
+        fill_times = np.empty((capacity, 2), dtype=np.int64)
+        if njit is None:
+            sub_parent, sub_time = sub_parent.tolist(), sub_time.tolist()
+            sub_high, sub_low, sub_close = sub_high.tolist(), sub_low.tolist(), sub_close.tolist()
+        n_trades = run_intrabar(state, py_params, *arrays, session_open, session_close, parent_times,
+                                start, end, sub_parent, sub_time, sub_high, sub_low, sub_close,
+                                equity, trades, fill_times, 0, closed, entry_time,
+                                bar_sessions, metrics, drawdown, session_pnl)
+        # Copies, so the per-chunk buffers are not kept alive
+        trade_chunks.append(trades[:n_trades].copy())
+        fill_chunks.append(fill_times[:n_trades].copy())
+
+    done = 0
+    for chunk in sub_sessions:
+        timestamp = np.asarray(chunk.timestamp, dtype=np.int64)
+        parent = np.searchsorted(times, timestamp, 'right') - 1
+        inside = np.flatnonzero((parent >= done) & (timestamp < times[np.maximum(parent, 0)] + interval_ns))
+        if len(inside) == 0:
+            continue
+        end = int(parent[inside[-1]]) + 1
+        run(done, end, parent[inside], timestamp[inside], np.asarray(chunk['High'], dtype=np.float64)[inside],
+            np.asarray(chunk['Low'], dtype=np.float64)[inside], np.asarray(chunk['Close'], dtype=np.float64)[inside])
+        done = end
+    empty = np.empty(0)
+    run(done, n, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), empty, empty, empty)
+
+    if njit is None:
+        state, metrics = np.array(state), np.array(metrics)
+    finish_session(metrics, session_pnl)
+    return IntrabarResult(equity, np.concatenate(trade_chunks), state, metrics, drawdown, session_pnl,
+                          np.concatenate(fill_chunks))
@@ -0,0 +1,167 @@
+"""The strategy step vectorized over lanes.
+
+A lane is one independent copy of the simulation.step() state machine:
+a parameter combination in sweep.py, a symbol in portfolio.py.  Lanes
+keeps the state of every lane in arrays and Lanes.step() advances all of
+them by one bar with NumPy, so the rules match simulate() lane by lane.
+Bar values may be scalars (every lane sees the same bar) or per-lane
+arrays (every lane its own symbol's bar).
+
+Sizing and entries go through the size() and enter() methods, which
+subclasses override to allocate capital differently.  With
+record_trades=True every closed trade is also kept as a simulation
+trades-array row (see simulation.T_*) together with its lane.
+"""
+import numpy as np
+
+from simulation import LONG_TO_SHORT, MARKET_CLOSE, NO_EXIT, SHORT_TO_LONG, STOP_LOSS, TRADE_FIELDS
+
+
+class Lanes:
+    """State of `n` lanes: AUM, position, entry price/shares, sized shares, stop and entry bar, plus trade stats."""
+
+    def __init__(self, n, stop_loss_pct=0.0, bounds_buffer=0.0, max_position_size=1.0, aum=100_000,
+                 commission=0.0035, slippage=0.001, size_every_bar=True, record_trades=False):
+        self.n = n
+        self.stop_loss_pct = np.broadcast_to(np.asarray(stop_loss_pct, dtype=float), (n,))
+        self.max_position_size = np.broadcast_to(np.asarray(max_position_size, dtype=float), (n,))
+        self.has_stop = self.stop_loss_pct > 0
+        self.upper_scale = 1 + np.broadcast_to(np.asarray(bounds_buffer, dtype=float), (n,))
+        self.lower_scale = 1 - np.broadcast_to(np.asarray(bounds_buffer, dtype=float), (n,))
+        self.commission = commission
+        self.slippage = slippage
+        self.size_every_bar = size_every_bar
+
+        self.aum = np.full(n, float(aum))
+        self.position = np.zeros(n)
+        self.entry_price = np.full(n, np.nan)
+        self.entry_shares = np.zeros(n)
+        self.shares = np.zeros(n)
+        self.stop_price = np.full(n, np.nan)
+        self.entry_index = np.full(n, -1, dtype=np.int64)
+
+        self.num_trades = np.zeros(n, dtype=np.int64)
+        self.wins = np.zeros(n, dtype=np.int64)
+        self.gross_profit = np.zeros(n)
+        self.gross_loss = np.zeros(n)
+
+        self.record_trades = record_trades
+        self.trade_lanes = []
+        self.trade_rows = []
+
+    def size(self, size_price):
+        """Shares of every lane at `size_price`: AUM * max position size."""
+        return np.trunc((self.aum * self.max_position_size) / size_price)
+
+    def enter(self, i, mask, side, price, shares):
+        """Open positions on bar i for the lanes in `mask`; `price` may be a scalar, the others are per lane."""
+        self.position[mask] = side[mask]
+        self.entry_price[mask] = _lanes(price, mask) + self.slippage * self.position[mask]
+        self.entry_shares[mask] = shares[mask]
+        self.entry_index[mask] = i
+        self.stop_price[mask] = np.where(self.has_stop[mask],
+                                         self.entry_price[mask] * (1 - self.stop_loss_pct[mask] * self.position[mask]),
+                                         np.nan)
+
+    def step(self, i, open_, high, low, close, upper, lower, session_open, session_close, active=None):
+        """Advance every lane by bar i.
+
+        Bar values are scalars or per-lane arrays; `active` masks the lanes
+        that have a bar at all (None = all).  Returns the mask of lanes
+        that closed a trade on this bar.
+        """
+        price = close
+        size_price = close if self.size_every_bar else open_
+        upper_buffered = upper * self.upper_scale
+        lower_buffered = lower * self.lower_scale
+        session_open = np.asarray(session_open, dtype=bool)
+        session_close = np.asarray(session_close, dtype=bool)
+        position = self.position
+
+        # Position sizing
+        flat = position == 0
+        sizing = flat if self.size_every_bar else flat & session_open
+        if active is not None:
+            sizing = sizing & active
+        if sizing.any():
+            np.copyto(self.shares, self.size(size_price), where=sizing)
+
+        # Stop loss against the bar range
+        stopped = ((position == 1) & (low <= self.stop_price)) | ((position == -1) & (high >= self.stop_price))
+        exit_price = np.where(stopped, self.stop_price, price)
+
+        # Entries
+        go_long = flat & (price > upper_buffered)
+        go_short = flat & ~go_long & (price < lower_buffered)
+        entering = go_long | go_short
+        if entering.any():
+            self.enter(i, entering, np.where(go_long, 1.0, -1.0), price, self.shares)
+
+        # Session close and reversal exits
+        live = (position != 0) & ~stopped
+        market_close = live & session_close
+        reversing = live & ~session_close
+        long_to_short = reversing & (position == 1) & (price < lower_buffered)
+        short_to_long = reversing & (position == -1) & (price > upper_buffered)
+        reversal = long_to_short | short_to_long
+        signal_exit = market_close | reversal
+        exiting = stopped | signal_exit
+        if not exiting.any():
+            return exiting
+
+        exit_price = np.where(signal_exit, price - self.slippage * position, exit_price)
+        pnl = np.where(position == 1,
+                       (exit_price - self.entry_price) * self.entry_shares - self.commission * self.entry_shares * 2,
+                       (self.entry_price - exit_price) * self.entry_shares - self.commission * self.entry_shares * 2)
+        if self.record_trades:
+            reason = np.select([stopped, market_close, long_to_short, short_to_long],
+                               [STOP_LOSS, MARKET_CLOSE, LONG_TO_SHORT, SHORT_TO_LONG], NO_EXIT)
+            lanes = np.flatnonzero(exiting)
+            self.trade_lanes.append(lanes)
+            self.trade_rows.append(np.column_stack([
+                self.entry_index[lanes], np.full(len(lanes), i), position[lanes], self.entry_price[lanes],
+                exit_price[lanes], self.entry_shares[lanes], pnl[lanes], self.stop_price[lanes], reason[lanes]]))
+        self.close(exiting, pnl)
+
+        # Flat exits are cleared before the reversals re-enter, so that the
+        # capital they free counts for the re-entries (portfolio.Portfolio)
+        resized = self.size(size_price)
+        flat_exit = exiting & ~reversal
+        self.position[flat_exit] = 0
+        self.entry_price[flat_exit] = np.nan
+        self.stop_price[flat_exit] = np.nan
+        self.entry_index[flat_exit] = -1
+        self.shares[flat_exit] = np.where(size_price > 0, resized, 0)[flat_exit]
+        if reversal.any():
+            self.enter(i, reversal, -position, price, resized)
+        return exiting
+
+    def trades(self):
+        """(lanes, trades): the lane of every recorded trade and the trades array, in exit order."""
+        if not self.trade_rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, TRADE_FIELDS))
+        return np.concatenate(self.trade_lanes), np.concatenate(self.trade_rows)
+
+    def close(self, exiting, pnl):
+        """Book the PnL of the trades closed by the lanes in `exiting`."""
+        self.aum[exiting] += pnl[exiting]
+        self.num_trades += exiting
+        winning = exiting & (pnl > 0)
+        losing = exiting & (pnl < 0)
+        self.wins += winning
+        self.gross_profit[winning] += pnl[winning]
+        self.gross_loss[losing] += pnl[losing]
+
+    def trade_stats(self):
+        """(win rate %, profit factor) per lane, 0 for lanes without trades."""
+        num_trades = self.num_trades
+        with np.errstate(invalid='ignore', divide='ignore'):
+            win_rate = np.where(num_trades > 0, self.wins / np.maximum(num_trades, 1) * 100, 0.0)
+            profit_factor = np.where(self.gross_loss != 0, np.abs(self.gross_profit / self.gross_loss), np.inf)
+        profit_factor[num_trades == 0] = 0.0
+        return win_rate, profit_factor
+
+
+def _lanes(value, mask):
+    """`value` for the lanes in `mask`: a scalar as is, a per-lane array indexed."""
+    return value[mask] if np.ndim(value) else value
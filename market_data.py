@@ -0,0 +1,191 @@
+"""Market data loading and a local incremental bar cache.
+
+Bars are normalized to a frame indexed by a UTC 'Datetime' index with
+Open, High, Low, Close and Volume columns, whether they come from Yahoo,
+from the hand-saved Yahoo CSV layout or from the cache.
+"""
+import json
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from bar_store import DEFAULT_STORE_DIR, BarStore
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+DEFAULT_CACHE_DIR = '.bar_cache'
+
+
+def normalize_bars(data):
+    """Flatten yfinance columns, coerce prices to numbers and sort by a UTC index."""
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    data = data[[c for c in BAR_COLUMNS if c in data.columns]].apply(pd.to_numeric, errors='coerce')
+    data = data.dropna(subset=PRICE_COLUMNS)
+    index = pd.DatetimeIndex(pd.to_datetime(data.index, utc=True), name='Datetime')
+    data = data.set_axis(index)
+    data = data[~data.index.duplicated(keep='last')]
+    return data.sort_index()
+
+
+def read_yahoo_csv(path):
+    """Read a CSV saved from yf.download (Price/Ticker/Datetime header rows) or a plain bar CSV."""
+    with open(path) as f:
+        header = [next(f, '') for _ in range(3)]
+    if header[1].startswith('Ticker,'):
+        data = pd.read_csv(path, header=0, skiprows=[1, 2], index_col=0)
+    else:
+        data = pd.read_csv(path, index_col=0)
+    return normalize_bars(data)
+
+
+def yahoo_fetch(symbol, interval, start, end):
+    """Download bars in [start, end) from Yahoo Finance."""
+    import yfinance as yf
+
+    data = yf.download(symbol, start=start, end=end, interval=interval, progress=False)
+    if data is None or data.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], tz='UTC', name='Datetime'))
+    return normalize_bars(data)
+
+
+def _utc(timestamp):
+    if timestamp is None:
+        return None
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+
+def _period_sessions(period):
+    if not period.endswith('d'):
+        raise ValueError(f"Unsupported period {period!r}; use a number of days such as '14d'")
+    return int(period[:-1])
+
+
+def load_bars(symbol, interval, csv_path, store_root=DEFAULT_STORE_DIR, start=None, end=None):
+    """Bars for session dates start..end from the columnar store when it has the dataset, else from the Yahoo CSV."""
+    store = BarStore(store_root)
+    if store.exists(symbol, interval):
+        return store.open(symbol, interval, start, end).to_frame()
+    bars = read_yahoo_csv(csv_path)
+    dates = bars.index.normalize().tz_localize(None)
+    keep = np.ones(len(bars), dtype=bool)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    return bars[keep]
+
+
+class BarCache:
+    """Local on-disk bar cache keyed by (symbol, interval), kept in a BarStore.
+
+    get() serves bars from disk and only asks `fetch` for the part of the
+    requested range the cache has not covered yet (the covered range is
+    kept next to the bars, so empty stretches are not re-requested); the
+    last cached bar is re-fetched with any newer range since it may have
+    been a partial live bar.  With
+    offline=True nothing is fetched.  `fetch(symbol, interval, start, end)`
+    must return bars in the normalize_bars() layout, so tests can plug in
+    a local stand-in for Yahoo.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, fetch=yahoo_fetch, offline=False):
+        self.store = BarStore(root)
+        self.fetch = fetch
+        self.offline = offline
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _range_path(self, symbol, interval):
+        return self.store.path(symbol, interval) + '.range'
+
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def load(self, symbol, interval):
+        """Everything cached for (symbol, interval) and the covered (start, end) range, or (None, None)."""
+        if not self.store.exists(symbol, interval):
+            return None, None
+        bars = self.store.open(symbol, interval).to_frame()
+        covered = (bars.index[0], bars.index[-1]) if len(bars) else None
+        if os.path.exists(self._range_path(symbol, interval)):
+            with open(self._range_path(symbol, interval)) as f:
+                covered = tuple(_utc(t) for t in json.load(f))
+        return bars, covered
+
+    def save(self, symbol, interval, bars, covered):
+        self.store.write(symbol, interval, bars, replace=True)
+        path = self._range_path(symbol, interval)
+        with open(path + '.tmp', 'w') as f:
+            json.dump([t.isoformat() for t in covered], f)
+        os.replace(path + '.tmp', path)
+
+    def get(self, symbol, interval='30m', start=None, end=None, period=None):
+        """Bars for symbol in [start, end), or the last `period` sessions ('14d' as in yf.download)."""
+        now = pd.Timestamp.now(tz='UTC')
+        start, end = _utc(start), _utc(end) or now
+        sessions = None
+        if period is not None:
+            sessions = _period_sessions(period)
+            # Calendar margin for weekends and holidays; trimmed to whole sessions below
+            start = end.normalize() - pd.Timedelta(days=sessions * 7 // 5 + 7)
+
+        with self._lock((symbol, interval)):
+            cached, covered = self.load(symbol, interval)
+            if not self.offline:
+                cached = self._update(symbol, interval, cached, covered, start, end)
+
+        if cached is None:
+            return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], tz='UTC', name='Datetime'))
+        in_range = cached.index < end
+        if start is not None:
+            in_range &= cached.index >= start
+        bars = cached.loc[in_range]
+        if sessions is not None:
+            dates = bars.index.normalize()
+            keep = dates.unique()[-sessions:]
+            bars = bars[dates.isin(keep)]
+        return bars
+
+    def _update(self, symbol, interval, cached, covered, start, end):
+        if covered is None:
+            start = start if start is not None else end - pd.Timedelta(days=59)
+            missing = [(start, end)]
+            covered = (start, end)
+        else:
+            missing = []
+            if start is not None and start < covered[0]:
+                missing.append((start, covered[0]))
+            if end > covered[1]:
+                resume = min(covered[1], cached.index[-1]) if len(cached) else covered[1]
+                missing.append((resume, end))
+            covered = (min(start, covered[0]) if start is not None else covered[0], max(end, covered[1]))
+        if not missing:
+            return cached
+
+        frames = [] if cached is None else [cached]
+        try:
+            for lo, hi in missing:
+                frames.append(normalize_bars(self.fetch(symbol, interval, lo, hi)))
+        except Exception as exc:
+            if cached is None or cached.empty:
+                raise
+            warnings.warn(f"Fetching {symbol} {interval} failed ({exc}); serving cached bars")
+            return cached
+
+        merged = normalize_bars(pd.concat(frames))
+        self.save(symbol, interval, merged, covered)
+        return merged
+
+    def get_many(self, symbols, interval='30m', start=None, end=None, period=None, max_workers=8):
+        """get() for many symbols concurrently; returns {symbol: bars}."""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {symbol: pool.submit(self.get, symbol, interval, start, end, period) for symbol in symbols}
+            return {symbol: future.result() for symbol, future in futures.items()}
@@ -0,0 +1,155 @@
+"""Streaming performance metrics updated inside the simulation loop.
+
+The running values live in one float vector (see the M_* slots) next to
+two preallocated arrays: the per-bar drawdown curve and the PnL of each
+session.  simulation.run_loop() calls record_trade() for every closed
+trade and record_bar() after every bar, so peak, drawdown, exposure,
+session returns and trade statistics come out of the simulation pass
+itself, with no per-bar lists and no second pass over the equity curve.
+Like the simulation kernel, the updates compile with numba when it is
+installed.
+
+Sharpe and Sortino ratios are computed from session (daily) returns
+and annualized with sqrt(252).
+"""
+import math
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Metric accumulator slots
+(M_BARS, M_EXPOSED_BARS, M_PREV_AUM, M_PEAK, M_MAX_DRAWDOWN,
+ M_SESSION, M_SESSION_START_AUM, M_SESSIONS, M_RETURN_SUM, M_RETURN_SQ, M_DOWNSIDE_SQ,
+ M_TRADES, M_WINS, M_LOSSES, M_GROSS_PROFIT, M_GROSS_LOSS, M_BEST, M_WORST, M_STOP_EXITS) = range(19)
+METRICS_SIZE = 19
+
+TRADING_DAYS = 252
+
+
+def initial_metrics(aum):
+    metrics = np.zeros(METRICS_SIZE)
+    metrics[M_PREV_AUM] = aum
+    metrics[M_PEAK] = -np.inf  # the drawdown peak starts at the first bar, as in the scripts
+    metrics[M_SESSION] = -1
+    metrics[M_SESSION_START_AUM] = aum
+    metrics[M_BEST] = -np.inf
+    metrics[M_WORST] = np.inf
+    return metrics
+
+
+def _close_session(metrics, session_pnl):
+    start = metrics[M_SESSION_START_AUM]
+    pnl = metrics[M_PREV_AUM] - start
+    session_pnl[int(metrics[M_SESSION])] = pnl
+    ret = pnl / start
+    metrics[M_SESSIONS] += 1
+    metrics[M_RETURN_SUM] += ret
+    metrics[M_RETURN_SQ] += ret * ret
+    if ret < 0:
+        metrics[M_DOWNSIDE_SQ] += ret * ret
+
+
+def record_bar(metrics, drawdown, session_pnl, i, session, aum, position):
+    """Fold bar i (its session id, closing AUM and position) into the running metrics."""
+    if session != metrics[M_SESSION]:
+        if metrics[M_SESSION] >= 0:
+            _close_session(metrics, session_pnl)
+        metrics[M_SESSION] = session
+        metrics[M_SESSION_START_AUM] = metrics[M_PREV_AUM]
+
+    if aum > metrics[M_PEAK]:
+        metrics[M_PEAK] = aum
+    peak = metrics[M_PEAK]
+    dd = (aum - peak) / peak * 100
+    drawdown[i] = dd
+    if dd < metrics[M_MAX_DRAWDOWN]:
+        metrics[M_MAX_DRAWDOWN] = dd
+
+    metrics[M_BARS] += 1
+    if position != 0:
+        metrics[M_EXPOSED_BARS] += 1
+    metrics[M_PREV_AUM] = aum
+
+
+def record_trade(metrics, pnl, stopped):
+    metrics[M_TRADES] += 1
+    if pnl > 0:
+        metrics[M_WINS] += 1
+        metrics[M_GROSS_PROFIT] += pnl
+    elif pnl < 0:
+        metrics[M_LOSSES] += 1
+        metrics[M_GROSS_LOSS] += pnl
+    if pnl > metrics[M_BEST]:
+        metrics[M_BEST] = pnl
+    if pnl < metrics[M_WORST]:
+        metrics[M_WORST] = pnl
+    if stopped:
+        metrics[M_STOP_EXITS] += 1
+
+
+if njit is not None:
+    _close_session = njit(cache=True)(_close_session)
+    record_bar = njit(cache=True)(record_bar)
+    record_trade = njit(cache=True)(record_trade)
+
+
+def finish_session(metrics, session_pnl):
+    """Write the PnL of the session still open at the end of a run into `session_pnl`.
+
+    The accumulators are left untouched, so a continued run folds the
+    session in when it actually ends.
+    """
+    if metrics[M_SESSION] >= 0:
+        session_pnl[int(metrics[M_SESSION])] = metrics[M_PREV_AUM] - metrics[M_SESSION_START_AUM]
+
+
+def summary(metrics, initial_aum):
+    """Metrics dict from the accumulators, counting the open session as finished."""
+    sessions = metrics[M_SESSIONS]
+    ret_sum, ret_sq, down_sq = metrics[M_RETURN_SUM], metrics[M_RETURN_SQ], metrics[M_DOWNSIDE_SQ]
+    if metrics[M_SESSION] >= 0:
+        ret = (metrics[M_PREV_AUM] - metrics[M_SESSION_START_AUM]) / metrics[M_SESSION_START_AUM]
+        sessions += 1
+        ret_sum += ret
+        ret_sq += ret * ret
+        if ret < 0:
+            down_sq += ret * ret
+
+    sharpe = sortino = 0.0
+    if sessions > 1:
+        mean = ret_sum / sessions
+        var = max(ret_sq - ret_sum * mean, 0.0) / (sessions - 1)
+        if var > 0:
+            sharpe = mean / math.sqrt(var) * math.sqrt(TRADING_DAYS)
+        if down_sq > 0:
+            sortino = mean / math.sqrt(down_sq / sessions) * math.sqrt(TRADING_DAYS)
+
+    trades = int(metrics[M_TRADES])
+    wins, losses = int(metrics[M_WINS]), int(metrics[M_LOSSES])
+    gross_profit, gross_loss = metrics[M_GROSS_PROFIT], metrics[M_GROSS_LOSS]
+    if trades > 0:
+        profit_factor = abs(gross_profit / gross_loss) if losses > 0 and gross_loss != 0 else float('inf')
+    else:
+        profit_factor = 0.0
+    final_aum = metrics[M_PREV_AUM]
+    return {
+        'TotalReturn': (final_aum - initial_aum) / initial_aum * 100,
+        'NumTrades': trades,
+        'WinRate': wins / trades * 100 if trades > 0 else 0.0,
+        'AvgWin': gross_profit / wins if wins > 0 else 0.0,
+        'AvgLoss': gross_loss / losses if losses > 0 else 0.0,
+        'ProfitFactor': profit_factor,
+        'BestTrade': metrics[M_BEST] if trades > 0 else 0.0,
+        'WorstTrade': metrics[M_WORST] if trades > 0 else 0.0,
+        'StopLossExits': int(metrics[M_STOP_EXITS]),
+        'MaxDrawdown': metrics[M_MAX_DRAWDOWN],
+        'Exposure': metrics[M_EXPOSED_BARS] / metrics[M_BARS] * 100 if metrics[M_BARS] > 0 else 0.0,
+        'Sessions': int(sessions),
+        'SharpeRatio': sharpe,
+        'SortinoRatio': sortino,
+        'FinalAUM': final_aum,
+    }
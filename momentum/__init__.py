@@ -0,0 +1,47 @@
+"""The noise-bounds momentum strategy as an importable package.
+
+    import momentum
+
+    calendar = momentum.SessionCalendar(timestamps)
+    sigma, upper, lower = momentum.daily_bounds_arrays(calendar.session_opens(opens),
+                                                       calendar.session_closes(closes))
+    result = momentum.simulate(bars, momentum.make_params(**momentum.ENHANCED_PARAMS),
+                               calendar.open_flags(), calendar.close_flags())
+
+Names are re-exported from the repository's modules (which must be
+importable, i.e. the repository root on sys.path) and each module is only
+imported when one of its names is first used, so `import momentum` costs
+nothing and the array paths never load pandas.  The command line is
+`python -m momentum bounds|backtest` (see momentum/cli.py).
+"""
+import importlib
+
+_EXPORTS = {
+    'noise_bounds': ('LOOKBACK', 'bounds_from_sigma', 'daily_bounds_arrays', 'daily_noise_bounds',
+                     'intraday_bounds_arrays', 'intraday_noise_bounds', 'session_open_close', 'sigma_cube',
+                     'trailing_mean'),
+    'session_calendar': ('SessionCalendar', 'nyse_early_closes', 'nyse_holidays', 'session_schedule',
+                         'trading_days', 'utc_offsets'),
+    'simulation': ('ENHANCED_PARAMS', 'PRICE_COLUMNS', 'SimulationResult', 'make_params', 'performance_summary',
+                   'simulate', 'trades_frame'),
+    'metrics': ('summary',),
+    'options': ('VolSurface', 'black_scholes', 'black_scholes_delta', 'iv_from_sigma', 'norm_cdf', 'option_overlay'),
+    'bar_store': ('BarStore',),
+    'market_data': ('BarCache', 'load_bars', 'read_yahoo_csv'),
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,161 @@
+"""python -m momentum bounds|backtest: daily bounds and the backtest from the command line.
+
+    python -m momentum bounds ^GSPC --interval 30m --output daily_noise_bounds.csv
+    python -m momentum backtest ^GSPC --bounds daily_noise_bounds.csv
+
+Bars come from the columnar bar store when it has the dataset and are
+used as memory-mapped arrays, so these runs only load NumPy: the session
+calendar, bounds and simulation all work on arrays.  pandas is imported
+only to read a Yahoo CSV, fetch into the bar cache or write a trade log,
+and matplotlib and yfinance never.  Startup is checked against
+COLD_START_BUDGET by `python benchmark.py --startup`.
+"""
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from bar_store import DEFAULT_STORE_DIR, BarStore
+from noise_bounds import LOOKBACK, daily_bounds_arrays
+from session_calendar import SessionCalendar
+from simulation import ENHANCED_PARAMS, make_params, simulate, trades_frame
+
+# Wall-clock seconds from process start to exit on a store-backed dataset
+COLD_START_BUDGET = {'bounds': 0.30, 'backtest': 0.30}
+
+BOUNDS_COLUMNS = ('Date', 'Sigma', 'UpperBound', 'LowerBound')
+
+
+def load_arrays(symbol, interval, store_root=DEFAULT_STORE_DIR, csv_path=None, period='60d', offline=False):
+    """(int64 UTC-nanosecond timestamps, {'Open', 'High', 'Low', 'Close': float64 arrays}) of one symbol.
+
+    From the bar store when it has the dataset, else from `csv_path` or
+    the bar cache (both through pandas).
+    """
+    store = BarStore(store_root)
+    if store.exists(symbol, interval):
+        bars = store.open(symbol, interval)
+        return np.asarray(bars.timestamp), {c: np.asarray(bars[c]) for c in ('Open', 'High', 'Low', 'Close')}
+    if csv_path is not None:
+        from market_data import load_bars
+
+        frame = load_bars(symbol, interval, csv_path, store_root)
+    else:
+        from market_data import BarCache
+
+        frame = BarCache(offline=offline).get(symbol, interval=interval, period=period)
+    return (frame.index.as_unit('ns').asi8,
+            {c: frame[c].values.astype(np.float64) for c in ('Open', 'High', 'Low', 'Close')})
+
+
+def read_bounds(path):
+    """(session dates as datetime64[D], upper, lower) of a daily bounds CSV such as daily_noise_bounds.csv."""
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    dates = np.array([row['Date'] for row in rows], dtype='datetime64[D]')
+    upper = np.array([float(row['UpperBound'] or 'nan') for row in rows])
+    lower = np.array([float(row['LowerBound'] or 'nan') for row in rows])
+    return dates, upper, lower
+
+
+def write_bounds(out, dates, sigma, upper, lower):
+    """Write the daily bounds in the 2_week_bounds.py CSV layout (empty fields for NaN)."""
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(BOUNDS_COLUMNS)
+    for row in zip(dates.astype(str), sigma.tolist(), upper.tolist(), lower.tolist()):
+        writer.writerow([row[0]] + ['' if np.isnan(v) else repr(v) for v in row[1:]])
+
+
+def bounds(timestamps, columns, lookback=LOOKBACK):
+    """(session dates, sigma, upper, lower) for every session but the first, like noise_bounds.daily_noise_bounds()."""
+    calendar = SessionCalendar(timestamps)
+    sigma, upper, lower = daily_bounds_arrays(calendar.session_opens(columns['Open']),
+                                              calendar.session_closes(columns['Close']), lookback)
+    return calendar.days[1:], sigma[1:], upper[1:], lower[1:]
+
+
+def backtest(timestamps, columns, params, lookback=LOOKBACK, bounds_table=None, initial_aum=100_000):
+    """Simulate the bars that have bounds; returns (their rows, SimulationResult).
+
+    Bounds are the daily bounds of the bars themselves with `lookback`, or
+    `bounds_table` = (dates, upper, lower) matched by session date.
+    """
+    calendar = SessionCalendar(timestamps)
+    if bounds_table is None:
+        _, upper, lower = daily_bounds_arrays(calendar.session_opens(columns['Open']),
+                                              calendar.session_closes(columns['Close']), lookback)
+        has_bounds = np.arange(len(calendar)) >= 1
+    else:
+        dates, table_upper, table_lower = bounds_table
+        k = np.minimum(np.searchsorted(dates, calendar.days), max(len(dates) - 1, 0))
+        has_bounds = (dates[k] == calendar.days) if len(dates) else np.zeros(len(calendar), dtype=bool)
+        upper, lower = table_upper[k], table_lower[k]
+
+    session = calendar.session
+    rows = np.flatnonzero((session >= 0) & has_bounds[np.maximum(session, 0)])
+    bars = {column: np.asarray(columns[column], dtype=np.float64)[rows] for column in ('Open', 'High', 'Low', 'Close')}
+    bars['UpperBound'] = upper[session[rows]]
+    bars['LowerBound'] = lower[session[rows]]
+    result = simulate(bars, params, calendar.open_flags()[rows], calendar.close_flags()[rows], initial_aum=initial_aum)
+    return rows, result
+
+
+def _bounds_command(args):
+    timestamps, columns = load_arrays(args.symbol, args.interval, args.store, args.csv, args.period, args.offline)
+    table = bounds(timestamps, columns, args.lookback)
+    if args.output == '-':
+        write_bounds(sys.stdout, *table)
+    else:
+        with open(args.output, 'w', newline='') as f:
+            write_bounds(f, *table)
+        print(f"{len(table[0])} sessions -> {args.output}")
+
+
+def _backtest_command(args):
+    timestamps, columns = load_arrays(args.symbol, args.interval, args.store, args.csv, args.period, args.offline)
+    params = make_params() if args.original else make_params(**ENHANCED_PARAMS)
+    bounds_table = read_bounds(args.bounds) if args.bounds else None
+    rows, result = backtest(timestamps, columns, params, args.lookback, bounds_table, args.initial_aum)
+    metrics = result.summary(args.initial_aum)
+    print(f"{args.symbol} {'original' if args.original else 'enhanced'} strategy over {len(rows)} bars")
+    print(f"Final AUM: ${metrics['FinalAUM']:,.2f}")
+    print(f"Total Return: {metrics['TotalReturn']:.2f}%")
+    print(f"Number of Trades: {metrics['NumTrades']}")
+    print(f"Win Rate: {metrics['WinRate']:.1f}%")
+    print(f"Maximum Drawdown: {metrics['MaxDrawdown']:.2f}%")
+    print(f"Profit Factor: {metrics['ProfitFactor']:.2f}")
+    print(f"Sharpe Ratio: {metrics['SharpeRatio']:.2f}")
+    if args.trades:
+        import pandas as pd
+
+        times = pd.DatetimeIndex(pd.to_datetime(np.asarray(timestamps)[rows], utc=True), name='Datetime')
+        trades_frame(result.trades, times, with_stop=not args.original).to_csv(args.trades, index=False)
+        print(f"Trade log -> {args.trades}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m momentum', description='Noise-bounds momentum strategy')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('bounds', 'daily noise bounds of a symbol'),
+                            ('backtest', 'backtest a symbol on its daily bounds')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('symbol')
+        command.add_argument('--interval', default='30m')
+        command.add_argument('--store', default=DEFAULT_STORE_DIR, help='bar store root, used when it has the dataset')
+        command.add_argument('--csv', default=None, help='Yahoo-format CSV when the store has no dataset')
+        command.add_argument('--period', default='60d', help='bar cache period when neither has the bars')
+        command.add_argument('--offline', action='store_true', help='only use bars already in the bar cache')
+        command.add_argument('--lookback', type=int, default=LOOKBACK)
+    commands.choices['bounds'].add_argument('--output', default='-', help="bounds CSV ('-' for stdout)")
+    backtest_parser = commands.choices['backtest']
+    backtest_parser.add_argument('--bounds', default=None, help='daily bounds CSV instead of computing them')
+    backtest_parser.add_argument('--original', action='store_true', help='original rules, without risk settings')
+    backtest_parser.add_argument('--initial-aum', type=float, default=100_000)
+    backtest_parser.add_argument('--trades', default=None, help='write the trade log CSV here')
+    args = parser.parse_args(argv)
+
+    if args.command == 'bounds':
+        _bounds_command(args)
+    else:
+        _backtest_command(args)
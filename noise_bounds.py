@@ -0,0 +1,325 @@
+"""Noise-area bounds for the intraday momentum strategy.
+
+sigma is the mean absolute session move |close / open - 1| over the previous
+LOOKBACK sessions, and the bounds widen max/min(today_open, yesterday_close)
+by sigma:
+
+    UpperBound = max(today_open, yesterday_close) * (1 + sigma)
+    LowerBound = min(today_open, yesterday_close) * (1 - sigma)
+"""
+import datetime
+
+import numpy as np
+
+from bar_keys import bar_keys, minute_times
+
+# Fixed UTC session times, right only under US daylight saving time; pass a
+# session_calendar.SessionCalendar to follow DST, holidays and early closes
+OPEN_TIME_UTC = datetime.time(13, 30)   # 9:30 NY time in UTC
+CLOSE_TIME_UTC = datetime.time(19, 30)  # last 30-min bar of the NY session in UTC
+LOOKBACK = 13
+
+
+def flatten_columns(data):
+    import pandas as pd
+
+    # Recent yfinance versions return (Price, Ticker) columns even for one symbol
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.copy()
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+
+def session_open_close(data, open_time=OPEN_TIME_UTC, close_time=CLOSE_TIME_UTC, calendar=None):
+    """Return one row per session with its Open and Close price.
+
+    The open is the Open of the bar at `open_time`, falling back to the
+    session's first bar; the close is the Close of the bar at `close_time`,
+    falling back to the session's last bar.  `data` needs Date, Time, Open
+    and Close columns; `open_time`/`close_time` must have the same type as
+    the Time column.
+
+    With a `calendar` (a session_calendar.SessionCalendar of data's bars,
+    in data's order) the sessions and their open/close bars come from the
+    calendar's precomputed indices instead, which follow DST, holidays and
+    early closes.
+    """
+    import pandas as pd
+
+    data = flatten_columns(data)
+    if calendar is not None:
+        return pd.DataFrame({
+            'Open': calendar.session_opens(data['Open'].values),
+            'Close': calendar.session_closes(data['Close'].values),
+        }, index=pd.Index(calendar.dates, name='Date'))
+    data = data.sort_values(['Date', 'Time'], kind='stable')
+    dates = data['Date']
+
+    first_open = data.loc[~dates.duplicated(keep='first')].set_index('Date')['Open']
+    last_close = data.loc[~dates.duplicated(keep='last')].set_index('Date')['Close']
+
+    at_open = data.loc[data['Time'] == open_time].drop_duplicates('Date').set_index('Date')['Open']
+    at_close = data.loc[data['Time'] == close_time].drop_duplicates('Date').set_index('Date')['Close']
+
+    sessions = pd.DataFrame({
+        'Open': first_open.where(~first_open.index.isin(at_open.index), at_open.reindex(first_open.index)),
+        'Close': last_close.where(~last_close.index.isin(at_close.index), at_close.reindex(last_close.index)),
+    })
+    sessions.index.name = 'Date'
+    return sessions.astype(float)
+
+
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+
+def _first_per_session(session, rows):
+    sessions, first = np.unique(session[rows], return_index=True)
+    return sessions, rows[first]
+
+
+def session_open_close_arrays(timestamps, opens, closes, open_time=OPEN_TIME_UTC, close_time=CLOSE_TIME_UTC):
+    """Array version of session_open_close() for sorted int64 UTC-nanosecond timestamps.
+
+    Returns (session_of_bar, session_opens, session_closes) where sessions
+    are UTC dates numbered from 0.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    opens = np.asarray(opens, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+    day = timestamps // NS_PER_DAY
+    minute = (timestamps % NS_PER_DAY) // NS_PER_MINUTE
+
+    new_session = np.ones(len(timestamps), dtype=bool)
+    new_session[1:] = day[1:] != day[:-1]
+    session = np.cumsum(new_session) - 1
+    starts = np.flatnonzero(new_session)
+    ends = np.append(starts[1:], len(timestamps))
+
+    session_opens = opens[starts]
+    session_closes = closes[ends - 1]
+    at_open = np.flatnonzero(minute == open_time.hour * 60 + open_time.minute)
+    found, rows = _first_per_session(session, at_open)
+    session_opens[found] = opens[rows]
+    at_close = np.flatnonzero(minute == close_time.hour * 60 + close_time.minute)
+    found, rows = _first_per_session(session, at_close)
+    session_closes[found] = closes[rows]
+    return session, session_opens, session_closes
+
+
+def trailing_mean(values, lookback):
+    """Mean of the previous `lookback` values (fewer at the start), NaN for the first."""
+    values = np.asarray(values, dtype=float)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(len(values))
+    start = np.maximum(end - lookback, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (csum[end] - csum[start]) / (end - start)
+
+
+def bounds_from_sigma(opens, closes, sigma):
+    """Upper/Lower bounds from per-session opens/closes and a sigma array.
+
+    `sigma` has sessions on its first axis and may carry extra axes (time
+    slots, lookbacks); the session bases broadcast over them.
+    """
+    opens = np.asarray(opens, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+    prev_close = np.empty_like(closes)
+    prev_close[0] = np.nan
+    prev_close[1:] = closes[:-1]
+    extra = (slice(None),) + (None,) * (np.ndim(sigma) - 1)
+    upper = np.maximum(opens, prev_close)[extra] * (1 + sigma)
+    lower = np.minimum(opens, prev_close)[extra] * (1 - sigma)
+    return upper, lower
+
+
+def daily_bounds_arrays(opens, closes, lookback=LOOKBACK):
+    """Vectorized bounds from per-session open/close arrays.
+
+    Returns (sigma, upper, lower); element 0 is NaN because the first
+    session has neither a previous close nor any history.
+    """
+    opens = np.asarray(opens, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+    sigma = trailing_mean(np.abs(closes / opens - 1), lookback)
+    upper, lower = bounds_from_sigma(opens, closes, sigma)
+    return sigma, upper, lower
+
+
+def daily_noise_bounds(data, lookback=LOOKBACK, open_time=OPEN_TIME_UTC, close_time=CLOSE_TIME_UTC,
+                       calendar=None):
+    """Daily bounds table (Date, Sigma, UpperBound, LowerBound) for every session but the first."""
+    import pandas as pd
+
+    sessions = session_open_close(data, open_time, close_time, calendar)
+    sigma, upper, lower = daily_bounds_arrays(sessions['Open'].values, sessions['Close'].values, lookback)
+    return pd.DataFrame({
+        'Date': sessions.index[1:],
+        'Sigma': sigma[1:],
+        'UpperBound': upper[1:],
+        'LowerBound': lower[1:],
+    })
+
+
+MIN_SLOT_SESSIONS = 10
+
+
+def session_slot_matrix(data, column='Close', calendar=None):
+    """Pivot bars into a session x time-of-day matrix of `column`.
+
+    Returns (dates, slots, matrix) with NaN where a session has no bar in a
+    slot.  Duplicate (Date, Time) bars keep the first one.  With a
+    `calendar` the rows are its sessions, off-calendar bars are dropped and
+    the Date/Time columns are not needed.
+    """
+    data = flatten_columns(data)
+    if calendar is not None:
+        # Integer keys: calendar session numbers and int16 UTC minutes of day, no Date/Time columns
+        rows = np.flatnonzero(calendar.session >= 0)
+        minutes, slot_idx = np.unique(bar_keys(calendar.timestamps)[1][rows], return_inverse=True)
+        matrix = np.full((len(calendar), len(minutes)), np.nan)
+        # Assigned in reverse so that the first of duplicate bars wins
+        matrix[calendar.session[rows][::-1], slot_idx[::-1]] = data[column].values[rows][::-1]
+        return calendar.dates, minute_times(minutes), matrix
+
+    data = data.sort_values(['Date', 'Time'], kind='stable').drop_duplicates(['Date', 'Time'])
+    dates, day_idx = np.unique(data['Date'].values, return_inverse=True)
+    slots, slot_idx = np.unique(data['Time'].values, return_inverse=True)
+    matrix = np.full((len(dates), len(slots)), np.nan)
+    matrix[day_idx, slot_idx] = data[column].values
+    return dates, slots, matrix
+
+
+def intraday_bounds_arrays(opens, closes, close_matrix, lookback=LOOKBACK, min_periods=MIN_SLOT_SESSIONS):
+    """Per-slot bounds for every session in one array pass.
+
+    `opens`/`closes` are the session open/close prices and `close_matrix`
+    the session x slot bar closes.  sigma[d, s] is the mean of
+    |close[d', s] / open[d'] - 1| over the previous `lookback` sessions d'
+    with a bar in slot s, or NaN when fewer than `min_periods` of them have
+    one.  Returns (sigma, upper, lower) matrices; row 0 is all NaN.
+    """
+    opens = np.asarray(opens, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+    moves = np.abs(close_matrix / opens[:, None] - 1)
+    valid = ~np.isnan(moves)
+
+    n_days, n_slots = moves.shape
+    csum = np.zeros((n_days + 1, n_slots))
+    np.cumsum(np.where(valid, moves, 0.0), axis=0, out=csum[1:])
+    ccount = np.zeros((n_days + 1, n_slots), dtype=np.int64)
+    np.cumsum(valid, axis=0, out=ccount[1:])
+
+    end = np.arange(n_days)
+    start = np.maximum(end - lookback, 0)
+    total = csum[end] - csum[start]
+    count = ccount[end] - ccount[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma = np.where(count >= min_periods, total / count, np.nan)
+    upper, lower = bounds_from_sigma(opens, closes, sigma)
+    return sigma, upper, lower
+
+
+def intraday_noise_bounds(data, lookback=LOOKBACK, min_periods=MIN_SLOT_SESSIONS,
+                          open_time=OPEN_TIME_UTC, close_time=CLOSE_TIME_UTC, calendar=None):
+    """Time-of-day bounds table (Date, Time, Sigma, UpperBound, LowerBound) for the whole history.
+
+    Slots with too little history to estimate sigma are left out.
+    """
+    import pandas as pd
+
+    sessions = session_open_close(data, open_time, close_time, calendar)
+    dates, slots, close_matrix = session_slot_matrix(data, calendar=calendar)
+    sigma, upper, lower = intraday_bounds_arrays(
+        sessions['Open'].values, sessions['Close'].values, close_matrix, lookback, min_periods)
+
+    day_idx, slot_idx = np.nonzero(~np.isnan(sigma))
+    return pd.DataFrame({
+        'Date': dates[day_idx],
+        'Time': slots[slot_idx],
+        'Sigma': sigma[day_idx, slot_idx],
+        'UpperBound': upper[day_idx, slot_idx],
+        'LowerBound': lower[day_idx, slot_idx],
+    })
+
+
+SIGMA_ESTIMATORS = ('mean', 'ewma', 'median')
+
+
+def sigma_cube(moves, max_lookback, estimator='mean', min_periods=1):
+    """sigma for every lookback N = 1..max_lookback at once.
+
+    `moves` holds absolute moves with sessions on the first axis (1-D for
+    session returns, sessions x slots for per-slot moves; NaN = missing).
+    The result has shape (sessions, max_lookback) + moves.shape[1:], where
+    [d, N - 1] is estimated from the moves of the previous N sessions and
+    needs at least min(min_periods, N) observations, else NaN.
+
+    estimator:
+      'mean'   -- trailing mean, from one cumulative-sum pass
+      'ewma'   -- exponentially weighted mean with alpha = 2 / (N + 1),
+                  one pass over sessions updating all N together
+      'median' -- trailing median (one rolling pass per N)
+    """
+    moves = np.asarray(moves, dtype=float)
+    n_days = moves.shape[0]
+    lookbacks = np.arange(1, max_lookback + 1)
+    valid = ~np.isnan(moves)
+
+    # Observation counts per (session, N) window come from the same prefix sums
+    ccount = np.zeros((n_days + 1,) + moves.shape[1:], dtype=np.int64)
+    np.cumsum(valid, axis=0, out=ccount[1:])
+    end = np.arange(n_days)[:, None]
+    start = np.maximum(end - lookbacks[None, :], 0)
+    count = ccount[end] - ccount[start]
+    required = np.minimum(min_periods, lookbacks).reshape((1, -1) + (1,) * (moves.ndim - 1))
+    enough = count >= np.maximum(required, 1)
+
+    if estimator == 'mean':
+        csum = np.zeros((n_days + 1,) + moves.shape[1:])
+        np.cumsum(np.where(valid, moves, 0.0), axis=0, out=csum[1:])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cube = (csum[end] - csum[start]) / count
+    elif estimator == 'ewma':
+        alpha = (2.0 / (lookbacks + 1)).reshape((-1,) + (1,) * (moves.ndim - 1))
+        cube = np.full((n_days, max_lookback) + moves.shape[1:], np.nan)
+        level = np.full((max_lookback,) + moves.shape[1:], np.nan)
+        for d in range(1, n_days):
+            x = moves[d - 1]
+            seen = ~np.isnan(x)
+            updated = np.where(np.isnan(level), x, (1 - alpha) * level + alpha * x)
+            level = np.where(seen, updated, level)
+            cube[d] = level
+    elif estimator == 'median':
+        import pandas as pd
+
+        cube = np.full((n_days, max_lookback) + moves.shape[1:], np.nan)
+        history = pd.DataFrame(moves.reshape(n_days, -1)).shift(1)
+        for n in lookbacks:
+            rolled = history.rolling(n, min_periods=1).median().values
+            cube[:, n - 1] = rolled.reshape(moves.shape)
+    else:
+        raise ValueError(f"Unknown sigma estimator {estimator!r}; expected one of {SIGMA_ESTIMATORS}")
+
+    return np.where(enough, cube, np.nan)
+
+
+def daily_sigma_cube(data, max_lookback, estimator='mean',
+                     open_time=OPEN_TIME_UTC, close_time=CLOSE_TIME_UTC, calendar=None):
+    """Daily sigma for every lookback 1..max_lookback; a DataFrame indexed by Date, one column per N."""
+    import pandas as pd
+
+    sessions = session_open_close(data, open_time, close_time, calendar)
+    moves = np.abs(sessions['Close'].values / sessions['Open'].values - 1)
+    cube = sigma_cube(moves, max_lookback, estimator)
+    return pd.DataFrame(cube, index=sessions.index, columns=pd.RangeIndex(1, max_lookback + 1, name='N'))
+
+
+def intraday_sigma_cube(data, max_lookback, estimator='mean', min_periods=MIN_SLOT_SESSIONS,
+                        open_time=OPEN_TIME_UTC, close_time=CLOSE_TIME_UTC, calendar=None):
+    """Per-slot sigma for every lookback: returns (dates, slots, cube) with cube[session, N - 1, slot]."""
+    sessions = session_open_close(data, open_time, close_time, calendar)
+    dates, slots, close_matrix = session_slot_matrix(data, calendar=calendar)
+    moves = np.abs(close_matrix / sessions['Open'].values[:, None] - 1)
+    return dates, slots, sigma_cube(moves, max_lookback, estimator, min_periods)
@@ -0,0 +1,271 @@
+"""Option overlay: the strategy's trades expressed as calls and puts.
+
+backtest.py goes long with "(call)" and the README calls the long signal
+"Buy/Call", but the PnL is booked on shares.  option_overlay() buys the
+corresponding option for every trade instead, a call for a long trade and
+a put for a short one, at the trade's entry and sells it at the exit, for
+a grid of strikes (as moneyness, strike / entry price) and expiries (in
+calendar days from the entry).  Every trade x strike x expiry is priced in
+one broadcast Black-Scholes evaluation, with no per-trade loop.
+
+Implied volatility comes from the strategy's own sigma, the mean absolute
+session move: for normal returns E|r| = vol * sqrt(2 / pi), so the daily
+vol is sigma * sqrt(pi / 2), annualized over TRADING_DAYS.  Or it comes
+from a VolSurface over moneyness and expiry.
+
+    python options.py ^GSPC --csv sp500_30min_14d.csv
+"""
+import argparse
+import math
+
+import numpy as np
+
+try:
+    from scipy.special import ndtr
+except ImportError:
+    ndtr = None
+
+from noise_bounds import LOOKBACK, daily_bounds_arrays
+from session_calendar import SessionCalendar
+from simulation import (ENHANCED_PARAMS, T_ENTRY_INDEX, T_ENTRY_PRICE, T_EXIT_INDEX, T_EXIT_PRICE, T_PNL, T_SHARES,
+                        T_SIDE, TRADE_FIELDS, make_params)
+
+TRADING_DAYS = 252
+NS_PER_YEAR = 365 * 86_400 * 10**9      # ACT/365 year fractions
+OPTION_MULTIPLIER = 100                 # options per contract
+MONEYNESS = (0.98, 0.99, 1.0, 1.01, 1.02)
+EXPIRY_DAYS = (1, 7, 30)
+QUANTITIES = ('shares', 'delta')
+
+SUMMARY_COLUMNS = ['Moneyness', 'ExpiryDays', 'NumTrades', 'WinRate', 'OptionPnL', 'SharePnL', 'AvgPremium',
+                   'ReturnOnPremium']
+
+
+def norm_cdf(x):
+    """Standard normal CDF, elementwise: scipy's ndtr when installed, else Hart's double-precision algorithm."""
+    x = np.asarray(x, dtype=float)
+    if ndtr is not None:
+        return ndtr(x)
+    # Hart (1968) as given by West (2005), accurate to double precision
+    z = np.abs(x)
+    with np.errstate(over='ignore', invalid='ignore'):
+        exponential = np.exp(-z * z / 2)
+        numerator = ((((((0.0352624965998911 * z + 0.700383064443688) * z + 6.37396220353165) * z
+                        + 33.912866078383) * z + 112.079291497871) * z + 221.213596169931) * z + 220.206867912376)
+        denominator = (((((((0.0883883476483184 * z + 1.75566716318264) * z + 16.064177579207) * z
+                           + 86.7807322029461) * z + 296.564248779674) * z + 637.333633378831) * z
+                        + 793.826512519948) * z + 440.413735824752)
+        tail = np.asarray(exponential * numerator / denominator)
+        far = z >= 7.07106781186547
+        if far.any():
+            zf = z[far]
+            tail[far] = np.where(zf > 37, 0.0, exponential[far] / (zf + 1 / (zf + 2 / (zf + 3 / (zf + 4 / (zf + 0.65)))))
+                                 / 2.506628274631)
+    return np.where(x > 0, 1 - tail, tail)
+
+
+def _d1_d2(spot, strike, years, vol, rate):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = vol * np.sqrt(years)
+        d1 = (np.log(spot / strike) + (rate + vol * vol / 2) * years) / spread
+    return d1, d1 - spread
+
+
+def black_scholes(spot, strike, years, vol, rate=0.0, call=True):
+    """Black-Scholes price of European calls (call=True) or puts; all arguments broadcast.
+
+    Options at or past expiry (years <= 0) or with zero vol are worth their
+    intrinsic value, discounted in the zero-vol case.
+    """
+    spot, strike, years, vol = (np.asarray(a, dtype=float) for a in (spot, strike, years, vol))
+    call = np.asarray(call, dtype=bool)
+    sign = np.where(call, 1.0, -1.0)
+    live = (years > 0) & (vol > 0)
+    years = np.maximum(years, 0.0)
+    discount = np.exp(-rate * years)
+    d1, d2 = _d1_d2(spot, strike, years, vol, rate)
+    price = sign * (spot * norm_cdf(sign * d1) - strike * discount * norm_cdf(sign * d2))
+    intrinsic = np.maximum(sign * (spot - strike * discount), 0.0)
+    return np.where(live, price, intrinsic)
+
+
+def black_scholes_delta(spot, strike, years, vol, rate=0.0, call=True):
+    """dPrice/dSpot of black_scholes(); 0 or +/-1 at expiry and zero vol."""
+    spot, strike, years, vol = (np.asarray(a, dtype=float) for a in (spot, strike, years, vol))
+    call = np.asarray(call, dtype=bool)
+    sign = np.where(call, 1.0, -1.0)
+    live = (years > 0) & (vol > 0)
+    d1, _ = _d1_d2(spot, strike, np.maximum(years, 0.0), vol, rate)
+    in_the_money = sign * (spot - strike * np.exp(-rate * np.maximum(years, 0.0))) > 0
+    return np.where(live, sign * norm_cdf(sign * d1), np.where(in_the_money, sign, 0.0))
+
+
+def iv_from_sigma(sigma, trading_days=TRADING_DAYS):
+    """Annualized volatility implied by the strategy's sigma (mean absolute session move)."""
+    return np.asarray(sigma, dtype=float) * math.sqrt(math.pi / 2) * math.sqrt(trading_days)
+
+
+class VolSurface:
+    """Implied vols on a (moneyness x expiry days) grid, interpolated bilinearly and held flat outside it."""
+
+    def __init__(self, moneyness, expiry_days, vols):
+        self.moneyness = np.asarray(moneyness, dtype=float)
+        self.expiry_days = np.asarray(expiry_days, dtype=float)
+        self.vols = np.asarray(vols, dtype=float).reshape(len(self.moneyness), len(self.expiry_days))
+
+    def __call__(self, moneyness, days):
+        moneyness, days = np.broadcast_arrays(np.asarray(moneyness, dtype=float), np.asarray(days, dtype=float))
+        i, i1, u = _grid_position(self.moneyness, moneyness)
+        j, j1, v = _grid_position(self.expiry_days, days)
+        vols = self.vols
+        return ((1 - u) * (1 - v) * vols[i, j] + u * (1 - v) * vols[i1, j]
+                + (1 - u) * v * vols[i, j1] + u * v * vols[i1, j1])
+
+
+def _grid_position(grid, values):
+    """Lower and upper grid index of each value and its weight on the upper one (clamped to [0, 1])."""
+    lo = np.clip(np.searchsorted(grid, values, 'right') - 1, 0, max(len(grid) - 2, 0))
+    hi = np.minimum(lo + 1, len(grid) - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(hi > lo, np.clip((values - grid[lo]) / (grid[hi] - grid[lo]), 0.0, 1.0), 0.0)
+    return lo, hi, weight
+
+
+class OptionOverlay:
+    """Option legs of a trades array on a strike x expiry grid.
+
+    Arrays are (trades x moneyness x expiries): the premium paid at the
+    entry and received at the exit per option, the options held
+    (`quantity`) and the PnL after commissions.  `share_pnl` is the
+    trades' own PnL per trade.
+    """
+
+    def __init__(self, moneyness, expiry_days, call, strike, entry_premium, exit_premium, quantity, pnl, share_pnl):
+        self.moneyness = moneyness
+        self.expiry_days = expiry_days
+        self.call = call
+        self.strike = strike
+        self.entry_premium = entry_premium
+        self.exit_premium = exit_premium
+        self.quantity = quantity
+        self.pnl = pnl
+        self.share_pnl = share_pnl
+
+    def summary(self):
+        """One row per (moneyness, expiry): trade count, win rate %, option and share PnL, premium return %."""
+        import pandas as pd
+
+        cost = self.entry_premium * self.quantity
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return_on_premium = self.pnl.sum(axis=0) / cost.sum(axis=0) * 100
+        n = len(self.share_pnl)
+        k, e = np.meshgrid(np.arange(len(self.moneyness)), np.arange(len(self.expiry_days)), indexing='ij')
+        return pd.DataFrame({
+            'Moneyness': np.asarray(self.moneyness)[k.ravel()],
+            'ExpiryDays': np.asarray(self.expiry_days)[e.ravel()],
+            'NumTrades': n,
+            'WinRate': ((self.pnl > 0).sum(axis=0) / n * 100 if n else np.zeros(k.shape)).ravel(),
+            'OptionPnL': self.pnl.sum(axis=0).ravel(),
+            'SharePnL': float(self.share_pnl.sum()),
+            'AvgPremium': (self.entry_premium.mean(axis=0) if n else np.zeros(k.shape)).ravel(),
+            'ReturnOnPremium': return_on_premium.ravel(),
+        }, columns=SUMMARY_COLUMNS)
+
+
+def option_overlay(trades, timestamps, vol, moneyness=MONEYNESS, expiry_days=EXPIRY_DAYS, rate=0.0,
+                   quantity='shares', commission=0.65):
+    """Price every trade's option leg on a strike x expiry grid in one array pass.
+
+    `trades` is a simulation trades array and `timestamps` the times of
+    the bars its indices refer to (int64 UTC nanoseconds or datetime64).
+    Long trades buy calls, short trades puts, struck at moneyness x the
+    trade's entry price, held from the entry to the exit bar, with the
+    underlying at the trades' fill prices.  `vol` is a per-trade array of
+    annualized vols (see iv_from_sigma()) used at entry and exit, or a
+    VolSurface looked up at the entry and at the exit moneyness and time
+    left.  quantity='shares' holds one option per share traded,
+    'delta' as many as match the shares' delta at entry.  `commission` is
+    per contract of OPTION_MULTIPLIER options, paid on entry and exit.
+    """
+    if quantity not in QUANTITIES:
+        raise ValueError(f"Unknown quantity {quantity!r}; expected one of {QUANTITIES}")
+    trades = np.asarray(trades, dtype=float).reshape(-1, TRADE_FIELDS)
+    timestamps = np.asarray(timestamps).astype('datetime64[ns]').astype(np.int64)
+    moneyness = np.asarray(moneyness, dtype=float)
+    expiry_days = np.asarray(expiry_days, dtype=float)
+
+    # (trades, 1, 1) against (1, strikes, 1) and (1, 1, expiries)
+    per_trade = (slice(None), None, None)
+    entry_spot = trades[:, T_ENTRY_PRICE][per_trade]
+    exit_spot = trades[:, T_EXIT_PRICE][per_trade]
+    call = (trades[:, T_SIDE] == 1)[per_trade]
+    held = (timestamps[trades[:, T_EXIT_INDEX].astype(np.int64)]
+            - timestamps[trades[:, T_ENTRY_INDEX].astype(np.int64)]) / NS_PER_YEAR
+    strike = entry_spot * moneyness[None, :, None]
+    entry_years = np.broadcast_to(expiry_days[None, None, :] / 365, (len(trades), 1, len(expiry_days)))
+    exit_years = entry_years - held[per_trade]
+
+    if isinstance(vol, VolSurface):
+        entry_vol = vol(moneyness[None, :, None], entry_years * 365)
+        exit_vol = vol(strike / exit_spot, np.maximum(exit_years, 0.0) * 365)
+    else:
+        entry_vol = exit_vol = np.asarray(vol, dtype=float)
+        if entry_vol.ndim == 1:
+            entry_vol = exit_vol = entry_vol[per_trade]
+
+    entry_premium = black_scholes(entry_spot, strike, entry_years, entry_vol, rate, call)
+    exit_premium = black_scholes(exit_spot, strike, exit_years, exit_vol, rate, call)
+    shares = trades[:, T_SHARES][per_trade]
+    if quantity == 'delta':
+        delta = np.abs(black_scholes_delta(entry_spot, strike, entry_years, entry_vol, rate, call))
+        with np.errstate(divide='ignore'):
+            held_options = np.where(delta > 0, shares / delta, 0.0)
+    else:
+        held_options = np.broadcast_to(shares, entry_premium.shape)
+    pnl = (exit_premium - entry_premium) * held_options - 2 * commission * held_options / OPTION_MULTIPLIER
+    return OptionOverlay(moneyness, expiry_days, call[:, 0, 0], strike, entry_premium, exit_premium,
+                         held_options, pnl, trades[:, T_PNL].copy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Price the strategy trades as calls and puts')
+    parser.add_argument('symbol')
+    parser.add_argument('--interval', default='30m')
+    parser.add_argument('--period', default='60d')
+    parser.add_argument('--csv', default=None, help='Yahoo-format CSV (or the bar store dataset) instead of the cache')
+    parser.add_argument('--offline', action='store_true', help='only use bars already in the cache')
+    parser.add_argument('--lookback', type=int, default=LOOKBACK)
+    parser.add_argument('--moneyness', default=','.join(map(str, MONEYNESS)), help='strikes / entry price')
+    parser.add_argument('--expiry-days', default=','.join(map(str, EXPIRY_DAYS)))
+    parser.add_argument('--rate', type=float, default=0.0, help='annual risk-free rate')
+    parser.add_argument('--quantity', choices=QUANTITIES, default='shares')
+    parser.add_argument('--output', default='option_overlay.csv')
+    args = parser.parse_args()
+
+    from market_data import BarCache, load_bars
+    from universe_runner import run_symbol
+
+    if args.csv is not None:
+        frame = load_bars(args.symbol, args.interval, args.csv)
+    else:
+        frame = BarCache(offline=args.offline).get(args.symbol, interval=args.interval, period=args.period)
+    bars = {column: frame[column].values.astype(np.float64) for column in ('Open', 'High', 'Low', 'Close')}
+    bars['timestamp'] = frame.index.as_unit('ns').asi8
+    rows, result = run_symbol(bars, make_params(**ENHANCED_PARAMS), args.lookback)
+
+    # Each trade's vol is the sigma of its entry session
+    calendar = SessionCalendar(bars['timestamp'])
+    sigma, _, _ = daily_bounds_arrays(calendar.session_opens(bars['Open']), calendar.session_closes(bars['Close']),
+                                      args.lookback)
+    entry_session = calendar.session[rows[result.trades[:, T_ENTRY_INDEX].astype(np.int64)]]
+    overlay = option_overlay(result.trades, bars['timestamp'][rows], iv_from_sigma(sigma[entry_session]),
+                             [float(m) for m in args.moneyness.split(',')],
+                             [float(d) for d in args.expiry_days.split(',')], args.rate, args.quantity)
+    table = overlay.summary()
+    table.to_csv(args.output, index=False)
+    print(table.to_string(index=False))
+    print(f"\n{len(result.trades)} trades, share PnL ${result.trades[:, T_PNL].sum():,.2f} -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
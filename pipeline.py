@@ -0,0 +1,339 @@
+"""Fingerprinted pipeline: download -> bounds -> merge -> simulate -> metrics -> report.
+
+One entry point for the 2_week_bounds.py -> enhanced_backtest.py workflow.
+Every stage is keyed by a fingerprint of its code (its own source and the
+source files of the modules it declares), the parameters it reads and
+the content fingerprints of its inputs; its output is cached on disk
+under that key together with the output's own content fingerprint.  A run re-executes only the stages whose key is not cached:
+changing the stop loss re-runs simulate, metrics and report but not the
+bounds; changing nothing re-runs only the download (the source of the
+data), whose unchanged content leaves every later key the same.  Cached
+outputs are only unpickled when a later stage that needs them runs.
+
+The cache is size-bounded: least recently used entries are evicted once
+the total exceeds max_bytes.
+
+    python pipeline.py --stop-loss-pct 0.02 --report file
+"""
+import argparse
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from bar_keys import join_bounds
+from market_data import BarCache, load_bars
+from noise_bounds import LOOKBACK, daily_noise_bounds, intraday_noise_bounds
+from report import REPORT_MODES, downsample, finish, pyplot
+from session_calendar import SessionCalendar
+from simulation import make_params, simulate, trades_frame
+from universe_runner import ENHANCED_PARAMS
+
+DEFAULT_CACHE_DIR = '.pipeline_cache'
+DEFAULT_CACHE_BYTES = 512 * 2**20
+CACHE_VERSION = 1  # bump to invalidate every cached stage
+
+DEFAULTS = dict(
+    symbol='^GSPC', interval='30m', period='14d', source='csv', csv='sp500_30min_14d.csv',
+    lookback=LOOKBACK, bounds_kind='daily',
+    commission=0.0035, slippage=0.001, initial_aum=100_000, **ENHANCED_PARAMS,
+    out_dir='pipeline_out', report='none',
+)
+
+
+def _feed(h, value):
+    """Feed a canonical byte form of `value` into the hash `h`."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        h.update(type(value).__name__.encode())
+        if isinstance(value, pd.DataFrame):
+            _feed(h, [str(c) for c in value.columns])
+            _feed(h, [str(d) for d in value.dtypes])
+        else:
+            _feed(h, str(value.dtype))
+        h.update(pd.util.hash_pandas_object(value, index=not isinstance(value, pd.Index)).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        _feed(h, (value.dtype.str, value.shape))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b'{')
+        for key in sorted(value, key=str):
+            _feed(h, key)
+            _feed(h, value[key])
+        h.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        h.update(b'[')
+        for item in value:
+            _feed(h, item)
+        h.update(b']')
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        _feed(h, (type(value).__name__, vars(value)))
+    else:
+        h.update(repr(value).encode())
+        h.update(b'\0')
+
+
+def fingerprint(*values):
+    """Content fingerprint (hex SHA-256) of frames, arrays, containers and scalars."""
+    h = hashlib.sha256()
+    _feed(h, values)
+    return h.hexdigest()
+
+
+class StageCache:
+    """Stage outputs on disk keyed by fingerprint, with LRU eviction above max_bytes.
+
+    An entry holds two pickles: the output's content fingerprint, then the
+    output, so the fingerprint can be read without loading the output.
+    The file mtime is the last use.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + '.pkl')
+
+    def fingerprint(self, key):
+        """The cached output's fingerprint, or None when `key` is not cached."""
+        try:
+            with open(self.path(key), 'rb') as f:
+                fp = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(self.path(key))
+        return fp
+
+    def load(self, key):
+        with open(self.path(key), 'rb') as f:
+            pickle.load(f)
+            return pickle.load(f)
+
+    def put(self, key, fp, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(fp, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def entries(self):
+        """(mtime, size, path) of every entry, least recently used first."""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.pkl'):
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= size
+
+
+def module_fingerprint(name):
+    """Fingerprint (hex SHA-256) of the source file of module `name`."""
+    with open(importlib.import_module(name).__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class Stage:
+    """A pipeline step: func(*outputs of `inputs`, **the `params` it reads).
+
+    `modules` names the modules whose code the step runs (the stage
+    function's own source is always included), so editing them
+    invalidates its cached outputs.  always=True stages (data sources) run
+    on every pipeline run; files=True stages return the paths they wrote,
+    and a cached result only counts while those files exist.
+    """
+
+    def __init__(self, name, func, inputs=(), params=(), always=False, files=False, modules=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+        self.always = always
+        self.files = files
+        self.modules = tuple(modules)
+
+    @property
+    def code(self):
+        """The stage function's source and the fingerprints of its modules' source files."""
+        return inspect.getsource(self.func), {name: module_fingerprint(name) for name in self.modules}
+
+
+def download(symbol, interval, period, source, csv):
+    """Bars (UTC DatetimeIndex) from the Yahoo CSV / bar store, or from the bar cache."""
+    if source == 'csv':
+        return load_bars(symbol, interval, csv)
+    return BarCache().get(symbol, interval=interval, period=period)
+
+
+def compute_bounds(bars, lookback, bounds_kind):
+    calendar = SessionCalendar.from_frame(bars)
+    if bounds_kind == 'intraday':
+        return intraday_noise_bounds(bars, lookback=lookback, calendar=calendar)
+    return daily_noise_bounds(bars, lookback=lookback, calendar=calendar)
+
+
+def merge(bars, bounds_table):
+    merged = join_bounds(bars.reset_index(), bounds_table)
+    calendar = SessionCalendar.from_frame(merged)
+    return {'bars': merged, 'session_open': calendar.open_flags(), 'session_close': calendar.close_flags()}
+
+
+def run_simulation(merged, commission, slippage, stop_loss_pct, bounds_buffer, max_position_size, size_every_bar,
+                   initial_aum):
+    params = make_params(commission=commission, slippage=slippage, stop_loss_pct=stop_loss_pct,
+                         bounds_buffer=bounds_buffer, max_position_size=max_position_size,
+                         size_every_bar=size_every_bar)
+    return simulate(merged['bars'], params, merged['session_open'], merged['session_close'], initial_aum=initial_aum)
+
+
+def compute_metrics(result, initial_aum):
+    return result.summary(initial_aum)
+
+
+def write_report(bounds_table, merged, result, summary, out_dir, report):
+    """Write the bounds CSV, trade log, metrics summary and (unless report='none') the results chart."""
+    os.makedirs(out_dir, exist_ok=True)
+    times = merged['bars']['Datetime']
+    paths = [os.path.join(out_dir, name) for name in ('bounds.csv', 'trades.csv', 'summary.md')]
+    bounds_table.to_csv(paths[0], index=False)
+    trades_frame(result.trades, times, with_stop=True).to_csv(paths[1], index=False)
+    with open(paths[2], 'w') as f:
+        f.write('| Metric | Value |\n|---|---|\n')
+        f.writelines(f'| {key} | {value:.4f} |\n' for key, value in summary.items())
+    if report != 'none':
+        plt = pyplot(report)
+        plt.figure(figsize=(20, 8))
+        plt.subplot(2, 1, 1)
+        plt.plot(*downsample(times, result.equity), linewidth=2)
+        plt.title('Equity Curve')
+        plt.grid(True, alpha=0.3)
+        plt.subplot(2, 1, 2)
+        drawdown_times, drawdown_values = downsample(times, result.drawdown)
+        plt.fill_between(drawdown_times, drawdown_values, 0, color='red', alpha=0.3)
+        plt.title('Drawdown (%)')
+        plt.grid(True, alpha=0.3)
+        plt.tight_layout()
+        paths.append(os.path.join(out_dir, 'results.png'))
+        plt.savefig(paths[-1], dpi=150, bbox_inches='tight')
+        finish(plt, report)
+    return paths
+
+
+STAGES = (
+    Stage('download', download, params=('symbol', 'interval', 'period', 'source', 'csv'), always=True,
+          modules=('market_data', 'bar_store')),
+    Stage('bounds', compute_bounds, ('download',), ('lookback', 'bounds_kind'),
+          modules=('noise_bounds', 'session_calendar', 'bar_keys')),
+    Stage('merge', merge, ('download', 'bounds'), modules=('bar_keys', 'session_calendar')),
+    Stage('simulate', run_simulation, ('merge',),
+          ('commission', 'slippage', 'stop_loss_pct', 'bounds_buffer', 'max_position_size', 'size_every_bar',
+           'initial_aum'), modules=('simulation', 'metrics')),
+    Stage('metrics', compute_metrics, ('simulate',), ('initial_aum',), modules=('simulation', 'metrics')),
+    Stage('report', write_report, ('bounds', 'merge', 'simulate', 'metrics'), ('out_dir', 'report'), files=True,
+          modules=('simulation', 'trade_log', 'report')),
+)
+
+
+def run(params=None, cache=None, stages=STAGES, force=()):
+    """Run the pipeline; returns (outputs, log).
+
+    `params` override DEFAULTS; stages named in `force` run regardless of
+    the cache.  `outputs` maps stage names to outputs, loading cached ones
+    on first access; `log` lists (stage, 'ran' | 'cached', seconds).
+    """
+    params = dict(DEFAULTS, **(params or {}))
+    cache = StageCache() if cache is None else cache
+    outputs = _Outputs(cache)
+    fingerprints, log = {}, []
+    for stage in stages:
+        start = time.perf_counter()
+        kwargs = {name: params[name] for name in stage.params}
+        key = fingerprint(CACHE_VERSION, stage.name, stage.code, kwargs, [fingerprints[name] for name in stage.inputs])
+        fp = None if stage.always or stage.name in force else cache.fingerprint(key)
+        if fp is not None and stage.files and not all(os.path.exists(p) for p in cache.load(key)):
+            fp = None
+        if fp is None:
+            value = stage.func(*(outputs[name] for name in stage.inputs), **kwargs)
+            fp = fingerprint(value)
+            if not stage.always:
+                cache.put(key, fp, value)
+            outputs.set(stage.name, value)
+        else:
+            outputs.cached(stage.name, key)
+        fingerprints[stage.name] = fp
+        log.append((stage.name, 'cached' if stage.name in outputs.keys else 'ran', time.perf_counter() - start))
+    return outputs, log
+
+
+class _Outputs:
+    """Stage outputs by name, loading cached ones from the cache on first access."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.values = {}
+        self.keys = {}
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def cached(self, name, key):
+        self.keys[name] = key
+
+    def __getitem__(self, name):
+        if name not in self.values:
+            self.values[name] = self.cache.load(self.keys[name])
+        return self.values[name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bounds + enhanced backtest pipeline with cached stages')
+    for name, default in DEFAULTS.items():
+        flag = '--' + name.replace('_', '-')
+        if isinstance(default, bool):
+            parser.add_argument(flag, type=lambda s: s.lower() in ('1', 'true', 'yes'), default=default)
+        elif name == 'report':
+            parser.add_argument(flag, choices=REPORT_MODES, default=default)
+        elif name == 'source':
+            parser.add_argument(flag, choices=('csv', 'cache'), default=default,
+                                help='csv: --csv / bar store; cache: the .bar_cache/ download cache')
+        elif name == 'bounds_kind':
+            parser.add_argument(flag, choices=('daily', 'intraday'), default=default)
+        else:
+            parser.add_argument(flag, type=type(default), default=default)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_BYTES / 2**20)
+    parser.add_argument('--force', nargs='*', default=(), choices=[stage.name for stage in STAGES])
+    args = vars(parser.parse_args())
+
+    cache = StageCache(args.pop('cache_dir'), int(args.pop('cache_mb') * 2**20))
+    force = args.pop('force')
+    outputs, log = run(args, cache, force=force)
+    for name, status, seconds in log:
+        print(f"{name:<9} {status:<7} {seconds * 1000:8.1f} ms")
+    summary = outputs['metrics']
+    print(f"\nTotal Return: {summary['TotalReturn']:.2f}%  Trades: {summary['NumTrades']}  "
+          f"Max Drawdown: {summary['MaxDrawdown']:.2f}%  -> {args['out_dir']}/")
+
+
+if __name__ == '__main__':
+    main()
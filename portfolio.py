@@ -0,0 +1,248 @@
+"""Shared-capital portfolio simulation across many symbols.
+
+All symbols are put on one time axis (the union of their bar times) as
+(bars x symbols) matrices, and each bar advances every symbol at once as
+a lane of lanes.Lanes, with the rules of simulation.step().  Unlike
+universe_runner.py, where every symbol trades its own account, the
+symbols draw on one pool of capital: an entry is sized by a pluggable
+sizer from the portfolio's equity, and the entries of a bar are scaled
+down together when they would commit more than the free capital.
+
+    python portfolio.py AAPL MSFT NVDA --sizer equal --capital 1000000
+
+The result holds the combined mark-to-market equity per bar, each
+symbol's signed exposure per bar and every symbol's trades.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from lanes import Lanes
+from market_data import BarCache
+from metrics import finish_session, initial_metrics, record_bar, record_trade, summary
+from noise_bounds import LOOKBACK, daily_bounds_arrays
+from session_calendar import SessionCalendar
+from simulation import PRICE_COLUMNS, STOP_LOSS, T_PNL, T_REASON, trades_frame
+from trade_log import TradeBuffer
+from universe_runner import ENHANCED_PARAMS
+
+SYMBOL_COLUMNS = ['Symbol', 'NumTrades', 'WinRate', 'ProfitFactor', 'PnL', 'Contribution', 'MaxExposure']
+
+
+def equal_weight(max_position_size=ENHANCED_PARAMS['max_position_size']):
+    """Sizer giving every symbol an equal share of `max_position_size` x equity."""
+    def sizer(equity, prices, n_symbols):
+        return np.trunc(equity * max_position_size / n_symbols / prices)
+    return sizer
+
+
+def fixed_fraction(fraction):
+    """Sizer putting `fraction` of equity into each new position."""
+    def sizer(equity, prices, n_symbols):
+        return np.trunc(equity * fraction / prices)
+    return sizer
+
+
+class Portfolio(Lanes):
+    """Lanes sharing one capital pool: lane AUM is each symbol's realized PnL.
+
+    Entries are sized at the entry price by `sizer(equity, prices,
+    n_symbols)` from the realized equity (capital plus all realized PnL),
+    and scaled down pro rata so that the notional of open positions, at
+    their entry prices, stays within `max_gross` x equity.
+    """
+
+    def __init__(self, n, sizer, capital, stop_loss_pct=0.0, bounds_buffer=0.0, commission=0.0035,
+                 slippage=0.001, max_gross=1.0):
+        super().__init__(n, stop_loss_pct, bounds_buffer, aum=0.0, commission=commission, slippage=slippage,
+                         record_trades=True)
+        self.sizer = sizer
+        self.capital = capital
+        self.max_gross = max_gross
+
+    @property
+    def equity(self):
+        return self.capital + self.aum.sum()
+
+    def size(self, size_price):
+        # Sized at entry, from the shared equity
+        return self.shares
+
+    def enter(self, i, mask, side, price, shares):
+        prices = price[mask]
+        equity = self.equity
+        wanted = self.sizer(equity, prices, self.n)
+        held = (self.position != 0) & ~mask
+        free = max(equity * self.max_gross - np.dot(self.entry_shares[held], self.entry_price[held]), 0.0)
+        need = np.dot(wanted, prices)
+        if need > free:
+            wanted = np.trunc(wanted * (free / need))
+        shares = np.zeros(self.n)
+        shares[mask] = wanted
+        super().enter(i, mask, side, price, shares)
+
+
+class PortfolioResult:
+    """Combined equity and drawdown (%) per bar, exposure (bars x symbols) and trades of a portfolio run.
+
+    `exposure` is each symbol's signed notional at the last close (float32),
+    `symbol_summary` one row per symbol, and trades()/trade_buffer() give
+    the trades with bar indices into `times`.
+    """
+
+    def __init__(self, times, symbols, capital, equity, drawdown, exposure, metrics, session_pnl, portfolio):
+        self.times = times
+        self.symbols = symbols
+        self.capital = capital
+        self.equity = equity
+        self.drawdown = drawdown
+        self.exposure = exposure
+        self.metrics = metrics
+        self.session_pnl = session_pnl
+        self._portfolio = portfolio
+
+    def summary(self):
+        """All metrics from metrics.summary() over the combined equity."""
+        return summary(self.metrics, self.capital)
+
+    @property
+    def symbol_summary(self):
+        portfolio = self._portfolio
+        win_rate, profit_factor = portfolio.trade_stats()
+        return pd.DataFrame({
+            'Symbol': self.symbols,
+            'NumTrades': portfolio.num_trades,
+            'WinRate': win_rate,
+            'ProfitFactor': profit_factor,
+            'PnL': portfolio.aum,
+            'Contribution': portfolio.aum / self.capital * 100,
+            'MaxExposure': np.abs(self.exposure).max(axis=0) if len(self.times) else 0.0,
+        }, columns=SYMBOL_COLUMNS)
+
+    def trades(self, symbol):
+        """Trades array of one symbol."""
+        lanes, rows = self._portfolio.trades()
+        return rows[lanes == self.symbols.index(symbol)]
+
+    def trade_logs(self):
+        """{symbol: trade log DataFrame}."""
+        return {s: trades_frame(self.trades(s), self.times, with_stop=True) for s in self.symbols}
+
+    def trade_buffer(self, buffer=None):
+        """All trades in a trade_log.TradeBuffer."""
+        buffer = TradeBuffer() if buffer is None else buffer
+        for symbol in self.symbols:
+            buffer.extend(self.trades(symbol), self.times, symbol)
+        return buffer
+
+
+def _symbol_bars(bars, lookback):
+    """Timestamps, prices, daily bounds and session flags of the simulated bars of one symbol (as run_symbol)."""
+    timestamps = bars.index.as_unit('ns').asi8
+    calendar = SessionCalendar(timestamps)
+    sigma, upper, lower = daily_bounds_arrays(calendar.session_opens(bars['Open'].values),
+                                              calendar.session_closes(bars['Close'].values), lookback)
+    rows = np.flatnonzero(calendar.session >= 1)
+    session = calendar.session[rows]
+    columns = {column: bars[column].values[rows] for column in ('Open', 'High', 'Low', 'Close')}
+    columns['UpperBound'] = upper[session]
+    columns['LowerBound'] = lower[session]
+    return timestamps[rows], columns, calendar.open_flags()[rows], calendar.close_flags()[rows]
+
+
+def align(bars_by_symbol, lookback=LOOKBACK):
+    """Put the symbols on the union of their bar times.
+
+    Returns (times, symbols, matrices, session_open, session_close):
+    `matrices` maps each of PRICE_COLUMNS to a (bars x symbols) float64
+    matrix, NaN where a symbol has no bar or no bounds yet, and the flag
+    matrices mark each symbol's session open and close bars.
+    """
+    symbols = [s for s, bars in bars_by_symbol.items() if len(bars) > 0]
+    prepared = [_symbol_bars(bars_by_symbol[s], lookback) for s in symbols]
+    times = np.unique(np.concatenate([p[0] for p in prepared])) if prepared else np.empty(0, dtype=np.int64)
+    shape = (len(times), len(symbols))
+    matrices = {column: np.full(shape, np.nan) for column in PRICE_COLUMNS}
+    session_open = np.zeros(shape, dtype=bool)
+    session_close = np.zeros(shape, dtype=bool)
+    for k, (timestamps, columns, opens, closes) in enumerate(prepared):
+        rows = np.searchsorted(times, timestamps)
+        for column in PRICE_COLUMNS:
+            matrices[column][rows, k] = columns[column]
+        session_open[rows, k] = opens
+        session_close[rows, k] = closes
+    times = pd.DatetimeIndex(pd.to_datetime(times, utc=True), name='Datetime')
+    return times, symbols, matrices, session_open, session_close
+
+
+def simulate_portfolio(bars_by_symbol, sizer=None, capital=100_000, lookback=LOOKBACK,
+                       stop_loss_pct=ENHANCED_PARAMS['stop_loss_pct'], bounds_buffer=ENHANCED_PARAMS['bounds_buffer'],
+                       commission=0.0035, slippage=0.001, max_gross=1.0):
+    """Simulate {symbol: bars frame} (UTC DatetimeIndex, OHLC) on shared capital in one pass.
+
+    Bounds are the daily noise bounds of each symbol, as in
+    universe_runner.run_symbol(); `sizer` defaults to equal_weight().
+    """
+    sizer = equal_weight() if sizer is None else sizer
+    times, symbols, matrices, session_open, session_close = align(bars_by_symbol, lookback)
+    open_, high, low, close, upper, lower = (matrices[column] for column in PRICE_COLUMNS)
+    active = ~np.isnan(close) & ~np.isnan(upper) & ~np.isnan(lower)
+    n, lanes = close.shape
+
+    portfolio = Portfolio(lanes, sizer, float(capital), stop_loss_pct, bounds_buffer, commission, slippage, max_gross)
+    equity = np.empty(n)
+    drawdown = np.empty(n)
+    exposure = np.zeros((n, lanes), dtype=np.float32)
+    sessions = SessionCalendar(times.asi8).session
+    session_pnl = np.zeros(int(sessions.max()) + 1 if n else 0)
+    metrics = initial_metrics(float(capital))
+    last_close = np.full(lanes, np.nan)
+
+    for i in range(n):
+        exiting = portfolio.step(i, open_[i], high[i], low[i], close[i], upper[i], lower[i],
+                                 session_open[i], session_close[i], active[i])
+        if exiting.any():
+            for pnl, reason in portfolio.trade_rows[-1][:, [T_PNL, T_REASON]]:
+                record_trade(metrics, pnl, reason == STOP_LOSS)
+        np.copyto(last_close, close[i], where=active[i])
+        held = portfolio.position != 0
+        notional = np.where(held, portfolio.position * portfolio.entry_shares * last_close, 0.0)
+        exposure[i] = notional
+        unrealized = np.where(held, notional - portfolio.position * portfolio.entry_shares * portfolio.entry_price, 0.0)
+        equity[i] = portfolio.equity + unrealized.sum()
+        record_bar(metrics, drawdown, session_pnl, i, sessions[i], equity[i], float(held.any()))
+    finish_session(metrics, session_pnl)
+    return PortfolioResult(times, symbols, float(capital), equity, drawdown, exposure, metrics, session_pnl, portfolio)
+
+
+SIZERS = {'equal': equal_weight, 'fixed': fixed_fraction}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Noise-bounds strategy over many symbols on shared capital')
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--interval', default='30m')
+    parser.add_argument('--period', default='60d')
+    parser.add_argument('--capital', type=float, default=1_000_000)
+    parser.add_argument('--sizer', choices=sorted(SIZERS), default='equal')
+    parser.add_argument('--fraction', type=float, default=ENHANCED_PARAMS['max_position_size'],
+                        help='equity fraction: in total for equal, per position for fixed')
+    parser.add_argument('--max-gross', type=float, default=1.0, help='cap on open notional as a multiple of equity')
+    parser.add_argument('--offline', action='store_true', help='only use bars already in the cache')
+    parser.add_argument('--output', default='portfolio_summary.csv')
+    args = parser.parse_args()
+
+    bars = BarCache(offline=args.offline).get_many(args.symbols, interval=args.interval, period=args.period)
+    result = simulate_portfolio(bars, SIZERS[args.sizer](args.fraction), args.capital, max_gross=args.max_gross)
+    per_symbol = result.symbol_summary
+    per_symbol.to_csv(args.output, index=False)
+    print(per_symbol.to_string(index=False))
+    metrics = result.summary()
+    print(f"\nPortfolio of {len(result.symbols)} symbols over {len(result.times)} bars -> {args.output}")
+    for key in ('TotalReturn', 'MaxDrawdown', 'SharpeRatio', 'NumTrades'):
+        print(f"{key}: {metrics[key]:.2f}")
+
+
+if __name__ == '__main__':
+    main()
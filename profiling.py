@@ -0,0 +1,137 @@
+"""Per-stage wall time, throughput and memory counters for the scripts.
+
+Profiling is off unless the STRATEGY_PROFILE environment variable is set:
+
+    STRATEGY_PROFILE=1 python backtest.py        # wall time, bars/s, peak RSS
+    STRATEGY_PROFILE=memory python backtest.py   # also Python allocation peaks (tracemalloc)
+
+Scripts mark stages in order with begin()/end() (or `with profiler.stage(...)`)
+and call write(), which saves <run>_profile.json next to the script's other
+outputs.  When disabled every call returns immediately without reading a
+clock or allocating.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_ENV = 'STRATEGY_PROFILE'
+
+
+def peak_rss_mb():
+    """Process peak resident set size in MB, or None where it is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name, bars):
+        self.profiler = profiler
+        self.name = name
+        self.bars = bars
+
+    def __enter__(self):
+        self.profiler.begin(self.name, self.bars)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.end()
+        return False
+
+
+class Profiler:
+    """Collects one record per stage of a run.
+
+    `enabled` defaults to the STRATEGY_PROFILE environment variable; the
+    value 'memory' also turns on tracemalloc.
+    """
+
+    def __init__(self, run, enabled=None, trace_memory=None, output_dir='.'):
+        setting = os.environ.get(PROFILE_ENV, '').strip().lower()
+        self.run = run
+        self.enabled = setting not in ('', '0', 'false', 'off') if enabled is None else enabled
+        self.trace_memory = self.enabled and (setting == 'memory' if trace_memory is None else trace_memory)
+        self.output_dir = output_dir
+        self.stages = []
+        self._current = None
+        if self.enabled:
+            self._started = time.perf_counter()
+            self._wall_started = time.time()
+            if self.trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def begin(self, name, bars=None):
+        """Start stage `name`, ending the current one; `bars` is the number of bars it processes."""
+        if not self.enabled:
+            return
+        self.end()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self._current = (name, bars, peak_rss_mb(), time.perf_counter())
+
+    def end(self, bars=None):
+        """End the current stage (if any); `bars` overrides the count given to begin()."""
+        if not self.enabled or self._current is None:
+            return
+        finished = time.perf_counter()
+        name, begin_bars, rss_before, started = self._current
+        self._current = None
+        bars = begin_bars if bars is None else bars
+        wall = finished - started
+        record = {'stage': name, 'wall_s': wall, 'bars': bars,
+                  'bars_per_s': bars / wall if bars is not None and wall > 0 else None}
+        rss = peak_rss_mb()
+        if rss is not None:
+            record['peak_rss_mb'] = rss
+            record['peak_rss_growth_mb'] = rss - rss_before
+        if self.trace_memory:
+            record['py_alloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        self.stages.append(record)
+
+    def stage(self, name, bars=None):
+        """Context manager form of begin()/end()."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, bars)
+
+    def profile(self):
+        """The run's profile as a dict (stages so far, current stage ended)."""
+        self.end()
+        return {
+            'run': self.run,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self._wall_started)),
+            'argv': sys.argv,
+            'total_s': time.perf_counter() - self._started,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+        }
+
+    def write(self, path=None):
+        """End the current stage and save the profile as JSON; returns the path (None when disabled)."""
+        if not self.enabled:
+            return None
+        path = path or os.path.join(self.output_dir, f'{self.run}_profile.json')
+        with open(path, 'w') as f:
+            json.dump(self.profile(), f, indent=2)
+        print(f"Profile written to {path}")
+        return path
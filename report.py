@@ -0,0 +1,103 @@
+"""Report rendering for the scripts: interactive, to files, or not at all.
+
+The mode comes from `--report show|file|none` on the script's command line
+or the STRATEGY_REPORT environment variable (default 'show'):
+
+    python enhanced_backtest.py --report file   # headless: Agg backend, PNGs only
+    STRATEGY_REPORT=none python backtest.py     # batch runs: no plotting at all
+
+matplotlib is imported only by pyplot(), so 'none' never loads it.  Long
+series are thinned with downsample() (Largest-Triangle-Three-Buckets),
+which keeps the visual shape - peaks, troughs, bound steps - within a
+fixed point budget.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+REPORT_MODES = ('show', 'file', 'none')
+REPORT_ENV = 'STRATEGY_REPORT'
+MAX_POINTS = 2000
+
+
+def report_mode(default='show'):
+    """The report mode from --report (if given) or STRATEGY_REPORT."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--report', choices=REPORT_MODES)
+    args, _ = parser.parse_known_args()
+    mode = args.report or os.environ.get(REPORT_ENV, default).strip().lower()
+    if mode not in REPORT_MODES:
+        raise ValueError(f"Unknown report mode {mode!r}; use one of {', '.join(REPORT_MODES)}")
+    return mode
+
+
+def pyplot(mode):
+    """Import matplotlib.pyplot for `mode`, selecting the Agg backend for file output."""
+    import matplotlib
+
+    if mode == 'file':
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def finish(plt, mode):
+    """Show the figures in 'show' mode, otherwise release them."""
+    if mode == 'show':
+        plt.show()
+    else:
+        plt.close('all')
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the `n_out` points Largest-Triangle-Three-Buckets keeps from (x, y).
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the average of the next bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        if i == n_out - 3:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = np.nanmean(y[next_start:next_end]) if np.isfinite(y[next_start:next_end]).any() else y[a]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[i + 1] = a
+    return indices
+
+
+def _numeric(x):
+    if isinstance(x, (pd.Series, pd.Index)) and x.dtype.kind == 'M':
+        return pd.DatetimeIndex(x).asi8
+    return np.asarray(x)
+
+
+def _take(values, indices):
+    return values.iloc[indices] if isinstance(values, pd.Series) else np.asarray(values)[indices]
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    """(x, y) thinned to at most `max_points` with LTTB; short series are returned as they are."""
+    if len(y) <= max_points:
+        return x, y
+    indices = lttb_indices(_numeric(x), _numeric(y), max_points)
+    return _take(x, indices), _take(y, indices)
@@ -0,0 +1,288 @@
+"""NYSE session calendar, precomputed once per bar series.
+
+The regular session runs 9:30-16:00 America/New_York, 13:00 on early-close
+days: 13:30-20:00 UTC under daylight saving time and 14:30-21:00 UTC in
+winter, so fixed UTC times such as '13:30'/'19:30' only hold for half the
+year.  SessionCalendar maps every bar to its session once and keeps, per
+session, the scheduled open and close (UTC nanoseconds) and the indices of
+its open bar (the first bar starting at or after the open) and close bar
+(the last bar starting before the close) as integer arrays.  Session
+opens, closes and boundary flags are then plain array lookups:
+
+    calendar = SessionCalendar.from_frame(bars)
+    opens = calendar.session_opens(bars['Open'].values)
+    session_open, session_close = calendar.open_flags(), calendar.close_flags()
+
+Bars on weekends and exchange holidays belong to no session (-1).
+"""
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+EXCHANGE_TZ = 'America/New_York'
+OPEN_TIME = datetime.time(9, 30)
+CLOSE_TIME = datetime.time(16, 0)
+EARLY_CLOSE_TIME = datetime.time(13, 0)
+
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+# Unscheduled full-day closures (national days of mourning, weather, 9/11)
+SPECIAL_CLOSURES = (
+    datetime.date(2001, 9, 11), datetime.date(2001, 9, 12), datetime.date(2001, 9, 13),
+    datetime.date(2001, 9, 14), datetime.date(2004, 6, 11), datetime.date(2007, 1, 2),
+    datetime.date(2012, 10, 29), datetime.date(2012, 10, 30), datetime.date(2018, 12, 5),
+    datetime.date(2025, 1, 9),
+)
+
+MON, TUE, WED, THU, FRI, SAT, SUN = range(7)
+
+
+def _nth_weekday(year, month, weekday, n):
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _last_weekday(year, month, weekday):
+    last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    # Anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    return datetime.date(year, month, (h + l - 7 * m + 33 * month + 19) % 32)
+
+
+def _observed(day):
+    """Saturday holidays are observed on Friday, Sunday holidays on Monday."""
+    if day.weekday() == SAT:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == SUN:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """Full-day NYSE closures of `year`, sorted."""
+    holidays = {
+        _nth_weekday(year, 1, MON, 3),                   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, MON, 3),                   # Washington's Birthday
+        _easter(year) - datetime.timedelta(days=2),      # Good Friday
+        _last_weekday(year, 5, MON),                     # Memorial Day
+        _observed(datetime.date(year, 7, 4)),            # Independence Day
+        _nth_weekday(year, 9, MON, 1),                   # Labor Day
+        _nth_weekday(year, 11, THU, 4),                  # Thanksgiving
+        _observed(datetime.date(year, 12, 25)),          # Christmas
+    }
+    # New Year's Day falling on a Saturday is not moved back into December
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != SAT:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(datetime.date(year, 6, 19)))  # Juneteenth
+    holidays.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return tuple(sorted(holidays))
+
+
+@lru_cache(maxsize=None)
+def nyse_early_closes(year):
+    """13:00 closes of `year`: July 3, the day after Thanksgiving and Christmas Eve, when trading days."""
+    holidays = set(nyse_holidays(year))
+    candidates = (
+        datetime.date(year, 7, 3),
+        _nth_weekday(year, 11, THU, 4) + datetime.timedelta(days=1),
+        datetime.date(year, 12, 24),
+    )
+    return tuple(day for day in candidates if day.weekday() < SAT and day not in holidays)
+
+
+def _day_set(days, rule):
+    years = np.unique(days.astype('datetime64[Y]').astype(np.int64) + 1970)
+    return np.array([d for year in years for d in rule(int(year))], dtype='datetime64[D]')
+
+
+def _offset_at(seconds):
+    return int(datetime.datetime.fromtimestamp(seconds, ZoneInfo(EXCHANGE_TZ)).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=None)
+def _offset_changes(year):
+    """(UTC seconds, UTC offset seconds) of the exchange zone from Jan 1 of `year`, one entry per change."""
+    start = int(datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+    days = range(start, start + 366 * 86_400, 86_400)
+    changes = [(start, _offset_at(start))]
+    for day in days[1:]:
+        if _offset_at(day) != changes[-1][1]:
+            # Bisect the changing day down to the second
+            lo, hi = day - 86_400, day
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                lo, hi = (mid, hi) if _offset_at(mid) == changes[-1][1] else (lo, mid)
+            changes.append((hi, _offset_at(hi)))
+    return tuple(changes)
+
+
+def utc_offsets(timestamps):
+    """UTC offsets (ns) of the exchange time zone at int64 UTC-nanosecond timestamps."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if not len(timestamps):
+        return np.zeros(0, dtype=np.int64)
+    years = timestamps[[timestamps.argmin(), timestamps.argmax()]].astype('datetime64[ns]').astype('datetime64[Y]')
+    first, last = (int(y) + 1970 for y in years.astype(np.int64))
+    changes = np.array([c for year in range(first, last + 1) for c in _offset_changes(year)], dtype=np.int64)
+    at = np.searchsorted(changes[:, 0] * 10**9, timestamps, 'right') - 1
+    return changes[np.maximum(at, 0), 1] * 10**9
+
+
+def local_days(timestamps):
+    """Exchange-local (New York) day ordinals, days since 1970-01-01, of int64 UTC-nanosecond timestamps."""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    return (timestamps + utc_offsets(timestamps)) // NS_PER_DAY
+
+
+def _wall_to_utc(wall_ns):
+    # Exchange wall times are never in a DST gap or overlap, so two passes settle the offset
+    wall_ns = np.asarray(wall_ns, dtype=np.int64)
+    return wall_ns - utc_offsets(wall_ns - utc_offsets(wall_ns))
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def session_schedule(days):
+    """Schedule of the exchange-local dates `days` (datetime64[D]).
+
+    Returns (trading, open_ns, close_ns, early_close): whether each day is
+    a trading day, its scheduled open and close in UTC nanoseconds, and
+    whether it closes early.  Times are filled in for non-trading days too.
+    """
+    days = np.asarray(days, dtype='datetime64[D]')
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    trading = (weekday < SAT) & ~np.isin(days, _day_set(days, nyse_holidays))
+    early_close = trading & np.isin(days, _day_set(days, nyse_early_closes))
+
+    midnight = days.astype(np.int64) * NS_PER_DAY
+    close_minute = np.where(early_close, _minutes(EARLY_CLOSE_TIME), _minutes(CLOSE_TIME))
+    open_ns = _wall_to_utc(midnight + _minutes(OPEN_TIME) * NS_PER_MINUTE)
+    close_ns = _wall_to_utc(midnight + close_minute * NS_PER_MINUTE)
+    return trading, open_ns, close_ns, early_close
+
+
+def local_midnights(days):
+    """UTC nanoseconds at which the exchange-local dates `days` (datetime64[D]) begin."""
+    return _wall_to_utc(np.asarray(days, dtype='datetime64[D]').astype(np.int64) * NS_PER_DAY)
+
+
+def interval_minutes(interval):
+    """Bar length in minutes for yfinance-style intervals ('1m', '5m', '30m', '1h')."""
+    if interval.endswith('m'):
+        return int(interval[:-1])
+    if interval.endswith('h'):
+        return int(interval[:-1]) * 60
+    raise ValueError(f"Unsupported interval {interval!r}")
+
+
+def trading_days(start, periods):
+    """The first `periods` NYSE trading days on or after `start`, as datetime64[D]."""
+    days = np.empty(0, dtype='datetime64[D]')
+    if isinstance(start, datetime.datetime):
+        start = start.date()
+    first = np.datetime64(start, 'D')
+    while len(days) < periods:
+        span = np.arange(first, first + 2 * (periods - len(days)) + 14)
+        days = np.concatenate([days, span[session_schedule(span)[0]]])
+        first = span[-1] + 1
+    return days[:periods]
+
+
+class SessionCalendar:
+    """Sessions of one sorted bar series.
+
+    session[i] is the session number of bar i (-1 off the calendar);
+    days, open_ns, close_ns, early_close, open_index and close_index have
+    one entry per session.  The open bar falls back to the session's first
+    bar and the close bar to its last bar when no bar lies within the
+    regular hours.
+    """
+
+    def __init__(self, timestamps):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.timestamps = timestamps
+        n = len(timestamps)
+        local_day = local_days(timestamps)
+
+        new_day = np.ones(n, dtype=bool)
+        new_day[1:] = local_day[1:] != local_day[:-1]
+        starts = np.flatnonzero(new_day)
+        ends = np.append(starts[1:], n)
+        days = local_day[starts].astype('datetime64[D]')
+        trading, open_ns, close_ns, early_close = session_schedule(days)
+
+        session_of_day = np.full(len(days), -1, dtype=np.int64)
+        session_of_day[trading] = np.arange(np.count_nonzero(trading))
+        self.session = session_of_day[np.cumsum(new_day) - 1] if n else np.empty(0, dtype=np.int64)
+        self.days = days[trading]
+        self.open_ns = open_ns[trading]
+        self.close_ns = close_ns[trading]
+        self.early_close = early_close[trading]
+
+        # Open/close bars: first and last bar of each session within the regular hours
+        self.open_index = starts[trading]
+        self.close_index = ends[trading] - 1
+        on_calendar = np.flatnonzero(self.session >= 0)
+        bar_session = self.session[on_calendar]
+        bar_time = timestamps[on_calendar]
+        regular = (bar_time >= self.open_ns[bar_session]) & (bar_time < self.close_ns[bar_session])
+        rows, sessions = on_calendar[regular], bar_session[regular]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = sessions[1:] != sessions[:-1]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = first[1:]
+        self.open_index[sessions[first]] = rows[first]
+        self.close_index[sessions[last]] = rows[last]
+
+    @classmethod
+    def from_frame(cls, data):
+        """Calendar of a bars frame with a DatetimeIndex or a 'Datetime' column (naive times are UTC)."""
+        import pandas as pd
+
+        times = data['Datetime'] if 'Datetime' in getattr(data, 'columns', ()) else data.index
+        return cls(pd.DatetimeIndex(times).as_unit('ns').asi8)
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def dates(self):
+        """Session dates as datetime.date objects, like the scripts' Date column."""
+        return self.days.astype(object)
+
+    def session_opens(self, opens):
+        return np.asarray(opens, dtype=float)[self.open_index]
+
+    def session_closes(self, closes):
+        return np.asarray(closes, dtype=float)[self.close_index]
+
+    def open_flags(self):
+        """Per-bar flags marking each session's open bar (the simulation's session_open)."""
+        flags = np.zeros(len(self.timestamps), dtype=bool)
+        flags[self.open_index] = True
+        return flags
+
+    def close_flags(self):
+        """Per-bar flags marking each session's close bar (the simulation's session_close)."""
+        flags = np.zeros(len(self.timestamps), dtype=bool)
+        flags[self.close_index] = True
+        return flags
@@ -0,0 +1,65 @@
+"""Named NumPy arrays packed into one shared-memory block.
+
+The parent packs the arrays once; worker processes attach by the block's
+name and get zero-copy views, so only the small layout spec is pickled
+per task.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+ALIGNMENT = 64
+
+
+class SharedArrays:
+    """Owner or attached view of a shared-memory block holding named arrays."""
+
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {
+            key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for key, (offset, dtype, shape) in layout.items()
+        }
+
+    @classmethod
+    def create(cls, arrays):
+        """Copy `arrays` ({name: ndarray}) into a new shared block."""
+        layout = {}
+        size = 0
+        for key, array in arrays.items():
+            array = np.asarray(array)
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            layout[key] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(shm, layout, owner=True)
+        for key, array in arrays.items():
+            shared.arrays[key][...] = array
+        return shared
+
+    @property
+    def spec(self):
+        """Picklable handle for attach()."""
+        return self.shm.name, self.layout
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
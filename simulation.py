@@ -0,0 +1,308 @@
+"""Array-backed simulation kernel shared by backtest.py and enhanced_backtest.py.
+
+The long/short/flat state machine runs over contiguous price and bounds
+arrays instead of DataFrame rows.  All simulator state lives in a small
+float vector (see the AUM/POSITION/... slots) and every closed trade is
+written as one row of a preallocated trades array, so the same loop
+compiles with numba when it is installed and otherwise runs as a plain
+Python loop over lists.  Performance metrics are accumulated in the same
+loop (see metrics.py).
+"""
+import numpy as np
+
+from metrics import finish_session, initial_metrics, record_bar, record_trade, summary
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Simulator state slots
+AUM, POSITION, ENTRY_PRICE, ENTRY_SHARES, SHARES, STOP_PRICE, ENTRY_INDEX = range(7)
+STATE_SIZE = 7
+
+# Strategy parameter slots
+COMMISSION, SLIPPAGE, STOP_LOSS_PCT, BOUNDS_BUFFER, MAX_POSITION_SIZE, SIZE_EVERY_BAR = range(6)
+PARAMS_SIZE = 6
+
+# Trade record fields
+(T_ENTRY_INDEX, T_EXIT_INDEX, T_SIDE, T_ENTRY_PRICE, T_EXIT_PRICE,
+ T_SHARES, T_PNL, T_STOP, T_REASON) = range(9)
+TRADE_FIELDS = 9
+
+# Exit reasons
+NO_EXIT, MARKET_CLOSE, LONG_TO_SHORT, SHORT_TO_LONG, STOP_LOSS = range(5)
+EXIT_REASONS = ('', 'Market Close', 'Long -> Short Signal', 'Short -> Long Signal', 'Stop Loss')
+
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close', 'UpperBound', 'LowerBound')
+
+# The risk settings of enhanced_backtest.py
+ENHANCED_PARAMS = dict(stop_loss_pct=0.015, bounds_buffer=0.0005, max_position_size=0.95, size_every_bar=True)
+
+
+def make_params(commission=0.0035, slippage=0.001, stop_loss_pct=0.0, bounds_buffer=0.0,
+                max_position_size=1.0, size_every_bar=False):
+    """Pack strategy parameters into the vector the kernel reads.
+
+    stop_loss_pct <= 0 disables the stop.  With size_every_bar the position
+    is resized from the bar Close on every flat bar (enhanced_backtest.py);
+    otherwise it is sized from the bar Open at the session open and after
+    each exit (backtest.py).
+    """
+    params = np.empty(PARAMS_SIZE)
+    params[COMMISSION] = commission
+    params[SLIPPAGE] = slippage
+    params[STOP_LOSS_PCT] = stop_loss_pct
+    params[BOUNDS_BUFFER] = bounds_buffer
+    params[MAX_POSITION_SIZE] = max_position_size
+    params[SIZE_EVERY_BAR] = 1.0 if size_every_bar else 0.0
+    return params
+
+
+def initial_state(aum):
+    state = np.zeros(STATE_SIZE)
+    state[AUM] = aum
+    state[ENTRY_PRICE] = np.nan
+    state[STOP_PRICE] = np.nan
+    state[ENTRY_INDEX] = -1
+    return state
+
+
+def _enter(state, params, i, side, price, shares):
+    state[POSITION] = side
+    state[ENTRY_PRICE] = price + params[SLIPPAGE] * side
+    state[ENTRY_SHARES] = shares
+    state[ENTRY_INDEX] = i
+    if params[STOP_LOSS_PCT] > 0:
+        state[STOP_PRICE] = state[ENTRY_PRICE] * (1 - params[STOP_LOSS_PCT] * side)
+    else:
+        state[STOP_PRICE] = np.nan
+
+
+def step(state, params, i, open_price, high_price, low_price, price, upper, lower,
+         session_open, session_close, closed):
+    """Advance the state machine by one bar.
+
+    Returns the exit reason of the trade closed on this bar (NO_EXIT if
+    none) and fills `closed` with its record.  A reversal exit re-enters
+    the opposite side on the same bar.
+    """
+    position = state[POSITION]
+    upper_buffered = upper * (1 + params[BOUNDS_BUFFER])
+    lower_buffered = lower * (1 - params[BOUNDS_BUFFER])
+    size_price = price if params[SIZE_EVERY_BAR] else open_price
+
+    # Position sizing
+    if position == 0 and (params[SIZE_EVERY_BAR] or session_open):
+        state[SHARES] = int((state[AUM] * params[MAX_POSITION_SIZE]) / size_price)
+
+    # Stop loss is checked against the bar range before anything else
+    reason = NO_EXIT
+    exit_price = price
+    stop = state[STOP_PRICE]
+    if position != 0 and stop == stop:
+        if position == 1 and low_price <= stop:
+            reason = STOP_LOSS
+            exit_price = stop
+        elif position == -1 and high_price >= stop:
+            reason = STOP_LOSS
+            exit_price = stop
+
+    # Entry: long above the upper bound, short below the lower bound
+    if position == 0:
+        if price > upper_buffered:
+            _enter(state, params, i, 1, price, state[SHARES])
+        elif price < lower_buffered:
+            _enter(state, params, i, -1, price, state[SHARES])
+        position = state[POSITION]
+
+    # Exit at the session close or when price crosses the opposite bound
+    if position != 0 and reason == NO_EXIT:
+        if session_close:
+            reason = MARKET_CLOSE
+        elif position == 1 and price < lower_buffered:
+            reason = LONG_TO_SHORT
+        elif position == -1 and price > upper_buffered:
+            reason = SHORT_TO_LONG
+        exit_price = price - params[SLIPPAGE] * position
+
+    if reason == NO_EXIT:
+        return reason
+
+    entry_price = state[ENTRY_PRICE]
+    shares = state[ENTRY_SHARES]
+    if position == 1:
+        pnl = (exit_price - entry_price) * shares - params[COMMISSION] * shares * 2
+    else:
+        pnl = (entry_price - exit_price) * shares - params[COMMISSION] * shares * 2
+    state[AUM] += pnl
+
+    closed[T_ENTRY_INDEX] = state[ENTRY_INDEX]
+    closed[T_EXIT_INDEX] = i
+    closed[T_SIDE] = position
+    closed[T_ENTRY_PRICE] = entry_price
+    closed[T_EXIT_PRICE] = exit_price
+    closed[T_SHARES] = shares
+    closed[T_PNL] = pnl
+    closed[T_STOP] = state[STOP_PRICE]
+    closed[T_REASON] = reason
+
+    if reason == LONG_TO_SHORT or reason == SHORT_TO_LONG:
+        # Immediate re-entry on the opposite side
+        _enter(state, params, i, -position, price, int((state[AUM] * params[MAX_POSITION_SIZE]) / size_price))
+    else:
+        state[POSITION] = 0
+        state[ENTRY_PRICE] = np.nan
+        state[STOP_PRICE] = np.nan
+        state[ENTRY_INDEX] = -1
+        state[SHARES] = int((state[AUM] * params[MAX_POSITION_SIZE]) / size_price) if size_price > 0 else 0
+    return reason
+
+
+def run_loop(state, params, open_, high, low, close, upper, lower, session_open, session_close,
+             start, end, equity, trades, n_trades, closed, session, metrics, drawdown, session_pnl):
+    """Run bars [start, end), writing equity[i] and appending closed trades to `trades`.
+
+    `session` holds each bar's session id; `metrics`, `drawdown` and
+    `session_pnl` are updated as described in metrics.py.  Returns the new
+    number of trades.
+    """
+    for i in range(start, end):
+        reason = step(state, params, i, open_[i], high[i], low[i], close[i], upper[i], lower[i],
+                      session_open[i], session_close[i], closed)
+        if reason != NO_EXIT:
+            trades[n_trades, :] = closed
+            n_trades += 1
+            record_trade(metrics, closed[T_PNL], reason == STOP_LOSS)
+        equity[i] = state[AUM]
+        record_bar(metrics, drawdown, session_pnl, i, session[i], state[AUM], state[POSITION])
+    return n_trades
+
+
+if njit is not None:
+    _enter = njit(cache=True)(_enter)
+    step = njit(cache=True)(step)
+    run_loop = njit(cache=True)(run_loop)
+
+
+def bar_arrays(bars):
+    """Contiguous float64 Open/High/Low/Close/UpperBound/LowerBound arrays from a frame or mapping."""
+    return tuple(np.ascontiguousarray(bars[column], dtype=np.float64) for column in PRICE_COLUMNS)
+
+
+class SimulationResult:
+    """Equity per bar, closed trades (n_trades x TRADE_FIELDS) and the final state.
+
+    `metrics` is the metrics.py accumulator vector, `drawdown` the drawdown
+    (%) per bar and `session_pnl` the PnL of each session id.
+    """
+
+    def __init__(self, equity, trades, state, metrics=None, drawdown=None, session_pnl=None):
+        self.equity = equity
+        self.trades = trades
+        self.state = state
+        self.metrics = metrics
+        self.drawdown = drawdown
+        self.session_pnl = session_pnl
+
+    @property
+    def aum(self):
+        return self.state[AUM]
+
+    def summary(self, initial_aum):
+        """All metrics from metrics.summary()."""
+        return summary(self.metrics, initial_aum)
+
+
+def session_ids(session_open):
+    """Session id per bar, counting up at every session-open bar (bars before the first open are session 0)."""
+    session_open = np.asarray(session_open, dtype=bool)
+    if len(session_open) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.cumsum(session_open) - int(session_open[0])
+
+
+def simulate(bars, params, session_open, session_close, initial_aum=100_000, state=None,
+             sessions=None, metrics=None):
+    """Run the strategy over `bars` (a DataFrame or mapping with PRICE_COLUMNS).
+
+    `session_open`/`session_close` flag the first/last bar of each session
+    and `sessions` optionally gives each bar's session id (0, 1, ...) for
+    the per-session metrics; by default sessions start at the open flags.
+    Pass a previous result's `state` and `metrics` to continue a simulation.
+    """
+    arrays = bar_arrays(bars)
+    n = len(arrays[0])
+    session_open = np.ascontiguousarray(session_open, dtype=np.bool_)
+    session_close = np.ascontiguousarray(session_close, dtype=np.bool_)
+    sessions = session_ids(session_open) if sessions is None else np.ascontiguousarray(sessions, dtype=np.int64)
+    state = initial_state(initial_aum) if state is None else np.array(state, dtype=np.float64)
+    metrics = initial_metrics(state[AUM]) if metrics is None else np.array(metrics, dtype=np.float64)
+    params = np.asarray(params, dtype=np.float64)
+
+    # A bar closes at most one trade, so n rows always suffice
+    equity = np.empty(n)
+    trades = np.empty((n, TRADE_FIELDS))
+    drawdown = np.empty(n)
+    session_pnl = np.zeros(int(sessions.max()) + 1 if n else 0)
+    if njit is not None:
+        n_trades = run_loop(state, params, *arrays, session_open, session_close,
+                            0, n, equity, trades, 0, np.empty(TRADE_FIELDS),
+                            sessions, metrics, drawdown, session_pnl)
+    else:
+        py_state = state.tolist()
+        py_metrics = metrics.tolist()
+        n_trades = run_loop(py_state, params.tolist(), *(a.tolist() for a in arrays),
+                            session_open.tolist(), session_close.tolist(),
+                            0, n, equity, trades, 0, [0.0] * TRADE_FIELDS,
+                            sessions.tolist(), py_metrics, drawdown, session_pnl)
+        state[:] = py_state
+        metrics[:] = py_metrics
+    finish_session(metrics, session_pnl)
+    return SimulationResult(equity, trades[:n_trades].copy(), state, metrics, drawdown, session_pnl)
+
+
+def trades_frame(trades, times, with_stop=False):
+    """Trade log DataFrame in the backtests' column layout (see trade_log.TradeBuffer)."""
+    from trade_log import TradeBuffer
+
+    return TradeBuffer.from_trades(trades, times).to_frame(with_stop=with_stop)
+
+
+def print_trade_events(result, bars, times, initial_aum, with_stop=False):
+    """Print entry/exit lines for every trade, in the order they happened."""
+    import pandas as pd
+
+    trades = result.trades
+    close = np.asarray(bars['Close'])
+    upper = np.asarray(bars['UpperBound'])
+    lower = np.asarray(bars['LowerBound'])
+    times = pd.Series(times).reset_index(drop=True)
+
+    def entry_line(i, side, entry_price, stop, immediate):
+        stop_text = f", Stop={stop:.2f}" if with_stop else ""
+        name = 'LONG' if side == 1 else 'SHORT'
+        if immediate:
+            return f"IMMEDIATE {name} entry at {times[i]}: Price={close[i]:.2f}{stop_text}"
+        bound = f"Upper={upper[i]:.2f}" if side == 1 else f"Lower={lower[i]:.2f}"
+        return f"{name} entry at {times[i]}: Price={close[i]:.2f}, {bound}, Entry={entry_price:.2f}{stop_text}"
+
+    aum = initial_aum
+    immediate = False
+    for trade in trades:
+        print(entry_line(int(trade[T_ENTRY_INDEX]), trade[T_SIDE], trade[T_ENTRY_PRICE], trade[T_STOP], immediate))
+        aum += trade[T_PNL]
+        reason = int(trade[T_REASON])
+        print(f"EXIT {EXIT_REASONS[reason]}: PnL=${trade[T_PNL]:.2f}, New AUM=${aum:.2f}")
+        immediate = reason == LONG_TO_SHORT or reason == SHORT_TO_LONG
+
+    state = result.state
+    if state[POSITION] != 0:
+        print(entry_line(int(state[ENTRY_INDEX]), state[POSITION], state[ENTRY_PRICE], state[STOP_PRICE], immediate))
+
+
+def performance_summary(result, initial_aum):
+    """Total return, win rate, max drawdown (%) and profit factor as reported by enhanced_backtest.py."""
+    metrics = result.summary(initial_aum)
+    return {key: metrics[key] for key in
+            ('TotalReturn', 'WinRate', 'MaxDrawdown', 'ProfitFactor', 'NumTrades', 'FinalAUM')}
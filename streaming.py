@@ -0,0 +1,325 @@
+"""Asyncio signal engine over a live or replayed bar stream.
+
+A feed is any async iterable of Bar tuples.  StreamingEngine routes each
+bar to its symbol's worker task, which keeps the bounds current with a
+BoundsState, runs the same per-bar rules as the backtests
+(simulation.step) and hands OrderIntents to a sink.  ReplayFeed plays
+stored bars back in timestamp order across symbols, as fast as possible
+or at a multiple of real time, and stands in for a broker feed.
+
+    python streaming.py --csv sp500_30min_14d.csv
+    python streaming.py AAPL MSFT NVDA --interval 30m --speed 600
+"""
+import argparse
+import asyncio
+import inspect
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from bar_store import DEFAULT_STORE_DIR, BarStore
+from bounds_state import BoundsState
+from market_data import read_yahoo_csv
+from noise_bounds import LOOKBACK, MIN_SLOT_SESSIONS
+from session_calendar import NS_PER_DAY, NS_PER_MINUTE, interval_minutes, local_midnights, session_schedule, utc_offsets
+from simulation import (AUM, ENTRY_PRICE, ENTRY_SHARES, EXIT_REASONS, NO_EXIT, POSITION, STOP_PRICE,
+                        T_ENTRY_INDEX, T_ENTRY_PRICE, T_EXIT_PRICE, T_SHARES, T_SIDE, T_STOP, TRADE_FIELDS,
+                        initial_state, make_params, step)
+from universe_runner import ENHANCED_PARAMS
+
+Bar = namedtuple('Bar', 'symbol timestamp open high low close')  # timestamp in UTC nanoseconds
+OrderIntent = namedtuple('OrderIntent', 'symbol timestamp action shares price reason stop')
+
+
+class ReplayFeed:
+    """Replay {symbol: bars frame} (UTC index, Open/High/Low/Close) as one time-ordered stream.
+
+    speed=None replays as fast as the consumer takes bars; speed=60 plays
+    an hour of market time per minute.
+    """
+
+    def __init__(self, bars_by_symbol, speed=None):
+        self.speed = speed
+        symbols, timestamps, prices = [], [], []
+        for k, (symbol, bars) in enumerate(bars_by_symbol.items()):
+            symbols.append(symbol)
+            timestamps.append(bars.index.as_unit('ns').asi8)
+            prices.append(np.column_stack([np.full(len(bars), k)] +
+                                          [bars[c].values for c in ('Open', 'High', 'Low', 'Close')]))
+        self.symbols = symbols
+        self.timestamps = np.concatenate(timestamps) if timestamps else np.empty(0, np.int64)
+        self.prices = np.concatenate(prices) if prices else np.empty((0, 5))
+        order = np.argsort(self.timestamps, kind='stable')
+        self.timestamps = self.timestamps[order]
+        self.prices = self.prices[order]
+
+    @classmethod
+    def from_csv(cls, path, symbol, speed=None):
+        return cls({symbol: read_yahoo_csv(path)}, speed)
+
+    @classmethod
+    def from_store(cls, symbols, interval, root=DEFAULT_STORE_DIR, start=None, end=None, speed=None):
+        store = BarStore(root)
+        return cls({s: store.open(s, interval, start, end).to_frame() for s in symbols}, speed)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first = self.timestamps[0] if len(self.timestamps) else 0
+        for timestamp, (k, o, h, l, c) in zip(self.timestamps.tolist(), self.prices.tolist()):
+            if self.speed:
+                delay = started + (timestamp - first) / 1e9 / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield Bar(self.symbols[int(k)], timestamp, o, h, l, c)
+
+
+class ListSink:
+    """Collects every intent in .intents."""
+
+    def __init__(self):
+        self.intents = []
+
+    def __call__(self, intent):
+        self.intents.append(intent)
+
+
+def print_sink(intent):
+    when = pd.Timestamp(intent.timestamp, tz='UTC')
+    print(f"{when} {intent.symbol} {intent.action} {intent.shares:.0f} @ ${intent.price:.2f} ({intent.reason})")
+
+
+class SymbolEngine:
+    """Bounds and strategy state of one symbol, advanced one bar at a time.
+
+    Sessions follow the NYSE calendar of session_calendar.py, as in the
+    batch backtests: a bar belongs to the session of its New York date,
+    the session opens at its first bar within the regular hours (Open of
+    that bar) and closes at the last such bar, the one ending at or after
+    the scheduled close (`interval` is the bar length).  Bars off the
+    calendar are ignored, and bars before the session's open bar are not
+    traded.  Bars without bounds (too little history) are not traded
+    either, like the inner merge of bounds and prices in the backtests.
+    When a session's last bar is missing no bar is flagged as its close,
+    since live the bar before it cannot be known to be the last.
+    With intraday=True the bounds are per time slot as in Intraday_bounds.py.
+    """
+
+    def __init__(self, symbol, params, initial_aum=100_000, intraday=False, bounds=None,
+                 lookback=LOOKBACK, min_periods=MIN_SLOT_SESSIONS, interval='30m'):
+        self.symbol = symbol
+        self.params = params
+        self.intraday = intraday
+        self.bounds = bounds if bounds is not None else BoundsState(lookback, min_periods)
+        self.interval_ns = interval_minutes(interval) * NS_PER_MINUTE
+        self.state = initial_state(initial_aum)
+        self.closed = np.zeros(TRADE_FIELDS)
+        self.trades = []
+        self.bars = 0
+        self.latency_ns = []
+
+        # The exchange-local day of the last bar: [day_start, day_end) in UTC ns and its schedule
+        self.day_start = self.day_end = 0
+        self.trading = False
+        self.open_ns = self.close_ns = 0
+        # The current session: (open, minute, close) of its bars before the open bar, and its close so far
+        self.pending = []
+        self.opened = False
+        self.close_price = np.nan
+        self.regular_close = False
+
+    def _new_day(self, timestamp):
+        day = (timestamp + int(utc_offsets([timestamp])[0])) // NS_PER_DAY
+        days = np.array([day, day + 1], dtype='datetime64[D]')
+        self.day_start, self.day_end = local_midnights(days).tolist()
+        trading, open_ns, close_ns, _ = session_schedule(days[:1])
+        self.trading = bool(trading[0])
+        self.open_ns, self.close_ns = int(open_ns[0]), int(close_ns[0])
+
+    def _close_session(self):
+        if self.pending and not self.opened:
+            # No bar within the regular hours: the session's first bar stands in for the open
+            self._open_session(self.pending[0][0])
+        if self.opened:
+            self.bounds.close_session(self.close_price)
+        self.pending = []
+        self.opened = False
+        self.close_price = np.nan
+        self.regular_close = False
+
+    def _open_session(self, open_price):
+        self.bounds.open_session(open_price)
+        self.opened = True
+        # Bars before the open count towards the time-of-day moves once the open is known
+        for _, minute, close in self.pending:
+            self.bounds.on_bar(minute, close)
+
+    def on_bar(self, bar):
+        """Update the bounds, apply the strategy rules and return the bar's OrderIntents."""
+        started = time.perf_counter_ns()
+        timestamp = bar.timestamp
+        if not self.day_start <= timestamp < self.day_end:
+            self._close_session()
+            self._new_day(timestamp)
+        intents = []
+        if self.trading:
+            minute = (timestamp % NS_PER_DAY) // NS_PER_MINUTE
+            regular = self.open_ns <= timestamp < self.close_ns
+            session_open = regular and not self.opened
+            session_close = regular and timestamp + self.interval_ns >= self.close_ns
+            if session_open:
+                self._open_session(bar.open)
+            if regular or not self.regular_close:
+                self.close_price = bar.close
+                self.regular_close = regular
+
+            if self.opened:
+                if self.intraday:
+                    sigma, upper, lower = self.bounds.slot_bounds(minute)
+                else:
+                    sigma, upper, lower = self.bounds.daily_bounds()
+                self.bounds.on_bar(minute, bar.close)
+                if sigma == sigma:
+                    intents = self._step(bar, upper, lower, session_open, session_close)
+            else:
+                self.pending.append((bar.open, minute, bar.close))
+        self.bars += 1
+        self.latency_ns.append(time.perf_counter_ns() - started)
+        return intents
+
+    def _step(self, bar, upper, lower, session_open, session_close):
+        state = self.state
+        position = state[POSITION]
+        reason = step(state, self.params, self.bars, bar.open, bar.high, bar.low, bar.close, upper, lower,
+                      session_open, session_close, self.closed)
+
+        intents = []
+        if reason != NO_EXIT:
+            closed = self.closed
+            self.trades.append(closed.copy())
+            side = closed[T_SIDE]
+            if closed[T_ENTRY_INDEX] == self.bars:
+                # Entered and closed on this bar
+                intents.append(self._entry(bar, side, closed[T_SHARES], closed[T_ENTRY_PRICE], closed[T_STOP]))
+            intents.append(OrderIntent(self.symbol, bar.timestamp, 'SELL' if side == 1 else 'BUY',
+                                       float(closed[T_SHARES]), float(closed[T_EXIT_PRICE]),
+                                       EXIT_REASONS[int(reason)], np.nan))
+        if state[POSITION] != 0 and state[POSITION] != position:
+            intents.append(self._entry(bar, state[POSITION], state[ENTRY_SHARES], state[ENTRY_PRICE],
+                                       state[STOP_PRICE]))
+        return intents
+
+    def _entry(self, bar, side, shares, price, stop):
+        shares, price, stop = float(shares), float(price), float(stop)
+        if side == 1:
+            return OrderIntent(self.symbol, bar.timestamp, 'BUY', shares, price, 'Long Entry', stop)
+        return OrderIntent(self.symbol, bar.timestamp, 'SELL', shares, price, 'Short Entry', stop)
+
+    def finish(self):
+        """Close the bounds of the last session seen, e.g. before saving self.bounds."""
+        self._close_session()
+        self.day_start = self.day_end = 0
+
+    @property
+    def aum(self):
+        return self.state[AUM]
+
+
+class StreamingEngine:
+    """Runs one SymbolEngine task per symbol over a shared feed and sends intents to `sink`.
+
+    `sink` is called with each OrderIntent and may be a coroutine
+    function.  `bounds` optionally maps symbols to warmed-up BoundsState
+    objects (see BoundsState.replay / BoundsState.load).  `interval` is
+    the bar length, which locates each session's close bar.
+    """
+
+    def __init__(self, sink, params=None, initial_aum=100_000, intraday=False, bounds=None,
+                 lookback=LOOKBACK, min_periods=MIN_SLOT_SESSIONS, queue_size=1024, interval='30m'):
+        self.sink = sink
+        self.params = make_params(**ENHANCED_PARAMS) if params is None else params
+        self.initial_aum = initial_aum
+        self.intraday = intraday
+        self.warm_bounds = bounds or {}
+        self.lookback = lookback
+        self.min_periods = min_periods
+        self.queue_size = queue_size
+        self.interval = interval
+        self.engines = {}
+
+    def engine(self, symbol):
+        if symbol not in self.engines:
+            self.engines[symbol] = SymbolEngine(symbol, self.params, self.initial_aum, self.intraday,
+                                                self.warm_bounds.get(symbol), self.lookback, self.min_periods,
+                                                self.interval)
+        return self.engines[symbol]
+
+    async def _worker(self, engine, queue):
+        while True:
+            bar = await queue.get()
+            if bar is None:
+                break
+            for intent in engine.on_bar(bar):
+                emitted = self.sink(intent)
+                if inspect.isawaitable(emitted):
+                    await emitted
+
+    async def run(self, feed):
+        """Consume `feed` until it ends; returns {symbol: SymbolEngine}."""
+        queues, workers = {}, []
+        async for bar in feed:
+            queue = queues.get(bar.symbol)
+            if queue is None:
+                queue = queues[bar.symbol] = asyncio.Queue(self.queue_size)
+                workers.append(asyncio.create_task(self._worker(self.engine(bar.symbol), queue)))
+            await queue.put(bar)
+        for queue in queues.values():
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        for engine in self.engines.values():
+            engine.finish()
+        return self.engines
+
+    def latency_report(self):
+        """Per-symbol decision latency percentiles in microseconds."""
+        rows = []
+        for symbol, engine in self.engines.items():
+            latency = np.asarray(engine.latency_ns, dtype=float) / 1e3
+            if len(latency) == 0:
+                continue
+            p50, p90, p99 = np.percentile(latency, [50, 90, 99])
+            rows.append(dict(Symbol=symbol, Bars=len(latency), P50us=p50, P90us=p90, P99us=p99,
+                             MaxUs=latency.max(), FinalAUM=engine.aum))
+        return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream bars through the noise-bounds strategy')
+    parser.add_argument('symbols', nargs='*', default=['^GSPC'])
+    parser.add_argument('--csv', help='replay a Yahoo-format CSV (one symbol) instead of the bar store')
+    parser.add_argument('--interval', default='30m')
+    parser.add_argument('--root', default=DEFAULT_STORE_DIR)
+    parser.add_argument('--speed', type=float, default=None, help='replay speed, x real time (default: as fast as possible)')
+    parser.add_argument('--strategy', choices=['original', 'enhanced'], default='enhanced')
+    parser.add_argument('--intraday', action='store_true', help='use time-of-day bounds')
+    parser.add_argument('--quiet', action='store_true', help='do not print order intents')
+    args = parser.parse_args()
+
+    if args.csv:
+        feed = ReplayFeed.from_csv(args.csv, args.symbols[0], args.speed)
+    else:
+        feed = ReplayFeed.from_store(args.symbols, args.interval, args.root, speed=args.speed)
+    params = make_params(**ENHANCED_PARAMS) if args.strategy == 'enhanced' else make_params()
+    sink = ListSink() if args.quiet else print_sink
+    engine = StreamingEngine(sink, params, intraday=args.intraday, interval=args.interval)
+    asyncio.run(engine.run(feed))
+    print(engine.latency_report().to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
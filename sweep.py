@@ -0,0 +1,88 @@
+"""Batched parameter sweeps over the enhanced strategy.
+
+Instead of running the simulation kernel once per parameter combination,
+every combination is a lane of a state vector and the bars are walked
+once, advancing all lanes together with NumPy (lanes.Lanes).  The rules
+are the ones in simulation.step(), so each lane reproduces simulate()
+with the same parameters.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from lanes import Lanes
+from simulation import bar_arrays
+
+SWEEP_COLUMNS = ['StopLossPct', 'BoundsBuffer', 'MaxPositionSize', 'TotalReturn', 'WinRate',
+                 'MaxDrawdown', 'ProfitFactor', 'NumTrades', 'FinalAUM']
+
+
+def sweep(bars, session_open, session_close, stop_loss_pcts, bounds_buffers, max_position_sizes,
+          initial_aum=100_000, commission=0.0035, slippage=0.001, size_every_bar=True):
+    """Evaluate the full grid of stop loss x bounds buffer x max position size.
+
+    Returns one row per combination with TotalReturn (%), WinRate (%),
+    MaxDrawdown (%), ProfitFactor, NumTrades and FinalAUM.
+    """
+    grid = np.array(list(itertools.product(stop_loss_pcts, bounds_buffers, max_position_sizes)), dtype=float)
+    return sweep_lanes(bars, session_open, session_close, grid[:, 0], grid[:, 1], grid[:, 2],
+                       initial_aum, commission, slippage, size_every_bar)
+
+
+def sweep_lanes(bars, session_open, session_close, stop_loss_pct, bounds_buffer, max_position_size,
+                initial_aum=100_000, commission=0.0035, slippage=0.001, size_every_bar=True, bounds_lane=None):
+    """Evaluate aligned parameter arrays, one lane per element.
+
+    With `bounds_lane`, UpperBound and LowerBound are (bars x k) matrices,
+    e.g. the bounds of k lookbacks, and lane j trades column bounds_lane[j].
+    """
+    stop_loss_pct = np.asarray(stop_loss_pct, dtype=float)
+    bounds_buffer = np.asarray(bounds_buffer, dtype=float)
+    max_position_size = np.asarray(max_position_size, dtype=float)
+    lanes = len(stop_loss_pct)
+    open_, high, low, close, upper, lower = bar_arrays(bars)
+    open_, high, low, close = open_.tolist(), high.tolist(), low.tolist(), close.tolist()
+    if bounds_lane is None:
+        upper, lower = upper.tolist(), lower.tolist()
+    else:
+        # Row i of the per-lane bounds: one gather per bar, no (bars x lanes) copy
+        bounds_lane = np.asarray(bounds_lane, dtype=np.int64)
+        upper, lower = _LaneRows(upper, bounds_lane), _LaneRows(lower, bounds_lane)
+    session_open = np.asarray(session_open, dtype=bool).tolist()
+    session_close = np.asarray(session_close, dtype=bool).tolist()
+
+    state = Lanes(lanes, stop_loss_pct, bounds_buffer, max_position_size, initial_aum,
+                  commission, slippage, size_every_bar)
+    aum = state.aum
+    peak = np.full(lanes, -np.inf)
+    max_drawdown = np.zeros(lanes)
+
+    for i in range(len(close)):
+        state.step(i, open_[i], high[i], low[i], close[i], upper[i], lower[i], session_open[i], session_close[i])
+        np.maximum(peak, aum, out=peak)
+        np.minimum(max_drawdown, (aum - peak) / peak * 100, out=max_drawdown)
+
+    win_rate, profit_factor = state.trade_stats()
+    return pd.DataFrame({
+        'StopLossPct': stop_loss_pct,
+        'BoundsBuffer': bounds_buffer,
+        'MaxPositionSize': max_position_size,
+        'TotalReturn': (aum - initial_aum) / initial_aum * 100,
+        'WinRate': win_rate,
+        'MaxDrawdown': max_drawdown,
+        'ProfitFactor': profit_factor,
+        'NumTrades': state.num_trades,
+        'FinalAUM': aum,
+    }, columns=SWEEP_COLUMNS)
+
+
+class _LaneRows:
+    """matrix[i, columns] on indexing by bar i."""
+
+    def __init__(self, matrix, columns):
+        self.matrix = matrix
+        self.columns = columns
+
+    def __getitem__(self, i):
+        return self.matrix[i, self.columns]
@@ -0,0 +1,68 @@
+"""Deterministic synthetic intraday bars for benchmarks and experiments.
+
+Sessions are NYSE trading days from 9:30 to 16:00 New York time (see
+session_calendar.py, so the UTC hours shift with daylight saving time),
+cut into bars of `interval`; early closes and random half-days end at 13:00.
+Prices follow a random walk with overnight gaps, and randomly dropped
+bars stand in for missing data.  The same arguments always give the same
+bars.
+"""
+import numpy as np
+import pandas as pd
+
+from session_calendar import NS_PER_MINUTE, interval_minutes, session_schedule, trading_days
+
+SESSION_MINUTES = 390
+HALF_DAY_MINUTES = 210
+SESSIONS_PER_YEAR = 252
+
+
+def synthetic_bars(years=1, interval='30m', symbols=1, seed=0, gap_rate=0.0, half_day_rate=0.0,
+                   start='2015-01-02', start_price=100.0, daily_vol=0.01):
+    """Return {symbol: bars} in the market_data layout (UTC 'Datetime' index, OHLCV columns).
+
+    `gap_rate` is the probability that any bar is missing and
+    `half_day_rate` the probability that a session is a half-day on top of
+    the calendar's early closes (the same sessions for every symbol).
+    """
+    minutes = interval_minutes(interval)
+    seeds = np.random.SeedSequence(seed).spawn(symbols + 1)
+
+    days = trading_days(start, int(round(years * SESSIONS_PER_YEAR)))
+    _, open_ns, _, early_close = session_schedule(days)
+    half_day = early_close | (np.random.default_rng(seeds[0]).random(len(days)) < half_day_rate)
+    offsets = np.arange(0, SESSION_MINUTES, minutes)
+    in_session = np.where(half_day[:, None], offsets < HALF_DAY_MINUTES, True)
+    day_idx, slot_idx = np.nonzero(in_session)
+    index = pd.to_datetime(open_ns[day_idx] + offsets[slot_idx] * NS_PER_MINUTE, unit='ns', utc=True)
+    first_bar = np.r_[True, day_idx[1:] != day_idx[:-1]]
+
+    n = len(index)
+    bar_vol = daily_vol / np.sqrt(len(offsets))
+    result = {}
+    for k in range(symbols):
+        rng = np.random.default_rng(seeds[k + 1])
+        intrabar = rng.normal(0.0, bar_vol, n)
+        overnight = np.where(first_bar, rng.normal(0.0, daily_vol * 0.3, n), 0.0)
+        log_close = np.log(start_price) + np.cumsum(overnight + intrabar)
+        close = np.exp(log_close)
+        open_ = np.exp(log_close - intrabar)
+        high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0.0, bar_vol / 2, n)))
+        low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0.0, bar_vol / 2, n)))
+        volume = rng.integers(10_000, 1_000_000, n).astype(float)
+
+        keep = rng.random(n) >= gap_rate
+        bars = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                            index=pd.DatetimeIndex(index, name='Datetime'))
+        result[f'SYN{k:03d}'] = bars[keep]
+    return result
+
+
+def write_yahoo_csv(bars, path, symbol):
+    """Write bars in the yf.download CSV layout of sp500_30min_14d.csv."""
+    columns = ['Close', 'High', 'Low', 'Open', 'Volume']
+    with open(path, 'w') as f:
+        f.write('Price,' + ','.join(columns) + '\n')
+        f.write('Ticker,' + ','.join([symbol] * len(columns)) + '\n')
+        f.write('Datetime' + ',' * len(columns) + '\n')
+        bars[columns].to_csv(f, header=False)
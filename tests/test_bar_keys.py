@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from bar_keys import bar_keys, join_bounds
+from bar_store import BarStore
+
+
+def evening_bars():
+    index = pd.DatetimeIndex(['2024-07-01 19:30', '2024-07-02 00:30', '2024-07-02 13:30'], tz='UTC',
+                             name='Datetime')
+    return pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': 1.0, 'Volume': 0.0}, index=index)
+
+
+def test_evening_bar_keeps_its_session_bounds():
+    bars = evening_bars()
+    day, minute = bar_keys(bars.index.as_unit('ns').asi8)
+    assert list(day.astype('M8[D]').astype(str)) == ['2024-07-01', '2024-07-01', '2024-07-02']
+    assert list(minute) == [1170, 30, 810]
+
+    bounds = pd.DataFrame({'Date': ['2024-07-01', '2024-07-02'], 'Bound': [1.0, 2.0]})
+    joined = join_bounds(bars.reset_index(), bounds)
+    np.testing.assert_array_equal(joined['Bound'], [1.0, 1.0, 2.0])
+
+
+def test_store_sessions_split_at_new_york_midnight(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write('SPY', '30m', evening_bars())
+    data = store.open('SPY', '30m')
+    assert list(data.dates.astype(str)) == ['2024-07-01', '2024-07-02']
+    assert list(data.sessions['end']) == [2, 3]
+    assert len(store.open('SPY', '30m', start='2024-07-02')) == 1
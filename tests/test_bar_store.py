@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from bar_store import CURRENT, BarStore
+
+
+def bars(start, periods):
+    index = pd.date_range(start, periods=periods, freq='30min', tz='UTC', name='Datetime')
+    values = np.arange(periods, dtype=float)
+    return pd.DataFrame({'Open': values, 'High': values, 'Low': values, 'Close': values, 'Volume': values},
+                        index=index)
+
+
+def test_write_switches_versions_under_open_readers(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write('SPY', '30m', bars('2024-07-01 13:30', 13))
+    first = store.open('SPY', '30m')
+    store.write('SPY', '30m', bars('2024-07-02 13:30', 13))
+    store.write('SPY', '30m', bars('2024-07-03 13:30', 13))
+
+    # The first version is pruned, but its memory maps stay readable
+    assert len(first) == 13 and first['Close'][-1] == 12.0
+    data = store.open('SPY', '30m')
+    assert list(data.dates.astype(str)) == ['2024-07-01', '2024-07-02', '2024-07-03']
+
+    path = store.path('SPY', '30m')
+    versions = sorted(e.name for e in os.scandir(path) if e.is_dir())
+    assert len(versions) == 2
+    with open(os.path.join(path, CURRENT)) as f:
+        assert f.read() == versions[-1]
+
+
+def test_reads_and_migrates_unversioned_datasets(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write('SPY', '30m', bars('2024-07-01 13:30', 13))
+    path = store.path('SPY', '30m')
+    version = store.current('SPY', '30m')
+    for name in os.listdir(version):
+        os.replace(os.path.join(version, name), os.path.join(path, name))
+    os.rmdir(version)
+    os.remove(os.path.join(path, CURRENT))
+
+    assert store.current('SPY', '30m') == path and len(store.open('SPY', '30m')) == 13
+    store.write('SPY', '30m', bars('2024-07-02 13:30', 13))
+    assert len(store.open('SPY', '30m')) == 26
+    assert not [name for name in os.listdir(path) if name.endswith('.npy')]
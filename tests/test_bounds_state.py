@@ -0,0 +1,49 @@
+"""BoundsState against the batch bounds, and its saved state."""
+import io
+
+import numpy as np
+
+from bar_keys import time_keys
+from bounds_state import BoundsState
+from noise_bounds import daily_noise_bounds, intraday_noise_bounds
+from session_calendar import SessionCalendar
+from synthetic_data import synthetic_bars
+
+
+def winter_bars():
+    # Across the November and March DST changes, with missing bars and half-days
+    return synthetic_bars(years=0.8, start='2015-09-01', seed=3, gap_rate=0.1, half_day_rate=0.05)['SYN000']
+
+
+def test_replay_matches_batch_bounds():
+    bars = winter_bars()
+    timestamps = bars.index.as_unit('ns').asi8
+    calendar = SessionCalendar(timestamps)
+    daily = daily_noise_bounds(bars, calendar=calendar)
+    intraday = intraday_noise_bounds(bars, calendar=calendar)
+
+    # History up to the last session, then that session's open
+    history = calendar.session < len(calendar) - 1
+    state = BoundsState().replay(timestamps[history], bars['Open'].values[history], bars['Close'].values[history])
+    state.open_session(calendar.session_opens(bars['Open'].values)[-1])
+
+    np.testing.assert_allclose(state.daily_bounds(), daily.iloc[-1][['Sigma', 'UpperBound', 'LowerBound']].values.astype(float),
+                               rtol=1e-12)
+    last = intraday[intraday['Date'] == calendar.dates[-1]]
+    assert len(last) == len(state.slot_table())
+    for minute, row in zip(time_keys(last['Time']), last.itertuples()):
+        np.testing.assert_allclose(state.slot_bounds(int(minute)), (row.Sigma, row.UpperBound, row.LowerBound),
+                                   rtol=1e-12)
+
+
+def test_saved_state_round_trips_without_pickle():
+    bars = winter_bars()
+    state = BoundsState().replay(bars.index.as_unit('ns').asi8, bars['Open'].values, bars['Close'].values)
+    data = state.to_bytes()
+    assert all(array.dtype != object for array in np.load(io.BytesIO(data), allow_pickle=False).values())
+
+    restored = BoundsState.from_bytes(data)
+    assert restored.slots == state.slots
+    assert restored.daily_bounds()[0] == state.daily_bounds()[0]
+    for slot in state.slots:
+        assert restored.slot_bounds(slot)[0] == state.slot_bounds(slot)[0] or np.isnan(state.slot_bounds(slot)[0])
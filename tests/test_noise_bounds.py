@@ -0,0 +1,108 @@
+"""noise_bounds.daily_noise_bounds() against the nested loops 2_week_bounds.py used to run."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from noise_bounds import daily_noise_bounds
+
+OPEN_TIME_UTC = pd.to_datetime("13:30").time()
+CLOSE_TIME_UTC = pd.to_datetime("19:30").time()
+
+
+def original_bounds(data):
+    """The per-date loops of 2_week_bounds.py, returning its bounds table."""
+    all_bounds = []
+    dates = sorted(data['Date'].unique())
+    for i in range(1, len(dates)):
+        today = dates[i]
+        yesterday = dates[i-1]
+        today_group = data[data['Date'] == today]
+        yesterday_group = data[data['Date'] == yesterday]
+
+        if OPEN_TIME_UTC in list(today_group['Time']):
+            today_open_row = today_group[today_group['Time'] == OPEN_TIME_UTC]
+        else:
+            first_time = today_group['Time'].min()
+            today_open_row = today_group[today_group['Time'] == first_time]
+
+        if CLOSE_TIME_UTC in list(yesterday_group['Time']):
+            yesterday_close_row = yesterday_group[yesterday_group['Time'] == CLOSE_TIME_UTC]
+        else:
+            last_time = yesterday_group['Time'].max()
+            yesterday_close_row = yesterday_group[yesterday_group['Time'] == last_time]
+
+        if today_open_row.shape[0] > 0 and yesterday_close_row.shape[0] > 0:
+            today_open = float(today_open_row['Open'].iloc[0])
+            yesterday_close = float(yesterday_close_row['Close'].iloc[0])
+        else:
+            continue
+
+        N = min(13, i)
+        returns = []
+        for j in range(i-N, i):
+            prev_day = dates[j]
+            prev_group = data[data['Date'] == prev_day]
+            if OPEN_TIME_UTC in list(prev_group['Time']):
+                prev_open_row = prev_group[prev_group['Time'] == OPEN_TIME_UTC]
+            else:
+                first_time = prev_group['Time'].min()
+                prev_open_row = prev_group[prev_group['Time'] == first_time]
+            if CLOSE_TIME_UTC in list(prev_group['Time']):
+                prev_close_row = prev_group[prev_group['Time'] == CLOSE_TIME_UTC]
+            else:
+                last_time = prev_group['Time'].max()
+                prev_close_row = prev_group[prev_group['Time'] == last_time]
+            if prev_open_row.shape[0] == 0 or prev_close_row.shape[0] == 0:
+                continue
+            prev_open = prev_open_row['Open'].iloc[0]
+            prev_close = prev_close_row['Close'].iloc[0]
+            returns.append(abs(prev_close / prev_open - 1))
+        if len(returns) == 0:
+            continue
+        sigma = np.mean(returns)
+
+        base_upper = max(today_open, yesterday_close)
+        base_lower = min(today_open, yesterday_close)
+        upper = base_upper * (1 + sigma)
+        lower = base_lower * (1 - sigma)
+
+        all_bounds.append({
+            'Date': today,
+            'Sigma': sigma,
+            'UpperBound': upper,
+            'LowerBound': lower
+        })
+    return pd.DataFrame(all_bounds)
+
+
+def sp500_bars(drop_rate=0.0, seed=0):
+    data = pd.read_csv(os.path.join(ROOT, 'sp500_30min_14d.csv'), header=0, skiprows=[1, 2], index_col=0)
+    data.index = pd.to_datetime(data.index)
+    data = data.apply(pd.to_numeric, errors='coerce').dropna()
+    if drop_rate:
+        data = data[np.random.default_rng(seed).random(len(data)) >= drop_rate]
+    data['Date'] = data.index.to_series().dt.date
+    data['Time'] = data.index.to_series().dt.time
+    return data
+
+
+@pytest.mark.parametrize('drop_rate, seed', [(0.0, 0), (0.2, 0), (0.2, 1), (0.5, 2)])
+def test_daily_bounds_match_nested_loops(drop_rate, seed):
+    data = sp500_bars(drop_rate, seed)
+    expected = original_bounds(data)
+    bounds = daily_noise_bounds(data)
+    assert list(bounds.columns) == ['Date', 'Sigma', 'UpperBound', 'LowerBound']
+    assert bounds['Date'].tolist() == expected['Date'].tolist()
+    for column in ('Sigma', 'UpperBound', 'LowerBound'):
+        np.testing.assert_array_equal(bounds[column].values, expected[column].values, err_msg=column)
+
+
+def test_dropped_bars_remove_session_opens_and_closes():
+    # The fallbacks to a session's first/last bar are only exercised when bars are missing
+    data = sp500_bars(0.5, 2)
+    times = data.groupby('Date')['Time']
+    assert not times.apply(lambda t: OPEN_TIME_UTC in set(t)).all()
+    assert not times.apply(lambda t: CLOSE_TIME_UTC in set(t)).all()
@@ -0,0 +1,34 @@
+"""Stage cache keys of pipeline.py."""
+import importlib
+import sys
+
+import pipeline
+from pipeline import Stage, StageCache
+
+
+def test_editing_a_declared_module_reruns_the_stage(tmp_path, monkeypatch):
+    module = tmp_path / 'pipeline_test_kernel.py'
+    module.write_text('def compute(x):\n    return x + 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+
+    def source(value):
+        return value
+
+    def apply(value):
+        return sys.modules['pipeline_test_kernel'].compute(value)
+
+    stages = (Stage('source', source, params=('value',), always=True),
+              Stage('apply', apply, ('source',), modules=('pipeline_test_kernel',)))
+    cache = StageCache(str(tmp_path / 'cache'))
+    monkeypatch.setattr(pipeline, 'DEFAULTS', {'value': 1})
+
+    outputs, log = pipeline.run(cache=cache, stages=stages)
+    assert outputs['apply'] == 2 and log[1][1] == 'ran'
+    outputs, log = pipeline.run(cache=cache, stages=stages)
+    assert outputs['apply'] == 2 and log[1][1] == 'cached'
+
+    module.write_text('def compute(x):\n    return x + 2\n')
+    importlib.reload(sys.modules['pipeline_test_kernel'])
+    outputs, log = pipeline.run(cache=cache, stages=stages)
+    assert outputs['apply'] == 3 and log[1][1] == 'ran'
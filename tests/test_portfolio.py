@@ -0,0 +1,20 @@
+"""Shared-capital sizing of portfolio.Portfolio."""
+import numpy as np
+
+from portfolio import Portfolio, fixed_fraction
+
+
+def test_reversal_reentry_uses_capital_freed_by_flat_exits():
+    portfolio = Portfolio(2, fixed_fraction(0.6), capital=100_000, commission=0.0, slippage=0.0)
+    upper, lower = np.array([101.0, 101.0]), np.array([99.0, 99.0])
+    no, yes = np.zeros(2, dtype=bool), np.ones(2, dtype=bool)
+
+    # Both symbols go long; together they want 120% of equity and are scaled to 100%
+    portfolio.step(0, 100.0, 102.0, 100.0, np.array([102.0, 102.0]), upper, lower, yes, no)
+    assert portfolio.entry_shares.tolist() == [490.0, 490.0]
+
+    # Symbol 0 exits at the session close while symbol 1 reverses to short on the same bar
+    portfolio.step(1, 100.0, 102.0, 98.0, np.array([100.0, 98.0]), upper, lower, no, np.array([True, False]))
+    assert portfolio.position.tolist() == [0.0, -1.0]
+    expected = np.trunc(portfolio.equity * 0.6 / 98.0)
+    assert portfolio.entry_shares[1] == expected
@@ -0,0 +1,280 @@
+"""simulate() against the per-row loops backtest.py and enhanced_backtest.py used to run."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from noise_bounds import daily_noise_bounds
+from simulation import ENHANCED_PARAMS, make_params, simulate, trades_frame
+from synthetic_data import synthetic_bars
+
+INITIAL_AUM = 100_000
+COMMISSION_PER_SHARE = 0.0035
+SLIPPAGE_PER_SHARE = 0.001
+STOP_LOSS_PCT = 0.015
+MAX_POSITION_SIZE = 0.95
+BOUNDS_BUFFER = 0.0005
+
+
+def original_backtest(merged):
+    """The iterrows() loop of backtest.py, without its prints."""
+    aum = INITIAL_AUM
+    position = 0
+    entry_price = None
+    entry_time = None
+    shares = 0
+    trade_log = []
+    equity_curve = []
+    for idx, row in merged.iterrows():
+        t = row['Time']
+        dt = row['Datetime']
+        price = row['Close']
+        open_price = row['Open']
+        upper = row['UpperBound']
+        lower = row['LowerBound']
+
+        if t == '13:30' and position == 0:
+            shares = int(aum / open_price)
+
+        if position == 0:
+            if price > upper:
+                position = 1
+                entry_price = float(price + SLIPPAGE_PER_SHARE)
+                entry_time = dt
+                entry_shares = shares
+            elif price < lower:
+                position = -1
+                entry_price = float(price - SLIPPAGE_PER_SHARE)
+                entry_time = dt
+                entry_shares = shares
+
+        should_exit = False
+        exit_reason = ""
+        if position != 0 and t == '19:30':
+            should_exit = True
+            exit_reason = "Market Close"
+        elif position == 1 and price < lower:
+            should_exit = True
+            exit_reason = "Long -> Short Signal"
+        elif position == -1 and price > upper:
+            should_exit = True
+            exit_reason = "Short -> Long Signal"
+
+        if should_exit and entry_price is not None:
+            exit_price = float(price - SLIPPAGE_PER_SHARE * position)
+            exit_time = dt
+            if position == 1:
+                pnl = (exit_price - entry_price) * entry_shares - COMMISSION_PER_SHARE * entry_shares * 2
+            else:
+                pnl = (entry_price - exit_price) * entry_shares - COMMISSION_PER_SHARE * entry_shares * 2
+            aum += pnl
+            trade_log.append({
+                'Entry Time': entry_time, 'Entry Price': entry_price,
+                'Exit Time': exit_time, 'Exit Price': exit_price,
+                'PnL': pnl, 'Position': 'Long' if position == 1 else 'Short',
+                'Shares': entry_shares, 'Exit Reason': exit_reason
+            })
+            if exit_reason in ["Long -> Short Signal", "Short -> Long Signal"]:
+                if exit_reason == "Long -> Short Signal":
+                    position = -1
+                    entry_price = float(price - SLIPPAGE_PER_SHARE)
+                else:
+                    position = 1
+                    entry_price = float(price + SLIPPAGE_PER_SHARE)
+                entry_time = dt
+                entry_shares = int(aum / open_price)
+            else:
+                position = 0
+                entry_price = None
+                entry_time = None
+                shares = int(aum / open_price) if open_price > 0 else 0
+
+        equity_curve.append(aum)
+    return pd.DataFrame(trade_log), np.array(equity_curve)
+
+
+def original_enhanced_backtest(merged):
+    """The iterrows() loop of enhanced_backtest.py, without its prints."""
+    aum = INITIAL_AUM
+    position = 0
+    entry_price = None
+    entry_time = None
+    shares = 0
+    stop_loss_price = None
+    trade_log = []
+    equity_curve = []
+    for idx, row in merged.iterrows():
+        t = row['Time']
+        dt = row['Datetime']
+        price = row['Close']
+        high_price = row['High']
+        low_price = row['Low']
+        upper_buffered = row['UpperBound'] * (1 + BOUNDS_BUFFER)
+        lower_buffered = row['LowerBound'] * (1 - BOUNDS_BUFFER)
+
+        if position == 0:
+            shares = int((aum * MAX_POSITION_SIZE) / price)
+
+        should_exit = False
+        exit_reason = ""
+        exit_price = price
+        if position != 0 and stop_loss_price is not None:
+            if position == 1 and low_price <= stop_loss_price:
+                should_exit = True
+                exit_reason = "Stop Loss"
+                exit_price = stop_loss_price
+            elif position == -1 and high_price >= stop_loss_price:
+                should_exit = True
+                exit_reason = "Stop Loss"
+                exit_price = stop_loss_price
+
+        if position == 0 and not should_exit:
+            if price > upper_buffered:
+                position = 1
+                entry_price = float(price + SLIPPAGE_PER_SHARE)
+                entry_time = dt
+                entry_shares = shares
+                stop_loss_price = entry_price * (1 - STOP_LOSS_PCT)
+            elif price < lower_buffered:
+                position = -1
+                entry_price = float(price - SLIPPAGE_PER_SHARE)
+                entry_time = dt
+                entry_shares = shares
+                stop_loss_price = entry_price * (1 + STOP_LOSS_PCT)
+
+        if position != 0:
+            if not should_exit and t == '19:30':
+                should_exit = True
+                exit_reason = "Market Close"
+                exit_price = price - SLIPPAGE_PER_SHARE * position
+            elif not should_exit and position == 1 and price < lower_buffered:
+                should_exit = True
+                exit_reason = "Long -> Short Signal"
+                exit_price = price - SLIPPAGE_PER_SHARE
+            elif not should_exit and position == -1 and price > upper_buffered:
+                should_exit = True
+                exit_reason = "Short -> Long Signal"
+                exit_price = price + SLIPPAGE_PER_SHARE
+
+        if should_exit and entry_price is not None:
+            exit_time = dt
+            if position == 1:
+                pnl = (exit_price - entry_price) * entry_shares - COMMISSION_PER_SHARE * entry_shares * 2
+            else:
+                pnl = (entry_price - exit_price) * entry_shares - COMMISSION_PER_SHARE * entry_shares * 2
+            aum += pnl
+            trade_log.append({
+                'Entry Time': entry_time, 'Entry Price': entry_price,
+                'Exit Time': exit_time, 'Exit Price': exit_price,
+                'PnL': pnl, 'Position': 'Long' if position == 1 else 'Short',
+                'Shares': entry_shares, 'Exit Reason': exit_reason,
+                'Stop Loss': stop_loss_price
+            })
+            if exit_reason in ["Long -> Short Signal", "Short -> Long Signal"]:
+                max_shares = int((aum * MAX_POSITION_SIZE) / price)
+                if exit_reason == "Long -> Short Signal":
+                    position = -1
+                    entry_price = float(price - SLIPPAGE_PER_SHARE)
+                    stop_loss_price = entry_price * (1 + STOP_LOSS_PCT)
+                else:
+                    position = 1
+                    entry_price = float(price + SLIPPAGE_PER_SHARE)
+                    stop_loss_price = entry_price * (1 - STOP_LOSS_PCT)
+                entry_time = dt
+                entry_shares = max_shares
+            else:
+                position = 0
+                entry_price = None
+                entry_time = None
+                stop_loss_price = None
+                shares = 0
+
+        equity_curve.append(aum)
+    return pd.DataFrame(trade_log), np.array(equity_curve)
+
+
+def merge_bounds(price_df, bounds_df):
+    """Bars joined to daily bounds on the UTC date, as the scripts did before bar_keys.py."""
+    price_df = price_df.copy()
+    price_df['Date'] = price_df['Datetime'].dt.date
+    price_df['Time'] = price_df['Datetime'].dt.strftime('%H:%M')
+    bounds_df = bounds_df.copy()
+    bounds_df['Date'] = pd.to_datetime(bounds_df['Date']).dt.date
+    merged = pd.merge(price_df, bounds_df, on='Date', how='inner')
+    return merged.sort_values('Datetime').reset_index(drop=True)
+
+
+def sp500_merged():
+    price_df = pd.read_csv(os.path.join(ROOT, 'sp500_30min_14d.csv'), header=0, skiprows=[1, 2])
+    price_df = price_df.rename(columns={'Price': 'Datetime'})
+    price_df['Datetime'] = pd.to_datetime(price_df['Datetime'])
+    for column in ('Close', 'Open', 'High', 'Low'):
+        price_df[column] = pd.to_numeric(price_df[column], errors='coerce')
+    price_df = price_df.dropna()
+    return merge_bounds(price_df, pd.read_csv(os.path.join(ROOT, 'daily_noise_bounds.csv')))
+
+
+def synthetic_merged(seed):
+    # Summer sessions, where the fixed 13:30/19:30 UTC times are the session's
+    # open and last bar, with enough volatility for stops and reversals
+    bars = synthetic_bars(years=0.3, start='2015-05-01', seed=seed, daily_vol=0.03)['SYN000'].reset_index()
+    bars['Date'] = bars['Datetime'].dt.date
+    bars['Time'] = bars['Datetime'].dt.time
+    bounds_df = daily_noise_bounds(bars)
+    return merge_bounds(bars.drop(columns=['Date', 'Time']), bounds_df)
+
+
+CASES = {'sp500': sp500_merged, 'synthetic-2': lambda: synthetic_merged(2), 'synthetic-5': lambda: synthetic_merged(5)}
+
+
+@pytest.fixture(scope='module', params=sorted(CASES))
+def merged(request):
+    return CASES[request.param]()
+
+
+def run_kernel(merged, params, with_stop):
+    session_open = (merged['Time'] == '13:30').values
+    session_close = (merged['Time'] == '19:30').values
+    result = simulate(merged, params, session_open, session_close, initial_aum=INITIAL_AUM)
+    return trades_frame(result.trades, merged['Datetime'], with_stop=with_stop), result
+
+
+def assert_same_trades(trades, expected):
+    assert len(trades) == len(expected)
+    if len(expected) == 0:
+        return
+    assert list(trades.columns) == list(expected.columns)
+    for column in expected.columns:
+        if column.endswith('Time'):
+            assert (pd.DatetimeIndex(trades[column]) == pd.DatetimeIndex(expected[column])).all(), column
+        elif trades[column].dtype.kind in 'fi':
+            np.testing.assert_array_equal(trades[column].values.astype(float),
+                                          expected[column].values.astype(float), err_msg=column)
+        else:
+            assert trades[column].tolist() == expected[column].tolist(), column
+
+
+def test_original_rules_match_row_loop(merged):
+    expected_trades, expected_equity = original_backtest(merged)
+    trades, result = run_kernel(merged, make_params(COMMISSION_PER_SHARE, SLIPPAGE_PER_SHARE), with_stop=False)
+    assert_same_trades(trades, expected_trades)
+    np.testing.assert_array_equal(result.equity, expected_equity)
+
+
+def test_enhanced_rules_match_row_loop(merged):
+    expected_trades, expected_equity = original_enhanced_backtest(merged)
+    params = make_params(COMMISSION_PER_SHARE, SLIPPAGE_PER_SHARE, **ENHANCED_PARAMS)
+    trades, result = run_kernel(merged, params, with_stop=True)
+    assert_same_trades(trades, expected_trades)
+    np.testing.assert_array_equal(result.equity, expected_equity)
+
+
+def test_synthetic_cases_exercise_every_exit():
+    reasons = set()
+    for seed in (2, 5):
+        merged = synthetic_merged(seed)
+        reasons.update(original_backtest(merged)[0]['Exit Reason'])
+        reasons.update(original_enhanced_backtest(merged)[0]['Exit Reason'])
+    assert reasons == {'Market Close', 'Stop Loss', 'Long -> Short Signal', 'Short -> Long Signal'}
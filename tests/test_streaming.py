@@ -0,0 +1,32 @@
+"""The streaming engine against the batch backtest (universe_runner.run_symbol)."""
+import asyncio
+
+import numpy as np
+import pytest
+
+from simulation import ENHANCED_PARAMS, TRADE_FIELDS, make_params
+from streaming import ListSink, ReplayFeed, StreamingEngine
+from synthetic_data import synthetic_bars
+from universe_runner import run_symbol
+
+
+@pytest.fixture(scope='module')
+def bars():
+    # Winter and summer sessions and the calendar's early closes
+    return synthetic_bars(years=1, start='2015-11-05', seed=0)['SYN000']
+
+
+@pytest.mark.parametrize('rules', ['enhanced', 'original'])
+def test_streaming_trades_match_batch(bars, rules):
+    params = make_params(**ENHANCED_PARAMS) if rules == 'enhanced' else make_params()
+    columns = {'timestamp': bars.index.as_unit('ns').asi8}
+    columns.update({column: bars[column].values for column in ('Open', 'High', 'Low', 'Close')})
+    rows, result = run_symbol(columns, params)
+    expected = result.trades.copy()
+    expected[:, :2] = rows[expected[:, :2].astype(np.int64)]
+
+    engine = asyncio.run(StreamingEngine(ListSink(), params, interval='30m').run(ReplayFeed({'SYN': bars})))['SYN']
+    trades = np.array(engine.trades).reshape(-1, TRADE_FIELDS)
+    assert len(trades) == len(expected)
+    np.testing.assert_allclose(trades, expected, rtol=1e-12, equal_nan=True)
+    assert engine.aum == pytest.approx(result.aum, rel=1e-12)
@@ -0,0 +1,182 @@
+"""Append-only, columnar trade log.
+
+TradeBuffer keeps trades in typed NumPy columns: int64 UTC nanosecond
+timestamps, int8 codes for side and exit reason, int32 codes into a
+symbol table.  The columns double in capacity when full, so appending
+millions of trades from sweeps or symbol universes costs no per-trade
+objects.  to_frame() wraps the filled part of the columns without
+copying them (only the timestamps are copied, to attach the UTC zone).
+to_parquet() writes one file per symbol and run, in
+<root>/symbol=<symbol>/run=<run>/trades.parquet (needs pyarrow).
+"""
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from simulation import (EXIT_REASONS, T_ENTRY_INDEX, T_ENTRY_PRICE, T_EXIT_INDEX, T_EXIT_PRICE, T_PNL,
+                        T_REASON, T_SHARES, T_SIDE, T_STOP)
+
+SIDES = ('Long', 'Short')  # side codes 0 and 1
+LONG, SHORT = range(2)
+
+FIELDS = (
+    ('symbol', np.int32),
+    ('entry_time', np.int64),
+    ('exit_time', np.int64),
+    ('side', np.int8),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('shares', np.int64),
+    ('pnl', np.float64),
+    ('stop', np.float64),
+    ('reason', np.int8),
+)
+
+
+def _nanoseconds(times):
+    """int64 UTC nanoseconds of datetime-like values, and their time zone."""
+    index = pd.DatetimeIndex(times)
+    return index.as_unit('ns').asi8, index.tz
+
+
+class TradeBuffer:
+    """Growable typed columns of closed trades (see FIELDS)."""
+
+    def __init__(self, capacity=1024, tz='UTC'):
+        self.n = 0
+        self.tz = tz
+        self.symbols = []
+        self._symbol_codes = {}
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in FIELDS}
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacity(self):
+        return len(self._columns['pnl'])
+
+    def _reserve(self, extra):
+        needed = self.n + extra
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity, 16)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.n] = column[:self.n]
+            self._columns[name] = grown
+
+    def symbol_code(self, symbol):
+        code = self._symbol_codes.get(symbol)
+        if code is None:
+            code = self._symbol_codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return code
+
+    def append(self, symbol, entry_time, exit_time, side, entry_price, exit_price, shares, pnl,
+               stop=np.nan, reason=0):
+        """Add one trade; times are pd.Timestamp-like, side is +1/-1 and reason a simulation exit code."""
+        self._reserve(1)
+        k = self.n
+        columns = self._columns
+        columns['symbol'][k] = self.symbol_code(symbol)
+        columns['entry_time'][k] = pd.Timestamp(entry_time).as_unit('ns').value
+        columns['exit_time'][k] = pd.Timestamp(exit_time).as_unit('ns').value
+        columns['side'][k] = LONG if side == 1 else SHORT
+        columns['entry_price'][k] = entry_price
+        columns['exit_price'][k] = exit_price
+        columns['shares'][k] = shares
+        columns['pnl'][k] = pnl
+        columns['stop'][k] = stop
+        columns['reason'][k] = reason
+        self.n += 1
+
+    def extend(self, trades, times, symbol='', fill_times=None):
+        """Add the rows of a simulation trades array; `times` holds the timestamp of every bar index.
+
+        `fill_times` ((n, 2) int64 UTC ns, as in intrabar.IntrabarResult)
+        replaces the bar times with the actual entry and exit fill times.
+        """
+        m = len(trades)
+        self._reserve(m)
+        ns, self.tz = _nanoseconds(times)
+        lo, hi = self.n, self.n + m
+        columns = self._columns
+        columns['symbol'][lo:hi] = self.symbol_code(symbol)
+        if fill_times is not None:
+            columns['entry_time'][lo:hi] = fill_times[:, 0]
+            columns['exit_time'][lo:hi] = fill_times[:, 1]
+        else:
+            columns['entry_time'][lo:hi] = ns[trades[:, T_ENTRY_INDEX].astype(np.int64)]
+            columns['exit_time'][lo:hi] = ns[trades[:, T_EXIT_INDEX].astype(np.int64)]
+        columns['side'][lo:hi] = np.where(trades[:, T_SIDE] == 1, LONG, SHORT)
+        columns['entry_price'][lo:hi] = trades[:, T_ENTRY_PRICE]
+        columns['exit_price'][lo:hi] = trades[:, T_EXIT_PRICE]
+        columns['shares'][lo:hi] = trades[:, T_SHARES]
+        columns['pnl'][lo:hi] = trades[:, T_PNL]
+        columns['stop'][lo:hi] = trades[:, T_STOP]
+        columns['reason'][lo:hi] = trades[:, T_REASON]
+        self.n = hi
+        return self
+
+    @classmethod
+    def from_trades(cls, trades, times, symbol='', fill_times=None):
+        return cls(capacity=max(len(trades), 16)).extend(trades, times, symbol, fill_times)
+
+    def column(self, name):
+        """View of the filled part of a column."""
+        return self._columns[name][:self.n]
+
+    def _times(self, name):
+        times = pd.DatetimeIndex(self.column(name).view('M8[ns]')).tz_localize('UTC')
+        return pd.Series(times.tz_convert(self.tz) if self.tz is not None else times.tz_localize(None))
+
+    def to_frame(self, with_stop=False, with_symbol=False):
+        """Trades in the backtests' trade log layout; the price, share and code columns are views."""
+        frame = {}
+        if with_symbol:
+            frame['Symbol'] = pd.Categorical.from_codes(self.column('symbol'), self.symbols)
+        frame.update({
+            'Entry Time': self._times('entry_time'),
+            'Entry Price': self.column('entry_price'),
+            'Exit Time': self._times('exit_time'),
+            'Exit Price': self.column('exit_price'),
+            'PnL': self.column('pnl'),
+            'Position': pd.Categorical.from_codes(self.column('side'), SIDES),
+            'Shares': self.column('shares'),
+            'Exit Reason': pd.Categorical.from_codes(self.column('reason'), EXIT_REASONS),
+        })
+        if with_stop:
+            frame['Stop Loss'] = self.column('stop')
+        return pd.DataFrame(frame, copy=False)
+
+    def to_parquet(self, root, run):
+        """Write each symbol's trades to <root>/symbol=<symbol>/run=<run>/trades.parquet; returns the paths."""
+        import pyarrow  # noqa: F401  (fail before writing anything when it is missing)
+
+        frame = self.to_frame(with_stop=True)
+        codes = self.column('symbol')
+        paths = []
+        for code, symbol in enumerate(self.symbols):
+            directory = os.path.join(root, f"symbol={quote(symbol, safe='')}", f"run={quote(str(run), safe='')}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, 'trades.parquet')
+            frame[codes == code].to_parquet(path, index=False)
+            paths.append(path)
+        return paths
+
+
+def save_trade_log(buffer, root, run, with_stop=False):
+    """Export the trade log to Parquet, or print it when pyarrow is not installed."""
+    if len(buffer) == 0:
+        print("No trades executed")
+        return []
+    try:
+        paths = buffer.to_parquet(root, run)
+    except ImportError:
+        print(buffer.to_frame(with_stop=with_stop).to_string(index=False))
+        return []
+    print(f"{len(buffer)} trades written to {', '.join(paths)}")
+    return paths
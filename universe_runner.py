@@ -0,0 +1,126 @@
+"""Run the noise-bounds strategy over a universe of symbols on a process pool.
+
+All symbols' bars are packed once into a shared-memory block; each task
+is one symbol, identified by its row range, and the worker computes the
+daily bounds (as in 2_week_bounds.py) and runs the enhanced_backtest.py
+simulation on zero-copy views of the shared arrays.  Only the per-symbol
+trades and metrics travel back to the parent.
+
+    python universe_runner.py AAPL MSFT NVDA --workers 8
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from market_data import BarCache
+from noise_bounds import LOOKBACK, daily_bounds_arrays
+from session_calendar import SessionCalendar
+from shared_arrays import SharedArrays
+from simulation import ENHANCED_PARAMS, make_params, performance_summary, simulate, trades_frame
+from trade_log import TradeBuffer
+
+_shared = None
+
+
+def _attach(spec):
+    global _shared
+    _shared = SharedArrays.attach(spec)
+
+
+def run_symbol(bars, params, lookback=LOOKBACK, initial_aum=100_000):
+    """Bounds + simulation for one symbol's bars ({'timestamp', 'Open', 'High', 'Low', 'Close'} arrays).
+
+    Returns (rows of the simulated bars, SimulationResult).  Bars of the
+    first session, which has no bounds, are skipped like the inner merge in
+    the backtest scripts, and so are bars off the exchange calendar.
+    """
+    calendar = SessionCalendar(bars['timestamp'])
+    sigma, upper, lower = daily_bounds_arrays(calendar.session_opens(bars['Open']),
+                                              calendar.session_closes(bars['Close']), lookback)
+
+    rows = np.flatnonzero(calendar.session >= 1)
+    # A contiguous row range stays a zero-copy view of the shared arrays
+    take = slice(rows[0], rows[-1] + 1) if len(rows) and rows[-1] - rows[0] + 1 == len(rows) else rows
+    simulated = {column: bars[column][take] for column in ('Open', 'High', 'Low', 'Close')}
+    session = calendar.session[take]
+    simulated['UpperBound'] = upper[session]
+    simulated['LowerBound'] = lower[session]
+    return rows, simulate(simulated, params, calendar.open_flags()[take], calendar.close_flags()[take],
+                          initial_aum=initial_aum)
+
+
+def _run_task(task):
+    symbol, lo, hi, params, lookback, initial_aum = task
+    bars = {key: _shared[key][lo:hi] for key in ('timestamp', 'Open', 'High', 'Low', 'Close')}
+    rows, result = run_symbol(bars, params, lookback, initial_aum)
+    # Trade bar indices are made absolute within the symbol's rows
+    trades = result.trades.copy()
+    trades[:, :2] = rows[trades[:, :2].astype(np.int64)]
+    return symbol, trades, performance_summary(result, initial_aum)
+
+
+def run_universe(bars_by_symbol, params=None, lookback=LOOKBACK, initial_aum=100_000, workers=None,
+                 trade_buffer=None):
+    """Run every symbol of {symbol: bars frame} and return (summary, trade_logs).
+
+    `summary` has one row of metrics per symbol; `trade_logs` maps each
+    symbol to its trade log DataFrame.  Every trade is also appended to
+    `trade_buffer` (a trade_log.TradeBuffer) when one is given.
+    """
+    params = make_params(**ENHANCED_PARAMS) if params is None else params
+    symbols = [s for s, bars in bars_by_symbol.items() if len(bars) > 0]
+    frames = [bars_by_symbol[s] for s in symbols]
+    offsets = np.cumsum([0] + [len(f) for f in frames])
+    columns = {
+        'timestamp': np.concatenate([f.index.as_unit('ns').asi8 for f in frames]) if frames else np.empty(0, np.int64),
+    }
+    for column in ('Open', 'High', 'Low', 'Close'):
+        columns[column] = np.concatenate([f[column].values for f in frames]) if frames else np.empty(0)
+
+    results = {}
+    with SharedArrays.create(columns) as shared:
+        tasks = [(s, offsets[k], offsets[k + 1], params, lookback, initial_aum) for k, s in enumerate(symbols)]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=_attach, initargs=(shared.spec,)) as pool:
+            for symbol, trades, metrics in pool.map(_run_task, tasks, chunksize=1):
+                results[symbol] = (trades, metrics)
+
+    summary = pd.DataFrame([dict(Symbol=s, **results[s][1]) for s in symbols])
+    trade_logs = {s: trades_frame(results[s][0], bars_by_symbol[s].index, with_stop=True) for s in symbols}
+    if trade_buffer is not None:
+        for s in symbols:
+            trade_buffer.extend(results[s][0], bars_by_symbol[s].index, s)
+    return summary, trade_logs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Noise-bounds strategy over many symbols')
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--interval', default='30m')
+    parser.add_argument('--period', default='60d')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--offline', action='store_true', help='only use bars already in the cache')
+    parser.add_argument('--output', default='universe_summary.csv')
+    parser.add_argument('--trade-log', default='trade_logs', help='Parquet trade log root (partitioned by symbol and run)')
+    parser.add_argument('--run', default=None, help='run name for the trade log (default: start time)')
+    args = parser.parse_args()
+
+    bars = BarCache(offline=args.offline).get_many(args.symbols, interval=args.interval, period=args.period)
+    run = args.run or pd.Timestamp.now(tz='UTC').strftime('%Y%m%dT%H%M%S')
+    trade_buffer = TradeBuffer()
+    summary, _ = run_universe(bars, workers=args.workers, trade_buffer=trade_buffer)
+    summary.to_csv(args.output, index=False)
+    print(summary.to_string(index=False))
+    print(f"\n{len(trade_buffer)} trades across {len(summary)} symbols -> {args.output}")
+    try:
+        paths = trade_buffer.to_parquet(args.trade_log, run)
+        print(f"Trade logs written under {args.trade_log}/ ({len(paths)} files)")
+    except ImportError:
+        print("pyarrow is not installed; trade logs were not saved")
+
+
+if __name__ == '__main__':
+    main()
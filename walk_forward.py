@@ -0,0 +1,212 @@
+"""Walk-forward optimization of the enhanced strategy on a process pool.
+
+The history is split into rolling windows of whole sessions: each window
+optimizes the enhanced_backtest.py parameters (stop loss, bounds buffer,
+max position size) together with the bounds lookback on its in-sample
+sessions and trades the best combination on the out-of-sample sessions
+that follow.  Windows advance by the out-of-sample length, so the
+out-of-sample periods tile the history without overlap.
+
+The parent computes the session calendar and the daily bounds of every
+lookback once (one noise_bounds.sigma_cube pass) and packs the bars and
+bounds into one shared-memory block; the workers attach to it and run
+their windows on zero-copy views.  In-sample, every lookback x parameter
+combination is a lane of a single sweep.sweep_lanes() pass; out-of-sample
+is one simulate() run.
+
+    python walk_forward.py ^GSPC --interval 30m --period 60d --is-sessions 10 --oos-sessions 5
+
+A window needs max(LOOKBACKS) sessions of history before its in-sample
+span, so 60 days of 30-minute bars (about 40 sessions) fit two windows
+of the defaults; longer in-sample spans need a longer history (--csv).
+"""
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from market_data import BarCache, load_bars
+from noise_bounds import bounds_from_sigma, sigma_cube
+from session_calendar import SessionCalendar
+from shared_arrays import SharedArrays
+from simulation import TRADE_FIELDS, make_params, performance_summary, simulate, trades_frame
+from sweep import sweep_lanes
+from universe_runner import ENHANCED_PARAMS
+
+LOOKBACKS = (5, 8, 10, 13, 20)
+STOP_LOSS_PCTS = (0.005, 0.01, 0.015, 0.02, 0.03)
+BOUNDS_BUFFERS = (0.0, 0.0005, 0.001, 0.002)
+MAX_POSITION_SIZES = (0.5, 0.75, 0.95)
+
+WINDOW_COLUMNS = ['Window', 'ISStart', 'ISEnd', 'OOSStart', 'OOSEnd', 'Lookback', 'StopLossPct', 'BoundsBuffer',
+                  'MaxPositionSize', 'ISTotalReturn', 'OOSTotalReturn', 'OOSWinRate', 'OOSMaxDrawdown',
+                  'OOSProfitFactor', 'OOSNumTrades']
+
+_shared = None
+
+
+def _attach(spec):
+    global _shared
+    _shared = SharedArrays.attach(spec)
+
+
+def prepare(bars, lookbacks=LOOKBACKS):
+    """Arrays shared with the workers, from a bars frame (UTC DatetimeIndex, OHLC).
+
+    Bars off the exchange calendar are dropped.  'upper'/'lower' are
+    (sessions x lookbacks) bounds and 'start' the first bar row of every
+    session (plus the end).  Returns (arrays, times of the kept bars,
+    session dates).
+    """
+    calendar = SessionCalendar.from_frame(bars)
+    keep = np.flatnonzero(calendar.session >= 0)
+    session = calendar.session[keep]
+    opens = calendar.session_opens(bars['Open'].values)
+    closes = calendar.session_closes(bars['Close'].values)
+    cube = sigma_cube(np.abs(closes / opens - 1), max(lookbacks))[:, np.asarray(lookbacks) - 1]
+    upper, lower = bounds_from_sigma(opens, closes, cube)
+    arrays = {column: bars[column].values[keep].astype(np.float64) for column in ('Open', 'High', 'Low', 'Close')}
+    arrays['session'] = session
+    arrays['session_open'] = calendar.open_flags()[keep]
+    arrays['session_close'] = calendar.close_flags()[keep]
+    arrays['upper'] = upper
+    arrays['lower'] = lower
+    arrays['start'] = np.searchsorted(session, np.arange(len(calendar) + 1))
+    return arrays, bars.index[keep], calendar.dates
+
+
+def windows(n_sessions, is_sessions, oos_sessions, first_session):
+    """(is_first, oos_first, oos_end) session numbers of every complete window."""
+    result = []
+    oos_first = first_session + is_sessions
+    while oos_first + oos_sessions <= n_sessions:
+        result.append((oos_first - is_sessions, oos_first, oos_first + oos_sessions))
+        oos_first += oos_sessions
+    return result
+
+
+def _window_bars(arrays, lo, hi, columns):
+    bars = {column: arrays[column][lo:hi] for column in ('Open', 'High', 'Low', 'Close')}
+    session = arrays['session'][lo:hi]
+    bars['UpperBound'] = arrays['upper'][session][:, columns]
+    bars['LowerBound'] = arrays['lower'][session][:, columns]
+    return bars, arrays['session_open'][lo:hi], arrays['session_close'][lo:hi]
+
+
+def run_window(arrays, task):
+    """Optimize on the in-sample sessions of one window and trade the best lanes out of sample.
+
+    Returns (row of WINDOW_COLUMNS values, out-of-sample equity, trades
+    with bar indices into the prepared arrays).
+    """
+    (window, is_first, oos_first, oos_end, lookbacks, grid, objective,
+     initial_aum, commission, slippage, size_every_bar) = task
+    start = arrays['start']
+    is_lo, oos_lo, oos_hi = int(start[is_first]), int(start[oos_first]), int(start[oos_end])
+
+    # In sample: every lookback x parameter combination in one sweep pass
+    combos = np.array(list(itertools.product(range(len(lookbacks)), *grid)), dtype=float)
+    bars, session_open, session_close = _window_bars(arrays, is_lo, oos_lo, np.arange(len(lookbacks)))
+    results = sweep_lanes(bars, session_open, session_close, combos[:, 1], combos[:, 2], combos[:, 3],
+                          initial_aum, commission, slippage, size_every_bar, bounds_lane=combos[:, 0].astype(np.int64))
+    best = int(np.argmax(results[objective].values))
+    column, stop_loss_pct, bounds_buffer, max_position_size = combos[best]
+
+    # Out of sample: the chosen lookback and parameters
+    params = make_params(commission=commission, slippage=slippage, stop_loss_pct=stop_loss_pct,
+                         bounds_buffer=bounds_buffer, max_position_size=max_position_size,
+                         size_every_bar=size_every_bar)
+    bars, session_open, session_close = _window_bars(arrays, oos_lo, oos_hi, int(column))
+    result = simulate(bars, params, session_open, session_close, initial_aum=initial_aum)
+    metrics = performance_summary(result, initial_aum)
+    trades = result.trades.copy()
+    trades[:, :2] += oos_lo
+    row = [window, is_first, oos_first - 1, oos_first, oos_end - 1, lookbacks[int(column)], stop_loss_pct,
+           bounds_buffer, max_position_size, results['TotalReturn'].values[best], metrics['TotalReturn'],
+           metrics['WinRate'], metrics['MaxDrawdown'], metrics['ProfitFactor'], metrics['NumTrades']]
+    return row, result.equity, trades
+
+
+def _run_task(task):
+    return run_window(_shared, task)
+
+
+def walk_forward(bars, is_sessions=60, oos_sessions=20, lookbacks=LOOKBACKS, stop_loss_pcts=STOP_LOSS_PCTS,
+                 bounds_buffers=BOUNDS_BUFFERS, max_position_sizes=MAX_POSITION_SIZES, objective='TotalReturn',
+                 initial_aum=100_000, commission=0.0035, slippage=0.001,
+                 size_every_bar=ENHANCED_PARAMS['size_every_bar'], workers=None):
+    """Walk-forward over one symbol's bars; returns (windows, equity, trade_log).
+
+    `windows` has one row per window: session dates of its in-sample and
+    out-of-sample spans, the lookback and parameters that maximized the
+    in-sample `objective` (a sweep column), their in-sample total return
+    and the out-of-sample metrics.
+    `equity` is the out-of-sample equity stitched across windows, each
+    window compounding on the previous ones, and `trade_log` all
+    out-of-sample trades.  The first window starts once the longest
+    lookback has a full history.  workers=1 runs in this process.
+    """
+    lookbacks = tuple(int(n) for n in lookbacks)
+    arrays, times, dates = prepare(bars, lookbacks)
+    grid = (tuple(stop_loss_pcts), tuple(bounds_buffers), tuple(max_position_sizes))
+    tasks = [(k, is_first, oos_first, oos_end, lookbacks, grid, objective, initial_aum, commission, slippage,
+              size_every_bar)
+             for k, (is_first, oos_first, oos_end) in enumerate(
+                 windows(len(arrays['start']) - 1, is_sessions, oos_sessions, max(lookbacks)))]
+
+    if workers == 1:
+        outputs = [run_window(arrays, task) for task in tasks]
+    else:
+        with SharedArrays.create(arrays) as shared:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                     initializer=_attach, initargs=(shared.spec,)) as pool:
+                outputs = list(pool.map(_run_task, tasks, chunksize=1))
+
+    table = pd.DataFrame([row for row, _, _ in outputs], columns=WINDOW_COLUMNS)
+    for column in ('ISStart', 'ISEnd', 'OOSStart', 'OOSEnd'):
+        table[column] = dates[table[column].values.astype(np.int64)] if len(table) else []
+
+    growth = np.cumprod([1.0] + [equity[-1] / initial_aum if len(equity) else 1.0 for _, equity, _ in outputs])
+    equity = np.concatenate([e * g for (_, e, _), g in zip(outputs, growth)]) if outputs else np.empty(0)
+    first = int(arrays['start'][tasks[0][2]]) if tasks else 0
+    equity = pd.Series(equity, index=times[first:first + len(equity)], name='Equity')
+    trades = np.concatenate([t for _, _, t in outputs]) if outputs else np.empty((0, TRADE_FIELDS))
+    return table, equity, trades_frame(trades, times, with_stop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-forward optimization of the enhanced strategy')
+    parser.add_argument('symbol')
+    parser.add_argument('--interval', default='30m')
+    parser.add_argument('--period', default='60d')
+    parser.add_argument('--csv', default=None, help='Yahoo-format CSV (or the bar store dataset) instead of the cache')
+    parser.add_argument('--is-sessions', type=int, default=10)
+    parser.add_argument('--oos-sessions', type=int, default=5)
+    parser.add_argument('--objective', default='TotalReturn', help='sweep column to maximize in sample')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--offline', action='store_true', help='only use bars already in the cache')
+    parser.add_argument('--output', default='walk_forward.csv')
+    args = parser.parse_args()
+
+    if args.csv is not None:
+        bars = load_bars(args.symbol, args.interval, args.csv)
+    else:
+        bars = BarCache(offline=args.offline).get(args.symbol, interval=args.interval, period=args.period)
+    n_sessions = len(SessionCalendar.from_frame(bars))
+    if not windows(n_sessions, args.is_sessions, args.oos_sessions, max(LOOKBACKS)):
+        parser.error(f"{n_sessions} sessions of {args.symbol} bars leave no window: one needs {max(LOOKBACKS)} "
+                     f"sessions of history + --is-sessions {args.is_sessions} + --oos-sessions {args.oos_sessions}")
+    table, equity, trade_log = walk_forward(bars, args.is_sessions, args.oos_sessions, objective=args.objective,
+                                            workers=args.workers)
+    table.to_csv(args.output, index=False)
+    print(table.to_string(index=False))
+    if len(equity):
+        print(f"\nOut of sample: {(equity.iloc[-1] / 100_000 - 1) * 100:.2f}% over {len(table)} windows, "
+              f"{len(trade_log)} trades -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()